@@ -0,0 +1,274 @@
+"""Graph API batch request handler.
+
+Based on https://developers.facebook.com/docs/reference/api/batch/ .
+
+Each request in the batch is dispatched through the WSGI application
+in-process. Requests run in order, except that consecutive GETs that don't
+depend on each other run concurrently when the handlers' connection is a
+schemautil.ThreadLocalConnection, i.e. with server.py --threads.
+"""
+
+__author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
+
+import json
+import multiprocessing.pool
+import re
+import urllib
+import urlparse
+
+import webapp2
+
+import graph
+import schemautil
+
+# Facebook's limit on Graph API batch request size
+MAX_REQUESTS_PER_BATCH = 50
+
+# number of threads that run GET requests concurrently
+BATCH_THREADS = 8
+
+# matches references to the results of other requests, e.g.
+# {result=friends:$.data.*.id}
+RESULT_RE = re.compile(r'\{result=([^:}]+):([^}]+)\}')
+
+
+class BatchError(graph.JsonError):
+  type = 'GraphBatchException'
+
+class InvalidBatchError(BatchError):
+  message = '(#100) The parameter batch must be a JSON array of requests'
+
+class TooManyRequestsError(BatchError):
+  message = ('(#1) Too many requests in batch message. Maximum batch size is %d')
+
+
+class DependencyError(Exception):
+  """Raised when a request depends on a request that failed."""
+  pass
+
+
+def json_path(object, path):
+  """Evaluates a simple JSONPath expression.
+
+  Supports field names, array indices, and * wildcards, e.g. $.data.0.id,
+  $.data[0].id, and $.data.*.id.
+
+  Args:
+    object: decoded JSON object
+    path: string JSONPath expression
+
+  Returns: list of matching values
+
+  Raises: ValueError if path doesn't start with $
+  """
+  if not path.startswith('$'):
+    raise ValueError('JSONPath must start with $: %s' % path)
+
+  matches = [object]
+  for token in path[1:].replace('[', '.').replace(']', '').split('.'):
+    if not token:
+      continue
+    next = []
+    for match in matches:
+      if isinstance(match, dict):
+        if token == '*':
+          next.extend(match.values())
+        elif token in match:
+          next.append(match[token])
+      elif isinstance(match, list):
+        if token == '*':
+          next.extend(match)
+        elif token.isdigit() and int(token) < len(match):
+          next.append(match[int(token)])
+    matches = next
+
+  return matches
+
+
+class BatchHandler(webapp2.RequestHandler):
+  """The batch request handler.
+
+  Class attributes:
+    pool: multiprocessing.pool.ThreadPool, or None if requests run serially
+  """
+
+  ROUTES = [webapp2.Route('/', 'batch.BatchHandler', methods=['POST'])]
+
+  pool = None
+
+  @classmethod
+  def init(cls, conn, me):
+    # me is unused
+    if isinstance(conn, schemautil.ThreadLocalConnection):
+      if not cls.pool:
+        cls.pool = multiprocessing.pool.ThreadPool(BATCH_THREADS)
+    elif cls.pool:
+      # sqlite3.Connections can't be used across threads
+      cls.pool.close()
+      cls.pool = None
+
+  def post(self):
+    self.response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+    try:
+      requests = self.parse_batch()
+    except graph.GraphError, e:
+      self.response.write(e.message)
+      self.response.set_status(e.status)
+      return
+
+    json.dump(self.run(requests), self.response.out, indent=2)
+
+  def parse_batch(self):
+    """Parses and validates the batch parameter.
+
+    Returns: list of dict requests
+
+    Raises: GraphError
+    """
+    try:
+      requests = json.loads(self.request.get('batch'))
+    except ValueError:
+      raise InvalidBatchError()
+
+    if (not isinstance(requests, list) or
+        not all(isinstance(req, dict) and
+                isinstance(req.get('relative_url'), basestring)
+                for req in requests)):
+      raise InvalidBatchError()
+    elif len(requests) > MAX_REQUESTS_PER_BATCH:
+      raise TooManyRequestsError(MAX_REQUESTS_PER_BATCH)
+
+    return requests
+
+  def run(self, requests):
+    """Runs the requests in a batch, in order.
+
+    A request depends on the earlier requests named in its depends_on field
+    and in its {result=...} references. It's skipped if any of them failed.
+    Consecutive GETs that don't depend on each other run concurrently.
+
+    Args:
+      requests: list of dict requests
+
+    Returns: list of dict responses with code, headers, and body, or None for
+      requests that were skipped or named and omitted
+    """
+    responses = [None] * len(requests)
+    results = {}  # maps name to decoded JSON body of a successful request
+    gets = []  # (index, method, relative url, body) tuples to run concurrently
+
+    def finish(i, resp):
+      req = requests[i]
+      name = req.get('name')
+      if resp['code'] == 200 and name:
+        try:
+          results[name] = json.loads(resp['body'])
+        except ValueError:
+          pass
+        if req.get('omit_response_on_success', True):
+          return
+      responses[i] = resp
+
+    def run_gets():
+      for i, resp in self.call_concurrently(gets):
+        finish(i, resp)
+      del gets[:]
+
+    for i, req in enumerate(requests):
+      method = req.get('method', 'GET').upper()
+      depends = set(name for name, path in RESULT_RE.findall(
+          req['relative_url'] + req.get('body', '')))
+      if req.get('depends_on'):
+        depends.add(req['depends_on'])
+
+      get_names = set(requests[get[0]].get('name') for get in gets)
+      if method != 'GET' or depends & get_names:
+        run_gets()
+
+      try:
+        if not all(name in results for name in depends):
+          raise DependencyError()
+        call = (i, method, self.substitute(req['relative_url'], results),
+                self.substitute(req.get('body', ''), results))
+      except DependencyError:
+        continue
+
+      if method == 'GET':
+        gets.append(call)
+      else:
+        finish(*self.call(call))
+
+    run_gets()
+    return responses
+
+  def substitute(self, text, results):
+    """Replaces {result=name:jsonpath} references with the referenced values.
+
+    Multiple values are joined with commas.
+
+    Args:
+      text: string
+      results: dict mapping name to decoded JSON response body
+
+    Raises: DependencyError if a reference doesn't match anything
+    """
+    def replace(match):
+      name, path = match.groups()
+      try:
+        values = json_path(results[name], path)
+      except (KeyError, ValueError):
+        raise DependencyError()
+      if not values:
+        raise DependencyError()
+      return ','.join(urllib.quote(
+            (val if isinstance(val, basestring) else json.dumps(val)).encode('utf-8'),
+            safe=',')
+          for val in values)
+
+    return RESULT_RE.sub(replace, text)
+
+  def call_concurrently(self, calls):
+    """Runs requests concurrently if there's a pool, otherwise serially.
+
+    Args:
+      calls: list of (index, method, relative url, body) tuples
+
+    Returns: list of (index, response dict) tuples
+    """
+    if len(calls) > 1 and self.pool:
+      return self.pool.map(self.call, calls)
+    else:
+      return [self.call(call) for call in calls]
+
+  def call(self, call):
+    """Runs a single request through the WSGI application.
+
+    Args:
+      call: (index, method, relative url, body) tuple
+
+    Returns: (index, response dict) tuple
+    """
+    i, method, relative_url, body = call
+    url = '/' + relative_url.encode('utf-8').lstrip('/')
+    token = self.request.get('access_token')
+    if token and 'access_token=' not in url:
+      url += '%saccess_token=%s' % ('&' if '?' in url else '?',
+                                    urllib.quote(token.encode('utf-8')))
+
+    if method == 'GET':
+      request = webapp2.Request.blank(url)
+    else:
+      request = webapp2.Request.blank(
+        url, POST=urlparse.parse_qsl(body.encode('utf-8')))
+      request.method = method
+
+    app = self.request.app
+    resp = request.get_response(app)
+    # the request cleared webapp2's thread local app and request, which this
+    # thread may still need
+    app.set_globals(app=app, request=self.request)
+    return i, {'code': resp.status_int,
+               'headers': [{'name': name, 'value': val}
+                           for name, val in resp.headerlist],
+               'body': resp.body.decode('utf-8'),
+               }
@@ -0,0 +1,175 @@
+#!/usr/bin/python
+"""Unit tests for batch.py.
+"""
+
+__author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
+
+import json
+import os
+import tempfile
+import unittest
+import urllib
+
+import batch
+import graph
+import graph_test
+import oauth
+import schemautil
+import testutil
+
+
+class JsonPathTest(unittest.TestCase):
+
+  def test_json_path(self):
+    obj = {'data': [{'id': '1'}, {'id': '2', 'x': {'y': 3}}]}
+    self.assertEquals([obj], batch.json_path(obj, '$'))
+    self.assertEquals(['1'], batch.json_path(obj, '$.data.0.id'))
+    self.assertEquals(['2'], batch.json_path(obj, '$.data[1].id'))
+    self.assertEquals(['1', '2'], batch.json_path(obj, '$.data.*.id'))
+    self.assertEquals([3], batch.json_path(obj, '$.data[*].x.y'))
+    self.assertEquals([], batch.json_path(obj, '$.data.5.id'))
+    self.assertEquals([], batch.json_path(obj, '$.foo'))
+    self.assertRaises(ValueError, batch.json_path, obj, 'data')
+
+
+class BatchHandlerTest(testutil.HandlerTest):
+
+  def setUp(self):
+    super(BatchHandlerTest, self).setUp(graph.GraphHandler, batch.BatchHandler,
+                                        oauth.AccessTokenHandler)
+    graph_test.insert_test_data(self.conn)
+
+  def post_batch(self, requests, expected_status=200, **args):
+    """Makes a batch request and returns the decoded responses.
+
+    Args:
+      requests: list of dict requests
+      expected_status: integer
+      args: other POST parameters
+    """
+    args['batch'] = json.dumps(requests)
+    resp = self.app.get_response('/', method='POST', POST=args)
+    self.assertEquals(expected_status, resp.status_int, resp.body)
+    return json.loads(resp.body)
+
+  def assert_bodies(self, expected, responses):
+    """Checks the status codes and decoded bodies of batch responses.
+
+    Args:
+      expected: list of (code, decoded body) tuples, or None for null responses
+      responses: list of batch response dicts
+    """
+    self.assertEquals(len(expected), len(responses))
+    for exp, resp in zip(expected, responses):
+      if exp is None:
+        self.assertIsNone(resp)
+      else:
+        self.assertEquals(exp, (resp['code'], json.loads(resp['body'])))
+
+  def test_gets(self):
+    responses = self.post_batch([
+        {'method': 'GET', 'relative_url': 'alice'},
+        {'relative_url': '/bob/albums'},
+        {'method': 'GET', 'relative_url': '?ids=alice,2'},
+        {'method': 'GET', 'relative_url': 'foo'},
+        ])
+    self.assert_bodies([
+        (200, {'id': '1', 'foo': 'bar'}),
+        (200, {'data': [{'id': '5'}]}),
+        (200, {'alice': {'id': '1', 'foo': 'bar'},
+               '2': {'id': '2', 'inner': {'foo': 'baz'}}}),
+        (404, json.loads(graph.AliasNotFoundError('foo').message)),
+        ], responses)
+    self.assertIn({'name': 'Content-Type', 'value': 'text/plain; charset=utf-8'},
+                  responses[0]['headers'])
+
+  def test_redirect(self):
+    resp = self.post_batch([{'method': 'GET', 'relative_url': 'alice/picture'}])[0]
+    self.assertEquals(302, resp['code'])
+    self.assertIn({'name': 'Location', 'value': 'http://alice/picture'},
+                  resp['headers'])
+
+  def test_post_then_get(self):
+    responses = self.post_batch([
+        {'method': 'POST', 'relative_url': '3/feed', 'body': 'message=hello'},
+        {'method': 'GET', 'relative_url': '3/feed'},
+        ])
+    self.assertEquals(200, responses[0]['code'])
+    id = json.loads(responses[0]['body'])['id']
+    self.assertEquals([(id, 'hello')],
+                      [(post['id'], post['message'])
+                       for post in json.loads(responses[1]['body'])['data']])
+
+  def test_result_references(self):
+    responses = self.post_batch([
+        {'method': 'GET', 'relative_url': 'alice/albums', 'name': 'albums'},
+        {'method': 'GET', 'relative_url': '{result=albums:$.data.0.id}'},
+        {'method': 'GET', 'name': 'me', 'relative_url': 'me',
+         'omit_response_on_success': False},
+        {'method': 'GET', 'relative_url': '?ids={result=albums:$.data.*.id}'},
+        {'method': 'GET', 'relative_url': 'bob', 'depends_on': 'me'},
+        ])
+    self.assert_bodies([
+        None,
+        (200, {'id': '3', 'type': 'page', 'inner': {'foo': 'baz'}}),
+        (200, {'id': '1', 'foo': 'bar'}),
+        # album 4 doesn't exist
+        (200, json.loads(graph.ObjectsNotFoundError().message)),
+        (200, {'id': '2', 'inner': {'foo': 'baz'}}),
+        ], responses)
+
+  def test_failed_dependencies(self):
+    responses = self.post_batch([
+        {'method': 'GET', 'relative_url': 'foo', 'name': 'foo'},
+        {'method': 'GET', 'relative_url': 'alice', 'depends_on': 'foo'},
+        {'method': 'GET', 'relative_url': '{result=foo:$.id}'},
+        {'method': 'GET', 'relative_url': '{result=alice:$.x}', 'name': 'alice'},
+        {'method': 'GET', 'relative_url': '{result=unknown:$.id}'},
+        {'method': 'GET', 'relative_url': 'alice', 'depends_on': 'later'},
+        {'method': 'GET', 'relative_url': 'bob', 'name': 'later'},
+        ])
+    self.assertEquals(404, responses[0]['code'])
+    self.assertEquals([None] * 6, responses[1:])
+
+  def test_access_token(self):
+    self.conn.execute(
+      'INSERT INTO oauth_access_tokens(code, token) VALUES("asdf", "qwert")')
+    self.conn.commit()
+
+    requests = [{'method': 'GET', 'relative_url': 'alice'}]
+    self.assertEquals(200, self.post_batch(requests, access_token='qwert')[0]['code'])
+    self.assertEquals(400, self.post_batch(requests, access_token='bad')[0]['code'])
+
+  def test_bad_batch(self):
+    for batch_arg in '', 'xyz', '{}', '[1]', '[{"method": "GET"}]':
+      resp = self.app.get_response('/', method='POST', POST={'batch': batch_arg})
+      self.assertEquals(400, resp.status_int)
+      self.assertEquals(batch.InvalidBatchError().message, resp.body)
+
+  def test_too_many_requests(self):
+    requests = [{'relative_url': 'alice'}] * (batch.MAX_REQUESTS_PER_BATCH + 1)
+    resp = self.post_batch(requests, expected_status=400)
+    self.assertEquals(json.loads(batch.TooManyRequestsError(
+          batch.MAX_REQUESTS_PER_BATCH).message), resp)
+
+  def test_concurrent_gets(self):
+    filename = tempfile.mktemp(prefix='mockfacebook_test.')
+    try:
+      graph_test.insert_test_data(schemautil.get_db(filename))
+      conn = schemautil.ThreadLocalConnection(filename)
+      for cls in graph.GraphHandler, batch.BatchHandler:
+        cls.init(conn, self.ME)
+      self.assertIsNotNone(batch.BatchHandler.pool)
+
+      requests = [{'relative_url': 'alice'}, {'relative_url': 'bob'}] * 10
+      self.assertEquals(['1', '2'] * 10,
+                        [json.loads(resp['body'])['id']
+                         for resp in self.post_batch(requests)])
+    finally:
+      batch.BatchHandler.init(self.conn, self.ME)
+      testutil.remove_db(filename)
+    self.assertIsNone(batch.BatchHandler.pool)
+
+
+if __name__ == '__main__':
+  unittest.main()
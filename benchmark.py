@@ -0,0 +1,448 @@
+#!/usr/bin/python
+"""Benchmarks for mockfacebook's hot paths.
+
+Usage: benchmark.py [--number N] [BENCHMARK ...]
+
+Runs all benchmarks if none are specified. Not run by alltests.py.
+"""
+
+__author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
+
+import cPickle
+import itertools
+import json
+import logging
+import multiprocessing.pool
+import optparse
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+import fql
+import fql_test
+import graph
+import oauth
+import schemautil
+import server
+import testutil
+
+# optparse.Values object that holds command line options
+options = None
+
+
+def best_time(fn, number):
+  """Returns the best per call time of fn, in microseconds, over 3 runs.
+  """
+  return min(timeit.Timer(fn).repeat(3, number)) / number * 1000000
+
+
+def fql_parser():
+  """Translates the fql_test queries with sqlparse (Fql) and NativeFql.
+  """
+  schema = schemautil.FqlSchema.read()
+
+  def translate(parse, query):
+    try:
+      parse(query).to_sqlite()
+    except Exception:
+      pass
+
+  parsers = (lambda query: fql.Fql(schema, query, 1),
+             lambda query: fql.NativeFql(schema, query))
+
+  print '%10s %10s %8s  query' % ('sqlparse', 'native', 'speedup')
+  totals = [0, 0]
+  for query in fql_test.QUERIES:
+    times = [best_time(lambda: translate(parse, query), options.number)
+             for parse in parsers]
+    totals = [t + time for t, time in zip(totals, times)]
+    print '%8.1fus %8.1fus %7.1fx  %s' % (times[0], times[1],
+                                         times[0] / times[1], query[:60])
+
+  print '%8.1fus %8.1fus %7.1fx  total' % (totals[0], totals[1],
+                                          totals[0] / totals[1])
+
+
+def fql_statements():
+  """Executes FQL queries that only differ by id, inline vs parameterized.
+  """
+  schema = schemautil.FqlSchema.read()
+  conn = schemautil.get_db(':memory:')
+  fql_test.insert_test_data(conn)
+  fql.create_functions(conn, lambda: 1)
+  query = 'SELECT username FROM profile WHERE id = %d AND username = "alice"'
+  ids = xrange(options.number)
+  inline = [fql.NativeFql(schema, query % id).to_sqlite() for id in ids]
+  parameterized = [fql.NativeFql(schema, query % id).to_parameterized_sqlite()
+                   for id in ids]
+
+  def run_inline():
+    for sqlite in inline:
+      conn.execute(sqlite).fetchall()
+
+  def run_parameterized():
+    for args in parameterized:
+      conn.execute(*args).fetchall()
+
+  times = [best_time(fn, 1) / options.number
+           for fn in (run_inline, run_parameterized)]
+  print '%10s %14s %8s' % ('inline', 'parameterized', 'speedup')
+  print '%8.1fus %12.1fus %7.1fx' % (times[0], times[1], times[0] / times[1])
+
+
+def fql_indexes():
+  """Looks up one friend's friends in a 1M row friend table, scan vs index.
+  """
+  schema = schemautil.FqlSchema.read()
+  conn = schemautil.connect(':memory:')
+  conn.executescript(schema.table_to_sql('friend'))
+  conn.executemany('INSERT INTO friend (uid1, uid2) VALUES (?, ?)',
+                   ((i // 100, i) for i in xrange(1000000)))
+  conn.commit()
+
+  query = 'SELECT uid2 FROM friend WHERE uid1 = ?'
+  uid1s = itertools.cycle(xrange(10000))
+  lookup = lambda: conn.execute(query, (next(uid1s),)).fetchall()
+
+  indexed = best_time(lookup, options.number)
+  conn.execute('DROP INDEX friend_uid1')
+  # scans are slow, so run fewer
+  scan = best_time(lookup, max(options.number // 100, 1))
+
+  print '%10s %10s %8s' % ('scan', 'index', 'speedup')
+  print '%8.1fus %8.1fus %7.1fx' % (scan, indexed, scan / indexed)
+
+
+def naive_sqlite_to_json(schema, cursor, table):
+  """The original Schema.sqlite_to_json(), which looks up and checks each
+  column for every cell. Used as the baseline in json_decode.
+  """
+  colnames = [d[0] for d in cursor.description]
+  columns = [schema.get_column(table, name) for name in colnames]
+  objects = []
+
+  for row in cursor.fetchall():
+    object = {}
+    for colname, column, val in zip(colnames, columns, row):
+      object[colname] = val
+      if column:
+        if val and not column.sqlite_type:
+          object[colname] = json.loads(val)
+        elif column.fb_type == 'bool':
+          object[colname] = bool(val)
+    objects.append(object)
+
+  return objects
+
+
+def json_decode():
+  """Converts 1000 row results from the widest FQL tables to JSON objects.
+  """
+  schema = schemautil.FqlSchema.read()
+  conn = schemautil.connect(':memory:')
+
+  # floor is the time to just fetch the rows and parse their JSON columns,
+  # which any decoder has to do, so best is the most speedup possible.
+  print '%10s %10s %10s %8s %8s  table' % (
+    'naive', 'decoder', 'floor', 'speedup', 'best')
+  for table in 'user', 'application':
+    cols = schema.tables[table]
+    conn.executescript(schema.table_to_sql(table))
+    # rows must differ, since identical rows are deduped
+    rows = [['{"x": %d}' % i if not col.sqlite_type
+             else i % 2 if col.fb_type == 'bool'
+             else i + j if col.sqlite_type == 'INTEGER'
+             else 'value %d' % i
+             for i, col in enumerate(cols)]
+            for j in xrange(1000)]
+    conn.executemany('INSERT INTO `%s` (%s) VALUES (%s)' % (
+        table, ', '.join(c.name for c in cols), ', '.join('?' * len(cols))),
+        rows)
+
+    query = 'SELECT %s FROM `%s`' % (', '.join(c.name for c in cols), table)
+    json_indices = [i for i, col in enumerate(cols) if not col.sqlite_type]
+    number = max(options.number // 100, 1)
+    times = [
+      best_time(lambda: naive_sqlite_to_json(schema, conn.execute(query), table),
+                number),
+      best_time(lambda: schema.sqlite_to_json(conn.execute(query), table),
+                number),
+      best_time(lambda: [[schemautil.json_loads(row[i]) for i in json_indices]
+                         for row in conn.execute(query)],
+                number)]
+    print '%8.1fus %8.1fus %8.1fus %7.1fx %7.1fx  %s (%d columns)' % (
+      times[0], times[1], times[2], times[0] / times[1], times[0] / times[2],
+      table, len(cols))
+
+
+def schema_load():
+  """Loads the FQL and Graph API schemas, eval() vs the pickle file.
+  """
+  print '%10s %10s %8s  schema' % ('eval', 'pickle', 'speedup')
+  for cls in schemautil.FqlSchema, schemautil.GraphSchema:
+    schema = cls.read()
+    with open(schema.py_file) as f:
+      py = f.read()
+    with open(schema.pickle_file(), 'rb') as f:
+      pickled = f.read()
+
+    number = max(options.number // 100, 1)
+    times = [best_time(lambda: eval(py, vars(schemautil)), number),
+             best_time(lambda: cPickle.loads(pickled), number)]
+    print '%8.1fus %8.1fus %7.1fx  %s' % (times[0], times[1],
+                                         times[0] / times[1], cls.__name__)
+
+
+def graph_aliases():
+  """Resolves 10 ids and aliases in a 1M object graph_objects table.
+  """
+  conn = schemautil.get_db(':memory:')
+  conn.executemany(
+    'INSERT INTO graph_objects (id, alias, data) VALUES (?, ?, "{}")',
+    ((str(i), 'user%d' % i if i % 2 else None) for i in xrange(1000000)))
+  conn.commit()
+  graph.GraphHandler.init(conn, '1')
+  handler = graph.GraphHandler()
+
+  names = ([str(i) for i in xrange(0, 100000, 20000)] +
+           ['user%d' % i for i in xrange(1, 100000, 20000)])
+  qmarks = ','.join('?' * len(names))
+  or_query = ('SELECT id, alias FROM graph_objects '
+              'WHERE id IN (%s) OR alias IN (%s)' % (qmarks, qmarks))
+
+  number = max(options.number // 10, 1)
+  times = [best_time(lambda: handler.lookup_names(names), options.number)]
+  times.insert(0, best_time(lambda: (handler.alias_cache.clear(),
+                                     handler.lookup_names(names)), number))
+  conn.execute('DROP INDEX graph_objects_alias')
+  times.insert(0, best_time(
+      lambda: conn.execute(or_query, names * 2).fetchall(), number))
+
+  print '%10s %10s %10s' % ('OR scan', 'UNION', 'cached')
+  print '%8.1fus %8.1fus %8.1fus' % tuple(times)
+
+
+def graph_objects():
+  """Fetches a 10KB object and its 100 element connection, then GETs them.
+  """
+  conn = schemautil.get_db(':memory:')
+  obj = dict(('field%d' % i, {'value': 'x' * 80, 'i': i}) for i in xrange(100))
+  conn.execute('INSERT INTO graph_objects VALUES ("1", "alice", ?)',
+               (json.dumps(obj),))
+  conn.executemany(
+    'INSERT INTO graph_connections (id, connection, data) '
+    'VALUES ("1", "albums", ?)',
+    (('{"id": "%d", "name": "album %d"}' % (i, i),) for i in xrange(100)))
+  conn.commit()
+  graph.GraphHandler.init(conn, '1')
+  handler = graph.GraphHandler()
+  namedict = graph.NameDict({'1': 'alice'})
+  cache = handler.object_cache
+
+  def fetch():
+    handler.get_objects(namedict)
+    handler.get_connections(namedict, 'albums')
+
+  times = [best_time(lambda: (cache.clear(), fetch()), options.number),
+           best_time(fetch, options.number)]
+  print '%10s %10s %8s' % ('decoded', 'cached', 'speedup')
+  print '%8.1fus %8.1fus %7.1fx' % (times[0], times[1], times[0] / times[1])
+
+  # full GET requests, which use the stored JSON as is
+  app = server.application()
+  get = lambda: [app.get_response(path) for path in ('/alice', '/alice/albums')]
+  orig = graph.GraphHandler.get_stored_json
+  graph.GraphHandler.get_stored_json = lambda *args: None
+  times = [best_time(get, options.number)]
+  graph.GraphHandler.get_stored_json = orig
+  times.append(best_time(get, options.number))
+  print '%10s %10s %8s' % ('GET cached', 'stored', 'speedup')
+  print '%8.1fus %8.1fus %7.1fx' % (times[0], times[1], times[0] / times[1])
+
+
+def graph_fields():
+  """GETs 2 fields of a 100 field object, whole vs selected in SQLite or Python.
+  """
+  conn = schemautil.get_db(':memory:')
+  obj = dict(('field%d' % i, {'value': 'x' * 80, 'i': i}) for i in xrange(100))
+  obj['id'] = '1'
+  conn.execute('INSERT INTO graph_objects VALUES ("1", "alice", ?)',
+               (json.dumps(obj),))
+  conn.commit()
+  graph.GraphHandler.init(conn, '1')
+  app = server.application()
+
+  def get(path):
+    return lambda: app.get_response(path)
+
+  whole = get('/?ids=alice')
+  fields = get('/?ids=alice&fields=field1,field2')
+  times = [best_time(whole, options.number),
+           best_time(fields, options.number)]
+  graph.GraphHandler.json1 = False
+  cache = graph.GraphHandler.object_cache
+  times += [best_time(lambda: (cache.clear(), fields()), options.number),
+            best_time(fields, options.number)]
+  sizes = [len(whole().body), len(fields().body)]
+
+  print '%10s %10s %10s %10s' % ('whole', 'sqlite', 'python', 'py cached')
+  print '%8.1fus %8.1fus %8.1fus %8.1fus  (%d vs %d bytes)' % tuple(
+    times + sizes)
+
+
+def graph_posts():
+  """POSTs to a feed in a database file, then GETs the feed's first page.
+  """
+  filename = tempfile.mktemp(prefix='mockfacebook_benchmark.')
+  try:
+    conn = schemautil.get_db(filename)
+    conn.execute('INSERT INTO graph_objects VALUES ("3", NULL, ?)',
+                 (json.dumps({'id': '3', 'type': 'page'}),))
+    conn.commit()
+    graph.GraphHandler.init(conn, '1')
+    app = server.application()
+    post = lambda: app.get_response('/3/feed', method='POST',
+                                    POST={'message': 'hello'})
+    first_page = lambda: app.get_response('/3/feed?limit=25')
+
+    times = [best_time(post, options.number),
+             best_time(first_page, options.number)]
+    num_posts = conn.execute(
+      'SELECT COUNT(*) FROM posted_graph_connections WHERE connection = "feed"'
+      ).fetchone()[0]
+  finally:
+    testutil.remove_db(filename)
+
+  print '%10s %10s' % ('POST', 'first page')
+  print '%8.1fus %8.1fus  (%d posts)' % tuple(times + [num_posts])
+
+
+def oauth_tokens():
+  """Checks an access token in a 100K token table, scan vs index vs cached,
+  and a signed access token.
+  """
+  conn = schemautil.get_db(':memory:')
+  conn.executemany('INSERT INTO oauth_access_tokens (code, token) VALUES ("x", ?)',
+                   (('token%d' % i,) for i in xrange(100000)))
+  conn.commit()
+  oauth.BaseHandler.init(conn)
+  cache = oauth.BaseHandler.token_cache
+  check = lambda: oauth.AccessTokenHandler.is_valid_token(conn, 'token50000')
+
+  times = [best_time(lambda: (cache.clear(), check()), options.number),
+           best_time(check, options.number)]
+  oauth.BaseHandler.signer = oauth.TokenSigner('secret')
+  signed = oauth.BaseHandler.signer.sign('x', '1')
+  times.append(best_time(
+      lambda: oauth.AccessTokenHandler.is_valid_token(conn, signed),
+      options.number))
+  oauth.BaseHandler.signer = None
+  conn.execute('DROP INDEX oauth_access_tokens_token')
+  # scans are slow, so run fewer
+  times.insert(0, best_time(lambda: (cache.clear(), check()),
+                            max(options.number // 100, 1)))
+
+  print '%10s %10s %10s %10s' % ('scan', 'index', 'cached', 'signed')
+  print '%8.1fus %8.1fus %8.1fus %8.1fus' % tuple(times)
+
+
+class CommitEach(schemautil.GroupCommitter):
+  """Commits every write separately. The baseline in oauth_logins.
+  """
+  def write(self, statement, params=()):
+    self.conn.execute(statement, params)
+    self.conn.commit()
+
+
+def oauth_logins():
+  """Logs in with the client side flow from 8 threads at once, in a
+  database file, with and without WAL mode and group commit.
+  """
+  url = '/dialog/oauth?client_id=1&redirect_uri=http://x/&response_type=token'
+  app = server.application()
+  pool = multiprocessing.pool.ThreadPool(8)
+  login = lambda i: app.get_response(url)
+
+  times = []
+  for journal_mode, committer in (('DELETE', CommitEach), ('WAL', CommitEach),
+                                  ('WAL', schemautil.GroupCommitter)):
+    filename = tempfile.mktemp(prefix='mockfacebook_benchmark.')
+    try:
+      conn = schemautil.get_db(filename)
+      conn.execute('PRAGMA journal_mode = %s' % journal_mode)
+      conn.close()
+      conn = schemautil.ThreadLocalConnection(filename)
+      oauth.BaseHandler.init(conn)
+      oauth.BaseHandler.committer = committer(conn, window=oauth.COMMIT_WINDOW)
+      times.append(best_time(lambda: pool.map(login, xrange(options.number)), 1)
+                   / options.number)
+    finally:
+      for suffix in '', '-wal', '-shm', '-journal':
+        if os.path.exists(filename + suffix):
+          os.remove(filename + suffix)
+
+  pool.close()
+  print '%10s %10s %10s %8s' % ('rollback', 'WAL', 'WAL group', 'speedup')
+  print '%8.1fus %8.1fus %8.1fus %7.1fx' % tuple(times + [times[0] / times[2]])
+
+
+def oauth_sweep():
+  """Sweeps 100K expired access tokens out of 200K, in a database file,
+  without pauses between batches. Reports deletes per second and how long each
+  batch holds the write lock.
+  """
+  filename = tempfile.mktemp(prefix='mockfacebook_benchmark.')
+  try:
+    conn = schemautil.get_db(filename)
+    conn.executemany('INSERT INTO oauth_access_tokens (code, token, expires_at) '
+                     'VALUES ("x", ?, ?)',
+                     (('token%d' % i, i % 2 * 2) for i in xrange(200000)))
+    conn.commit()
+    sweeper = oauth.Sweeper(conn)
+    orig = oauth.SWEEP_BATCH_PAUSE
+    oauth.SWEEP_BATCH_PAUSE = 0
+    sweeper.sweep(now=1)
+    oauth.SWEEP_BATCH_PAUSE = orig
+    stats = sweeper.stats()
+  finally:
+    testutil.remove_db(filename)
+
+  deleted = stats['deleted']['oauth_access_tokens']
+  batches = -(-deleted // oauth.SWEEP_BATCH_SIZE)
+  print '%10s %10s %10s' % ('deleted', 'per sec', 'per batch')
+  print '%10d %10d %8.1fms' % (deleted, stats['deleted_per_sec'],
+                               deleted / stats['deleted_per_sec'] / batches * 1000)
+
+
+BENCHMARKS = (fql_parser, fql_statements, fql_indexes, json_decode,
+              schema_load, graph_aliases, graph_objects, graph_fields,
+              graph_posts, oauth_logins, oauth_tokens, oauth_sweep)
+
+
+def main(args):
+  global options
+  logging.disable(logging.CRITICAL + 1)
+
+  parser = optparse.OptionParser(
+    usage='%prog [options] [BENCHMARK ...]',
+    description='Benchmarks: %s' % ', '.join(b.__name__ for b in BENCHMARKS))
+  parser.add_option('-n', '--number', type='int', default=1000,
+                    help='iterations per timing run (default %default)')
+  options, names = parser.parse_args(args=args[1:])
+
+  by_name = dict((b.__name__, b) for b in BENCHMARKS)
+  for name in names:
+    if name not in by_name:
+      parser.error('unknown benchmark %s' % name)
+
+  for benchmark in BENCHMARKS:
+    if not names or benchmark.__name__ in names:
+      print '== %s: %s' % (benchmark.__name__, benchmark.__doc__.strip())
+      benchmark()
+      print
+
+
+if __name__ == '__main__':
+  main(sys.argv)
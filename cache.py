@@ -0,0 +1,104 @@
+"""In-process caches.
+"""
+
+__author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
+
+import collections
+import threading
+
+
+class LruCache(object):
+  """A bounded, thread safe, least recently used cache.
+
+  Can be bounded by number of entries, total size, or both. Sizes are whatever
+  the caller passes to put(), e.g. bytes.
+
+  Attributes:
+    max_size: integer, the maximum number of entries, or None for no limit
+    max_bytes: integer, the maximum total size of the entries, or None for no
+      limit
+    bytes: integer, the current total size of the entries
+    hits: integer
+    misses: integer
+    evictions: integer
+  """
+
+  def __init__(self, max_size=None, max_bytes=None):
+    self.max_size = max_size
+    self.max_bytes = max_bytes
+    # maps key to (value, size) tuple
+    self.entries = collections.OrderedDict()
+    self.lock = threading.Lock()
+    self.bytes = self.hits = self.misses = self.evictions = 0
+
+  def __len__(self):
+    return len(self.entries)
+
+  def __contains__(self, key):
+    """Doesn't count as a hit or miss, and doesn't update recency."""
+    return key in self.entries
+
+  def get(self, key, default=None):
+    """Returns the value for key, or default if it's not cached.
+    """
+    with self.lock:
+      try:
+        entry = self.entries.pop(key)
+      except KeyError:
+        self.misses += 1
+        return default
+      self.entries[key] = entry
+      self.hits += 1
+      return entry[0]
+
+  def put(self, key, val, size=0):
+    """Caches val for key, evicting the least recently used entries if full.
+
+    Args:
+      key: hashable
+      val: any value
+      size: integer, counted against max_bytes
+    """
+    with self.lock:
+      self._remove(key)
+      self.entries[key] = (val, size)
+      self.bytes += size
+      while ((self.max_size is not None and len(self.entries) > self.max_size) or
+             (self.max_bytes is not None and self.bytes > self.max_bytes)):
+        unused_key, (unused_val, evicted_size) = self.entries.popitem(last=False)
+        self.bytes -= evicted_size
+        self.evictions += 1
+
+  def pop(self, key, default=None):
+    """Removes and returns the value for key, or default if it's not cached.
+    """
+    with self.lock:
+      return self._remove(key, default)
+
+  def _remove(self, key, default=None):
+    """Removes and returns the value for key. The caller must hold lock.
+    """
+    entry = self.entries.pop(key, None)
+    if entry is None:
+      return default
+    self.bytes -= entry[1]
+    return entry[0]
+
+  def clear(self):
+    """Removes all entries. Doesn't reset the counters.
+    """
+    with self.lock:
+      self.entries.clear()
+      self.bytes = 0
+
+  def stats(self):
+    """Returns a dict of the counters and current size.
+    """
+    return {'size': len(self.entries),
+            'max_size': self.max_size,
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            }
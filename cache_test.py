@@ -0,0 +1,70 @@
+#!/usr/bin/python
+"""Unit tests for cache.py.
+"""
+
+__author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
+
+import unittest
+
+import cache
+
+
+class LruCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.cache = cache.LruCache(2)
+
+  def test_get_and_put(self):
+    self.assertEquals(None, self.cache.get('a'))
+    self.assertEquals('x', self.cache.get('a', 'x'))
+    self.cache.put('a', 1)
+    self.assertEquals(1, self.cache.get('a'))
+    self.assertEquals({'size': 1, 'max_size': 2, 'bytes': 0, 'max_bytes': None,
+                       'hits': 1, 'misses': 2, 'evictions': 0},
+                      self.cache.stats())
+
+  def test_evicts_least_recently_used(self):
+    self.cache.put('a', 1)
+    self.cache.put('b', 2)
+    self.cache.get('a')
+    self.cache.put('c', 3)
+
+    self.assertIn('a', self.cache)
+    self.assertNotIn('b', self.cache)
+    self.assertIn('c', self.cache)
+    self.assertEquals(1, self.cache.evictions)
+
+  def test_pop_and_clear(self):
+    self.cache.put('a', 1)
+    self.cache.put('b', 2)
+    self.assertEquals(1, self.cache.pop('a'))
+    self.assertEquals(None, self.cache.pop('a'))
+    self.cache.clear()
+    self.assertEquals(0, len(self.cache))
+
+  def test_max_bytes(self):
+    lru = cache.LruCache(max_bytes=10)
+    lru.put('a', 1, size=4)
+    lru.put('b', 2, size=4)
+    self.assertEquals(8, lru.bytes)
+
+    lru.put('a', 3, size=5)
+    self.assertEquals(9, lru.bytes)
+
+    # evicts b, the least recently used
+    lru.put('c', 4, size=3)
+    self.assertNotIn('b', lru)
+    self.assertEquals(8, lru.bytes)
+    self.assertEquals(1, lru.evictions)
+
+    self.assertEquals(3, lru.pop('a'))
+    self.assertEquals(3, lru.bytes)
+
+    # entries bigger than max_bytes aren't kept
+    lru.put('d', 5, size=11)
+    self.assertEquals(0, len(lru))
+    self.assertEquals(0, lru.bytes)
+
+
+if __name__ == '__main__':
+  unittest.main()
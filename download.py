@@ -687,9 +687,12 @@ def main():
   global options
   options = parse_args()
 
-  if options.db_file:  # FIXME - should do dupe checking
-    sql = 'INSERT INTO oauth_access_tokens(code, token) VALUES("asdf", "%s");' % options.access_token
-    schemautil.get_db(options.db_file).executescript(sql)
+  if options.db_file:
+    conn = schemautil.get_db(options.db_file)
+    # replace so that it never expires, even if an old run inserted it
+    conn.execute('INSERT OR REPLACE INTO oauth_access_tokens(code, token) '
+                 'VALUES("asdf", ?)', (options.access_token,))
+    conn.commit()
 
   if options.fql_schema:
     fql_schema = schemautil.FqlSchema()
@@ -5,20 +5,31 @@ Based on https://developers.facebook.com/docs/reference/fql/ .
 
 __author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
 
+import itertools
 import logging
+import random
 import re
 import json
 import sqlite3
 import time
+import xml.sax.saxutils
 
-import sqlparse
-from sqlparse import sql
-from sqlparse import tokens
 import webapp2
-
+try:
+  # only used by Fql, which FqlHandler doesn't use
+  import sqlparse
+  from sqlparse import sql
+  from sqlparse import tokens
+except ImportError:
+  sqlparse = None
+
+import cache
 import oauth
 import schemautil
 
+# maximum number of translated FQL queries to cache.
+QUERY_CACHE_SIZE = 1000
+
 
 class FqlError(Exception):
   """Base error class.
@@ -73,6 +84,9 @@ class InvalidAccessTokenError(FqlError):
 class Fql(object):
   """A parsed FQL statement. Just a thin wrapper around sqlparse.sql.Statement.
 
+  FqlHandler uses NativeFql instead, which is much faster. This is kept as the
+  reference implementation that NativeFql is tested against.
+
   Attributes:
     query: original FQL query string
     me: integer, the user id that me() should return
@@ -82,7 +96,8 @@ class Fql(object):
     where: sql.Where or None
   """
 
-  # FQL functions. Maps function name to expected number of parameters.
+  # The FQL functions that Fql rewrites. Maps function name to expected number
+  # of parameters.
   FUNCTIONS = {
     'me': 0,
     'now': 0,
@@ -168,9 +183,7 @@ class Fql(object):
   def process_functions(self, group=None):
     """Recursively parse and process FQL functions in the given group token.
 
-    TODO: switch to sqlite3.Connection.create_function().
-
-    Currently handles: me(), now()
+    Currently handles: me(), now(), strlen(), substr(), strpos()
     """
     if group is None:
       group = self.statement
@@ -222,15 +235,333 @@ class Fql(object):
         self.process_functions(tok)
 
 
+# Token types returned by tokenize().
+WHITESPACE, STRING, NUMBER, NAME, KEYWORD, OPERATOR, PUNCTUATION = range(7)
+
+# Words that are FQL keywords. Every other word is a table, column, or function.
+KEYWORDS = frozenset((
+    'AND', 'AS', 'ASC', 'BETWEEN', 'BY', 'DESC', 'DISTINCT', 'FROM', 'GROUP',
+    'HAVING', 'IN', 'IS', 'LIKE', 'LIMIT', 'NOT', 'NULL', 'OFFSET', 'OR', 'ORDER',
+    'SELECT', 'UNION', 'WHERE'))
+
+# Keywords that end a WHERE clause.
+WHERE_END_KEYWORDS = frozenset(('GROUP', 'HAVING', 'LIMIT', 'ORDER', 'UNION'))
+
+TOKEN_RE = re.compile(r"""
+  (?P<whitespace>\s+) |
+  (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*") |
+  (?P<number>\d+(?:\.\d*)?) |
+  (?P<name>[A-Za-z_]\w*|`[^`]*`) |
+  (?P<punctuation>[(),.;]) |
+  (?P<operator><=|>=|<>|!=|==|\|\||.)
+  """, re.VERBOSE | re.DOTALL)
+
+TOKEN_TYPES = {'whitespace': WHITESPACE,
+               'string': STRING,
+               'number': NUMBER,
+               'name': NAME,
+               'punctuation': PUNCTUATION,
+               'operator': OPERATOR,
+               }
+
+
+def tokenize(query):
+  """Splits an FQL query into tokens.
+
+  Joining the token values together always reproduces the original query.
+
+  Args:
+    query: string
+
+  Returns: list of [integer token type, string value] lists
+  """
+  tokens = []
+  for match in TOKEN_RE.finditer(query):
+    type = TOKEN_TYPES[match.lastgroup]
+    value = match.group()
+    if type == NAME and value.upper() in KEYWORDS:
+      type = KEYWORD
+    tokens.append([type, value])
+  return tokens
+
+
+# FQL functions. Maps function name to expected number of parameters.
+FUNCTIONS = {
+  'lower': 1,
+  'me': 0,
+  'now': 0,
+  'rand': 0,
+  'strlen': 1,
+  'strpos': 2,
+  'substr': 3,
+  'upper': 1,
+  }
+
+
+def null_if_null_arg(fn):
+  """Wraps a SQLite user function so that it returns NULL for NULL arguments.
+  """
+  def wrapper(*args):
+    if None not in args:
+      return fn(*args)
+  return wrapper
+
+
+def create_functions(conn, me):
+  """Registers the FQL functions as SQLite user functions on a connection.
+
+  substr() replaces SQLite's built in three parameter substr() on conn, since
+  its index parameter is 0-based in FQL but 1-based in SQLite.
+
+  Args:
+    conn: sqlite3.Connection or schemautil.ThreadLocalConnection
+    me: function that returns the user id that me() should return
+  """
+  impls = {
+    'lower': lambda s: unicode(s).lower(),
+    'me': me,
+    'now': lambda: int(time.time()),
+    'rand': random.random,
+    'strlen': lambda s: len(unicode(s)),
+    'strpos': lambda s, sub: unicode(s).find(unicode(sub)),
+    'substr': lambda s, start, length: unicode(s)[start:][:length],
+    'upper': lambda s: unicode(s).upper(),
+    }
+  assert set(impls) == set(FUNCTIONS)
+
+  for name, num_params in FUNCTIONS.items():
+    fn = impls[name]
+    if num_params:
+      fn = null_if_null_arg(fn)
+    conn.create_function(name, num_params, fn)
+
+
+class NativeFql(object):
+  """A parsed FQL statement, parsed without sqlparse.
+
+  Only understands the FQL grammar: SELECT columns FROM table WHERE ..., with
+  function calls, IN subqueries, ORDER BY and LIMIT. Generates SQLite queries
+  that return the same results and errors as Fql's, with a few exceptions where
+  Fql is wrong:
+
+  - every column name in the WHERE clause is checked for indexability, even
+    ones that sqlparse lexes as keywords, e.g. type.
+  - function calls inside other function calls' arguments are checked too.
+  - function parameters are counted by commas, so they can be expressions.
+
+  Unlike Fql, function calls aren't rewritten. They're left in the SQLite query
+  and run by the SQLite user functions that create_functions() registers, so
+  the SQLite query doesn't depend on me() or now() and strpos() works on
+  columns too.
+
+  Attributes:
+    query: original FQL query string
+    schema: schemautil.FqlSchema
+    tokens: list of tokens, as returned by tokenize()
+    table: integer index of the table name token, or None
+    where: [start, end) list of the WHERE clause's token indices, or None
+  """
+
+  def __init__(self, schema, query):
+    """Args:
+      query: FQL statement
+    """
+    logging.debug('parsing %s' % query)
+    self.schema = schema
+    self.query = query
+    self.tokens = tokens = tokenize(query)
+    self.table = None
+    self.where = None
+
+    depth = 0
+    for i, (type, value) in enumerate(tokens):
+      if value == '(':
+        depth += 1
+      elif value == ')':
+        depth -= 1
+      elif depth > 0:
+        continue
+      elif value == ';':
+        # only the first statement. include trailing whitespace, like sqlparse.
+        end = i + 1
+        if end < len(tokens) and tokens[end][0] == WHITESPACE:
+          end += 1
+        del tokens[end:]
+        break
+      elif type == KEYWORD:
+        keyword = value.upper()
+        if keyword == 'FROM' and self.table is None and self.where is None:
+          self.table = self.next_token(i)
+        elif keyword == 'WHERE' and self.where is None:
+          self.where = [i, len(tokens)]
+        elif (keyword in WHERE_END_KEYWORDS and self.where and
+              self.where[1] == len(tokens)):
+          self.where[1] = i
+
+    if self.where:
+      self.where[1] = min(self.where[1], len(tokens))
+
+    logging.debug('table %s, where %s' % (self.table_name(), self.where))
+
+  def next_token(self, i):
+    """Returns the index of the next non-whitespace token after i, or None.
+    """
+    for j in xrange(i + 1, len(self.tokens)):
+      if self.tokens[j][0] != WHITESPACE:
+        return j
+    return None
+
+  def is_call(self, i):
+    """Returns True if token i is a function name, ie followed by (.
+    """
+    return (self.tokens[i][0] == NAME and i + 1 < len(self.tokens) and
+            self.tokens[i + 1][1] == '(')
+
+  def table_name(self):
+    """Returns the table name, or '' if None.
+    """
+    if self.table is not None:
+      return self.tokens[self.table][1]
+    else:
+      return ''
+
+  def validate(self):
+    """Checks the query for Facebook API semantic errors.
+
+    Raises: FqlError
+    """
+    first = self.tokens[0][1] if self.tokens else ''
+    second = self.next_token(0)
+    if first != 'SELECT':
+      raise UnexpectedError(first)
+    elif second is not None and self.tokens[second][1] == '*':
+      raise WildcardError()
+    elif not self.where:
+      raise UnexpectedEndError()
+    elif self.table is None:
+      raise UnexpectedError('WHERE')
+
+    # only check the top level of the WHERE clause, not subqueries
+    table = self.table_name()
+    columns = self.schema.columns.get(table, ())
+    indexable = self.schema.indexable_columns.get(table, ())
+    depth = 0
+    for i in xrange(*self.where):
+      type, value = self.tokens[i]
+      if value == '(':
+        depth += 1
+      elif value == ')':
+        depth -= 1
+      elif (depth == 0 and type == NAME and value in columns and
+            value not in indexable and not self.is_call(i)):
+        raise NotIndexableError()
+
+  def to_sqlite(self):
+    """Converts to a SQLite query.
+
+    Specifically:
+    - validates
+    - checks functions
+    - quotes the table name with backquotes
+    """
+    self.validate()
+    self.check_functions()
+    self.tokens[self.table][1] = '`%s`' % self.tokens[self.table][1]
+    return ''.join(value for type, value in self.tokens)
+
+  def to_parameterized_sqlite(self):
+    """Converts to a SQLite query with the WHERE clause's literals as parameters.
+
+    Queries that only differ in those literals, e.g. ids, generate the same
+    SQLite query, so sqlite3 can reuse its compiled statement.
+
+    Returns: (string SQLite query, tuple of parameter values)
+    """
+    self.to_sqlite()
+
+    params = []
+    for tok in self.tokens[slice(*self.where)]:
+      type, value = tok
+      if type == STRING:
+        quote = value[0]
+        params.append(value[1:-1].replace(quote * 2, quote))
+      elif type == NUMBER:
+        params.append(float(value) if '.' in value else int(value))
+      else:
+        continue
+      tok[1] = '?'
+
+    return ''.join(value for type, value in self.tokens), tuple(params)
+
+  def check_functions(self):
+    """Checks that the query's function calls are valid FQL functions.
+
+    The functions themselves are SQLite user functions registered by
+    create_functions(), so the calls are passed through as is.
+
+    Raises: InvalidFunctionError, ParamMismatchError
+    """
+    tokens = self.tokens
+    for start in xrange(len(tokens)):
+      if not self.is_call(start):
+        continue
+
+      name = tokens[start][1]
+      if name not in FUNCTIONS:
+        raise InvalidFunctionError(name)
+
+      # count the top level parameters
+      depth = 0
+      actual_num = 0
+      for type, value in tokens[start + 1:]:
+        if value == '(':
+          depth += 1
+        elif value == ')':
+          depth -= 1
+          if depth == 0:
+            break
+        elif depth == 1 and type != WHITESPACE:
+          if value == ',':
+            actual_num += 1
+          elif actual_num == 0:
+            actual_num = 1
+
+      expected_num = FUNCTIONS[name]
+      if actual_num != expected_num:
+        raise ParamMismatchError(name, expected_num, actual_num)
+
+
+def iter_json_array(batches):
+  """Generates a JSON array incrementally.
+
+  The concatenated output is identical to json.dumps(objects, indent=2).
+
+  Args:
+    batches: iterable of lists of JSON-serializable objects
+
+  Yields: string chunks of JSON, one per non-empty batch, plus the end
+  """
+  separator = '[\n  '
+  for batch in batches:
+    if batch:
+      yield separator + ', \n  '.join(
+        json.dumps(obj, indent=2).replace('\n', '\n  ') for obj in batch)
+      separator = ', \n  '
+
+  yield '[]' if separator == '[\n  ' else '\n]'
+
+
 class FqlHandler(webapp2.RequestHandler):
   """The FQL request handler.
 
-  Not thread safe!
+  Thread safe as long as conn is, e.g. a schemautil.ThreadLocalConnection.
 
   Class attributes:
     conn: sqlite3.Connection
     me: integer, the user id that me() should return
     schema: schemautil.FqlSchema
+    query_cache: cache.LruCache mapping FQL query to (table, SQLite query,
+      parameters) tuple or the FqlError it raised
   """
 
   XML_TEMPLATE = """\
@@ -257,10 +588,13 @@ class FqlHandler(webapp2.RequestHandler):
     cls.conn = conn
     cls.me = me
     cls.schema = schemautil.FqlSchema.read()
+    cls.query_cache = cache.LruCache(QUERY_CACHE_SIZE)
+    create_functions(conn, lambda: cls.me)
 
   def get(self):
     table = ''
     graph_endpoint = (self.request.path == '/fql')
+    batches = error = None
 
     try:
       query_arg = 'q' if graph_endpoint else 'query'
@@ -274,45 +608,94 @@ class FqlHandler(webapp2.RequestHandler):
 
       logging.debug('Received FQL query: %s' % query)
 
-      fql = Fql(self.schema, query, self.me)
-      # grab the table name before it gets munged
-      table = fql.table_name()
-      sqlite = fql.to_sqlite()
-      logging.debug('Running SQLite query: %s' % sqlite)
+      table, sqlite, params = self.translate(query)
+      logging.debug('Running SQLite query: %s %s' % (sqlite, params))
 
       try:
-        cursor = self.conn.execute(sqlite)
+        cursor = self.conn.execute(sqlite, params)
+        batches = self.schema.sqlite_to_json_batches(cursor, table)
+        # fetch the first batch now so that SQLite errors get reported
+        first = next(batches, [])
       except sqlite3.OperationalError, e:
         logging.debug('SQLite error: %s', e)
         raise SqliteError(unicode(e))
 
-      results = self.schema.sqlite_to_json(cursor, table)
+      batches = itertools.chain([first], batches)
 
     except FqlError, e:
-      results = self.error(self.request.GET, e.code, e.msg)
+      error = self.error(self.request.GET, e.code, e.msg)
 
     if self.request.get('format') == 'json' or graph_endpoint:
-      json.dump(results, self.response.out, indent=2)
+      if error:
+        json.dump(error, self.response.out, indent=2)
+      else:
+        # stream the rest of the rows
+        self.response.app_iter = iter_json_array(batches)
+    elif error:
+      self.response.out.write(self.render_xml_error(error))
     else:
-      self.response.out.write(self.render_xml(results, table))
+      self.response.app_iter = self.iter_xml(batches, table)
 
     self.response.headers['Content-Type'] = 'text/plain; charset=utf-8'
 
-  def render_xml(self, results, table):
-    """Renders a query result into an XML string response.
+  def translate(self, query):
+    """Converts an FQL query to SQLite, or returns the cached conversion.
+
+    Args:
+      query: string FQL query
+
+    Returns: (string table name, string SQLite query, tuple of parameters)
+
+    Raises: FqlError
+    """
+    translated = self.query_cache.get(query)
+
+    if translated is None:
+      fql = NativeFql(self.schema, query)
+      # grab the table name before it gets munged
+      table = fql.table_name()
+      try:
+        translated = (table,) + fql.to_parameterized_sqlite()
+      except FqlError, e:
+        translated = e
+      self.query_cache.put(query, translated)
+
+    if isinstance(translated, FqlError):
+      raise translated
+    return translated
+
+  def render_xml_error(self, error):
+    """Renders an error into an XML string response.
 
     Args:
-      results: dict mapping strings to strings or lists of (key, value) tuples
+      error: dict, as returned by error()
+    """
+    error['request_args'] = [{'arg': elem} for elem in error['request_args']]
+    return self.XML_ERROR_TEMPLATE % self.render_xml_part(error)
+
+  def iter_xml(self, batches, table):
+    """Generates a query result XML response incrementally.
+
+    Only one batch of rows is rendered at a time, and each batch is yielded as
+    a single chunk to keep writes to the socket down.
+
+    Args:
+      batches: iterable of lists of dicts representing JSON result objects
       table: string table name
+
+    Yields: UTF-8 encoded string chunks
     """
-    if 'error_code' in results:
-      template = self.XML_ERROR_TEMPLATE
-      results['request_args'] = [{'arg': elem} for elem in results['request_args']]
-    else:
-      template = self.XML_TEMPLATE
-      results = [{table: row} for row in results]
+    header, footer = self.XML_TEMPLATE.split('%s')
+    yield header
+
+    separator = ''
+    for batch in batches:
+      if batch:
+        yield (separator + '\n'.join(self.render_xml_part({table: row})
+                                     for row in batch)).encode('utf-8')
+        separator = '\n'
 
-    return template % self.render_xml_part(results)
+    yield footer
 
   def render_xml_part(self, results):
     """Recursively renders part of a query result into an XML string response.
@@ -333,7 +716,7 @@ class FqlHandler(webapp2.RequestHandler):
                      locals())
       return '\n'.join(elems)
     else:
-      return unicode(results)
+      return xml.sax.saxutils.escape(unicode(results))
 
   def error(self, args, code, msg):
     """Renders an error response.
@@ -1,6 +1,6 @@
 -- Do not edit! Generated automatically by mockfacebook.
 -- https://github.com/rogerhu/mockfacebook
--- 2012-10-23 22:34:02.059169
+-- 2026-10-18 04:02:40.148436
 
 
 CREATE TABLE IF NOT EXISTS `album` (
@@ -25,8 +25,37 @@ CREATE TABLE IF NOT EXISTS `album` (
   video_count INTEGER,
   like_info ,
   comment_info ,
-  UNIQUE (aid, object_id, owner, cover_pid, cover_object_id, name, created, modified, description, location, size, link, visible, modified_major, edit_link, type, can_upload, photo_count, video_count, like_info, comment_info)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `album_aid` ON `album` (aid);
+CREATE INDEX IF NOT EXISTS `album_object_id` ON `album` (object_id);
+CREATE INDEX IF NOT EXISTS `album_owner` ON `album` (owner);
+CREATE TRIGGER IF NOT EXISTS `album_dedupe` BEFORE INSERT ON `album`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `album` WHERE aid IS NEW.aid
+    AND object_id IS NEW.object_id
+    AND owner IS NEW.owner
+    AND ifnull(cover_pid, '') = ifnull(NEW.cover_pid, '')
+    AND ifnull(cover_object_id, '') = ifnull(NEW.cover_object_id, '')
+    AND ifnull(name, '') = ifnull(NEW.name, '')
+    AND ifnull(created, '') = ifnull(NEW.created, '')
+    AND ifnull(modified, '') = ifnull(NEW.modified, '')
+    AND ifnull(description, '') = ifnull(NEW.description, '')
+    AND ifnull(location, '') = ifnull(NEW.location, '')
+    AND ifnull(size, '') = ifnull(NEW.size, '')
+    AND ifnull(link, '') = ifnull(NEW.link, '')
+    AND ifnull(visible, '') = ifnull(NEW.visible, '')
+    AND ifnull(modified_major, '') = ifnull(NEW.modified_major, '')
+    AND ifnull(edit_link, '') = ifnull(NEW.edit_link, '')
+    AND ifnull(type, '') = ifnull(NEW.type, '')
+    AND ifnull(can_upload, '') = ifnull(NEW.can_upload, '')
+    AND ifnull(photo_count, '') = ifnull(NEW.photo_count, '')
+    AND ifnull(video_count, '') = ifnull(NEW.video_count, '')
+    AND ifnull(like_info, '') = ifnull(NEW.like_info, '')
+    AND ifnull(comment_info, '') = ifnull(NEW.comment_info, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in album');
+END;
 
 CREATE TABLE IF NOT EXISTS `application` (
   app_id TEXT,
@@ -78,8 +107,65 @@ CREATE TABLE IF NOT EXISTS `application` (
   user_support_email TEXT,
   user_support_url TEXT,
   website_url TEXT,
-  UNIQUE (app_id, api_key, namespace, display_name, icon_url, logo_url, company_name, developers, description, daily_active_users, weekly_active_users, monthly_active_users, category, subcategory, is_facebook_app, restriction_info, app_domains, auth_dialog_data_help_url, auth_dialog_description, auth_dialog_headline, auth_dialog_perms_explanation, auth_referral_user_perms, auth_referral_friend_perms, auth_referral_default_activity_privacy, auth_referral_enabled, auth_referral_extended_perms, auth_referral_response_type, canvas_fluid_height, canvas_fluid_width, canvas_url, contact_email, created_time, creator_uid, deauth_callback_url, iphone_app_store_id, hosting_url, mobile_web_url, page_tab_default_name, page_tab_url, privacy_policy_url, secure_canvas_url, secure_page_tab_url, server_ip_whitelist, social_discovery, terms_of_service_url, update_ip_whitelist, user_support_email, user_support_url, website_url)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `application_app_id` ON `application` (app_id);
+CREATE INDEX IF NOT EXISTS `application_api_key` ON `application` (api_key);
+CREATE INDEX IF NOT EXISTS `application_namespace` ON `application` (namespace);
+CREATE TRIGGER IF NOT EXISTS `application_dedupe` BEFORE INSERT ON `application`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `application` WHERE app_id IS NEW.app_id
+    AND api_key IS NEW.api_key
+    AND namespace IS NEW.namespace
+    AND ifnull(display_name, '') = ifnull(NEW.display_name, '')
+    AND ifnull(icon_url, '') = ifnull(NEW.icon_url, '')
+    AND ifnull(logo_url, '') = ifnull(NEW.logo_url, '')
+    AND ifnull(company_name, '') = ifnull(NEW.company_name, '')
+    AND ifnull(developers, '') = ifnull(NEW.developers, '')
+    AND ifnull(description, '') = ifnull(NEW.description, '')
+    AND ifnull(daily_active_users, '') = ifnull(NEW.daily_active_users, '')
+    AND ifnull(weekly_active_users, '') = ifnull(NEW.weekly_active_users, '')
+    AND ifnull(monthly_active_users, '') = ifnull(NEW.monthly_active_users, '')
+    AND ifnull(category, '') = ifnull(NEW.category, '')
+    AND ifnull(subcategory, '') = ifnull(NEW.subcategory, '')
+    AND ifnull(is_facebook_app, '') = ifnull(NEW.is_facebook_app, '')
+    AND ifnull(restriction_info, '') = ifnull(NEW.restriction_info, '')
+    AND ifnull(app_domains, '') = ifnull(NEW.app_domains, '')
+    AND ifnull(auth_dialog_data_help_url, '') = ifnull(NEW.auth_dialog_data_help_url, '')
+    AND ifnull(auth_dialog_description, '') = ifnull(NEW.auth_dialog_description, '')
+    AND ifnull(auth_dialog_headline, '') = ifnull(NEW.auth_dialog_headline, '')
+    AND ifnull(auth_dialog_perms_explanation, '') = ifnull(NEW.auth_dialog_perms_explanation, '')
+    AND ifnull(auth_referral_user_perms, '') = ifnull(NEW.auth_referral_user_perms, '')
+    AND ifnull(auth_referral_friend_perms, '') = ifnull(NEW.auth_referral_friend_perms, '')
+    AND ifnull(auth_referral_default_activity_privacy, '') = ifnull(NEW.auth_referral_default_activity_privacy, '')
+    AND ifnull(auth_referral_enabled, '') = ifnull(NEW.auth_referral_enabled, '')
+    AND ifnull(auth_referral_extended_perms, '') = ifnull(NEW.auth_referral_extended_perms, '')
+    AND ifnull(auth_referral_response_type, '') = ifnull(NEW.auth_referral_response_type, '')
+    AND ifnull(canvas_fluid_height, '') = ifnull(NEW.canvas_fluid_height, '')
+    AND ifnull(canvas_fluid_width, '') = ifnull(NEW.canvas_fluid_width, '')
+    AND ifnull(canvas_url, '') = ifnull(NEW.canvas_url, '')
+    AND ifnull(contact_email, '') = ifnull(NEW.contact_email, '')
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, '')
+    AND ifnull(creator_uid, '') = ifnull(NEW.creator_uid, '')
+    AND ifnull(deauth_callback_url, '') = ifnull(NEW.deauth_callback_url, '')
+    AND ifnull(iphone_app_store_id, '') = ifnull(NEW.iphone_app_store_id, '')
+    AND ifnull(hosting_url, '') = ifnull(NEW.hosting_url, '')
+    AND ifnull(mobile_web_url, '') = ifnull(NEW.mobile_web_url, '')
+    AND ifnull(page_tab_default_name, '') = ifnull(NEW.page_tab_default_name, '')
+    AND ifnull(page_tab_url, '') = ifnull(NEW.page_tab_url, '')
+    AND ifnull(privacy_policy_url, '') = ifnull(NEW.privacy_policy_url, '')
+    AND ifnull(secure_canvas_url, '') = ifnull(NEW.secure_canvas_url, '')
+    AND ifnull(secure_page_tab_url, '') = ifnull(NEW.secure_page_tab_url, '')
+    AND ifnull(server_ip_whitelist, '') = ifnull(NEW.server_ip_whitelist, '')
+    AND ifnull(social_discovery, '') = ifnull(NEW.social_discovery, '')
+    AND ifnull(terms_of_service_url, '') = ifnull(NEW.terms_of_service_url, '')
+    AND ifnull(update_ip_whitelist, '') = ifnull(NEW.update_ip_whitelist, '')
+    AND ifnull(user_support_email, '') = ifnull(NEW.user_support_email, '')
+    AND ifnull(user_support_url, '') = ifnull(NEW.user_support_url, '')
+    AND ifnull(website_url, '') = ifnull(NEW.website_url, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in application');
+END;
 
 CREATE TABLE IF NOT EXISTS `apprequest` (
   request_id TEXT,
@@ -89,8 +175,23 @@ CREATE TABLE IF NOT EXISTS `apprequest` (
   message TEXT,
   data TEXT,
   created_time INTEGER,
-  UNIQUE (request_id, app_id, recipient_uid, sender_uid, message, data, created_time)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `apprequest_request_id` ON `apprequest` (request_id);
+CREATE INDEX IF NOT EXISTS `apprequest_app_id` ON `apprequest` (app_id);
+CREATE INDEX IF NOT EXISTS `apprequest_recipient_uid` ON `apprequest` (recipient_uid);
+CREATE TRIGGER IF NOT EXISTS `apprequest_dedupe` BEFORE INSERT ON `apprequest`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `apprequest` WHERE request_id IS NEW.request_id
+    AND app_id IS NEW.app_id
+    AND recipient_uid IS NEW.recipient_uid
+    AND ifnull(sender_uid, '') = ifnull(NEW.sender_uid, '')
+    AND ifnull(message, '') = ifnull(NEW.message, '')
+    AND ifnull(data, '') = ifnull(NEW.data, '')
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in apprequest');
+END;
 
 CREATE TABLE IF NOT EXISTS `checkin` (
   checkin_id INTEGER,
@@ -102,8 +203,25 @@ CREATE TABLE IF NOT EXISTS `checkin` (
   timestamp INTEGER,
   tagged_uids ,
   message TEXT,
-  UNIQUE (checkin_id, author_uid, page_id, app_id, post_id, coords, timestamp, tagged_uids, message)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `checkin_checkin_id` ON `checkin` (checkin_id);
+CREATE INDEX IF NOT EXISTS `checkin_author_uid` ON `checkin` (author_uid);
+CREATE INDEX IF NOT EXISTS `checkin_page_id` ON `checkin` (page_id);
+CREATE TRIGGER IF NOT EXISTS `checkin_dedupe` BEFORE INSERT ON `checkin`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `checkin` WHERE checkin_id IS NEW.checkin_id
+    AND author_uid IS NEW.author_uid
+    AND page_id IS NEW.page_id
+    AND ifnull(app_id, '') = ifnull(NEW.app_id, '')
+    AND ifnull(post_id, '') = ifnull(NEW.post_id, '')
+    AND ifnull(coords, '') = ifnull(NEW.coords, '')
+    AND ifnull(timestamp, '') = ifnull(NEW.timestamp, '')
+    AND ifnull(tagged_uids, '') = ifnull(NEW.tagged_uids, '')
+    AND ifnull(message, '') = ifnull(NEW.message, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in checkin');
+END;
 
 CREATE TABLE IF NOT EXISTS `comment` (
   xid TEXT,
@@ -123,24 +241,70 @@ CREATE TABLE IF NOT EXISTS `comment` (
   user_likes INTEGER,
   text_tags ,
   is_private INTEGER,
-  UNIQUE (xid, object_id, post_id, fromid, time, text, id, username, reply_xid, post_fbid, app_id, likes, comments, can_like, user_likes, text_tags, is_private)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `comment_xid` ON `comment` (xid);
+CREATE INDEX IF NOT EXISTS `comment_object_id` ON `comment` (object_id);
+CREATE INDEX IF NOT EXISTS `comment_post_id` ON `comment` (post_id);
+CREATE TRIGGER IF NOT EXISTS `comment_dedupe` BEFORE INSERT ON `comment`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `comment` WHERE xid IS NEW.xid
+    AND object_id IS NEW.object_id
+    AND post_id IS NEW.post_id
+    AND ifnull(fromid, '') = ifnull(NEW.fromid, '')
+    AND ifnull(time, '') = ifnull(NEW.time, '')
+    AND ifnull(text, '') = ifnull(NEW.text, '')
+    AND ifnull(id, '') = ifnull(NEW.id, '')
+    AND ifnull(username, '') = ifnull(NEW.username, '')
+    AND ifnull(reply_xid, '') = ifnull(NEW.reply_xid, '')
+    AND ifnull(post_fbid, '') = ifnull(NEW.post_fbid, '')
+    AND ifnull(app_id, '') = ifnull(NEW.app_id, '')
+    AND ifnull(likes, '') = ifnull(NEW.likes, '')
+    AND ifnull(comments, '') = ifnull(NEW.comments, '')
+    AND ifnull(can_like, '') = ifnull(NEW.can_like, '')
+    AND ifnull(user_likes, '') = ifnull(NEW.user_likes, '')
+    AND ifnull(text_tags, '') = ifnull(NEW.text_tags, '')
+    AND ifnull(is_private, '') = ifnull(NEW.is_private, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in comment');
+END;
 
 CREATE TABLE IF NOT EXISTS `comments_info` (
   app_id TEXT,
   xid TEXT,
   count INTEGER,
   updated_time INTEGER,
-  UNIQUE (app_id, xid, count, updated_time)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `comments_info_app_id` ON `comments_info` (app_id);
+CREATE TRIGGER IF NOT EXISTS `comments_info_dedupe` BEFORE INSERT ON `comments_info`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `comments_info` WHERE app_id IS NEW.app_id
+    AND ifnull(xid, '') = ifnull(NEW.xid, '')
+    AND ifnull(count, '') = ifnull(NEW.count, '')
+    AND ifnull(updated_time, '') = ifnull(NEW.updated_time, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in comments_info');
+END;
 
 CREATE TABLE IF NOT EXISTS `connection` (
   source_id INTEGER,
   target_id INTEGER,
   target_type TEXT,
   is_following INTEGER,
-  UNIQUE (source_id, target_id, target_type, is_following)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `connection_source_id` ON `connection` (source_id);
+CREATE INDEX IF NOT EXISTS `connection_target_id` ON `connection` (target_id);
+CREATE TRIGGER IF NOT EXISTS `connection_dedupe` BEFORE INSERT ON `connection`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `connection` WHERE source_id IS NEW.source_id
+    AND target_id IS NEW.target_id
+    AND ifnull(target_type, '') = ifnull(NEW.target_type, '')
+    AND ifnull(is_following, '') = ifnull(NEW.is_following, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in connection');
+END;
 
 CREATE TABLE IF NOT EXISTS `cookies` (
   uid TEXT,
@@ -148,27 +312,66 @@ CREATE TABLE IF NOT EXISTS `cookies` (
   value TEXT,
   expires INTEGER,
   path TEXT,
-  UNIQUE (uid, name, value, expires, path)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `cookies_uid` ON `cookies` (uid);
+CREATE TRIGGER IF NOT EXISTS `cookies_dedupe` BEFORE INSERT ON `cookies`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `cookies` WHERE uid IS NEW.uid
+    AND ifnull(name, '') = ifnull(NEW.name, '')
+    AND ifnull(value, '') = ifnull(NEW.value, '')
+    AND ifnull(expires, '') = ifnull(NEW.expires, '')
+    AND ifnull(path, '') = ifnull(NEW.path, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in cookies');
+END;
 
 CREATE TABLE IF NOT EXISTS `developer` (
   developer_id TEXT,
   application_id TEXT,
   role TEXT,
-  UNIQUE (developer_id, application_id, role)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `developer_developer_id` ON `developer` (developer_id);
+CREATE INDEX IF NOT EXISTS `developer_application_id` ON `developer` (application_id);
+CREATE TRIGGER IF NOT EXISTS `developer_dedupe` BEFORE INSERT ON `developer`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `developer` WHERE developer_id IS NEW.developer_id
+    AND application_id IS NEW.application_id
+    AND ifnull(role, '') = ifnull(NEW.role, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in developer');
+END;
 
 CREATE TABLE IF NOT EXISTS `domain` (
   domain_id INTEGER,
   domain_name TEXT,
-  UNIQUE (domain_id, domain_name)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `domain_domain_id` ON `domain` (domain_id);
+CREATE INDEX IF NOT EXISTS `domain_domain_name` ON `domain` (domain_name);
+CREATE TRIGGER IF NOT EXISTS `domain_dedupe` BEFORE INSERT ON `domain`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `domain` WHERE domain_id IS NEW.domain_id
+    AND domain_name IS NEW.domain_name)
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in domain');
+END;
 
 CREATE TABLE IF NOT EXISTS `domain_admin` (
   owner_id TEXT,
   domain_id TEXT,
-  UNIQUE (owner_id, domain_id)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `domain_admin_owner_id` ON `domain_admin` (owner_id);
+CREATE INDEX IF NOT EXISTS `domain_admin_domain_id` ON `domain_admin` (domain_id);
+CREATE TRIGGER IF NOT EXISTS `domain_admin_dedupe` BEFORE INSERT ON `domain_admin`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `domain_admin` WHERE owner_id IS NEW.owner_id
+    AND domain_id IS NEW.domain_id)
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in domain_admin');
+END;
 
 CREATE TABLE IF NOT EXISTS `event` (
   eid INTEGER,
@@ -193,16 +396,55 @@ CREATE TABLE IF NOT EXISTS `event` (
   unsure_count INTEGER,
   declined_count INTEGER,
   not_replied_count INTEGER,
-  UNIQUE (eid, name, pic_small, pic_big, pic_square, pic, host, description, start_time, end_time, creator, update_time, location, venue, privacy, hide_guest_list, can_invite_friends, all_members_count, attending_count, unsure_count, declined_count, not_replied_count)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `event_eid` ON `event` (eid);
+CREATE TRIGGER IF NOT EXISTS `event_dedupe` BEFORE INSERT ON `event`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `event` WHERE eid IS NEW.eid
+    AND ifnull(name, '') = ifnull(NEW.name, '')
+    AND ifnull(pic_small, '') = ifnull(NEW.pic_small, '')
+    AND ifnull(pic_big, '') = ifnull(NEW.pic_big, '')
+    AND ifnull(pic_square, '') = ifnull(NEW.pic_square, '')
+    AND ifnull(pic, '') = ifnull(NEW.pic, '')
+    AND ifnull(host, '') = ifnull(NEW.host, '')
+    AND ifnull(description, '') = ifnull(NEW.description, '')
+    AND ifnull(start_time, '') = ifnull(NEW.start_time, '')
+    AND ifnull(end_time, '') = ifnull(NEW.end_time, '')
+    AND ifnull(creator, '') = ifnull(NEW.creator, '')
+    AND ifnull(update_time, '') = ifnull(NEW.update_time, '')
+    AND ifnull(location, '') = ifnull(NEW.location, '')
+    AND ifnull(venue, '') = ifnull(NEW.venue, '')
+    AND ifnull(privacy, '') = ifnull(NEW.privacy, '')
+    AND ifnull(hide_guest_list, '') = ifnull(NEW.hide_guest_list, '')
+    AND ifnull(can_invite_friends, '') = ifnull(NEW.can_invite_friends, '')
+    AND ifnull(all_members_count, '') = ifnull(NEW.all_members_count, '')
+    AND ifnull(attending_count, '') = ifnull(NEW.attending_count, '')
+    AND ifnull(unsure_count, '') = ifnull(NEW.unsure_count, '')
+    AND ifnull(declined_count, '') = ifnull(NEW.declined_count, '')
+    AND ifnull(not_replied_count, '') = ifnull(NEW.not_replied_count, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in event');
+END;
 
 CREATE TABLE IF NOT EXISTS `event_member` (
   uid TEXT,
   eid TEXT,
   rsvp_status TEXT,
   start_time TEXT,
-  UNIQUE (uid, eid, rsvp_status, start_time)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `event_member_uid` ON `event_member` (uid);
+CREATE INDEX IF NOT EXISTS `event_member_eid` ON `event_member` (eid);
+CREATE TRIGGER IF NOT EXISTS `event_member_dedupe` BEFORE INSERT ON `event_member`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `event_member` WHERE uid IS NEW.uid
+    AND eid IS NEW.eid
+    AND ifnull(rsvp_status, '') = ifnull(NEW.rsvp_status, '')
+    AND ifnull(start_time, '') = ifnull(NEW.start_time, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in event_member');
+END;
 
 CREATE TABLE IF NOT EXISTS `family` (
   profile_id TEXT,
@@ -210,14 +452,34 @@ CREATE TABLE IF NOT EXISTS `family` (
   name TEXT,
   birthday TEXT,
   relationship TEXT,
-  UNIQUE (profile_id, uid, name, birthday, relationship)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `family_profile_id` ON `family` (profile_id);
+CREATE TRIGGER IF NOT EXISTS `family_dedupe` BEFORE INSERT ON `family`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `family` WHERE profile_id IS NEW.profile_id
+    AND ifnull(uid, '') = ifnull(NEW.uid, '')
+    AND ifnull(name, '') = ifnull(NEW.name, '')
+    AND ifnull(birthday, '') = ifnull(NEW.birthday, '')
+    AND ifnull(relationship, '') = ifnull(NEW.relationship, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in family');
+END;
 
 CREATE TABLE IF NOT EXISTS `friend` (
   uid1 TEXT,
   uid2 TEXT,
-  UNIQUE (uid1, uid2)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `friend_uid1` ON `friend` (uid1);
+CREATE INDEX IF NOT EXISTS `friend_uid2` ON `friend` (uid2);
+CREATE TRIGGER IF NOT EXISTS `friend_dedupe` BEFORE INSERT ON `friend`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `friend` WHERE uid1 IS NEW.uid1
+    AND uid2 IS NEW.uid2)
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in friend');
+END;
 
 CREATE TABLE IF NOT EXISTS `friend_request` (
   uid_to TEXT,
@@ -225,22 +487,54 @@ CREATE TABLE IF NOT EXISTS `friend_request` (
   time INTEGER,
   message TEXT,
   unread INTEGER,
-  UNIQUE (uid_to, uid_from, time, message, unread)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `friend_request_uid_to` ON `friend_request` (uid_to);
+CREATE INDEX IF NOT EXISTS `friend_request_uid_from` ON `friend_request` (uid_from);
+CREATE TRIGGER IF NOT EXISTS `friend_request_dedupe` BEFORE INSERT ON `friend_request`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `friend_request` WHERE uid_to IS NEW.uid_to
+    AND uid_from IS NEW.uid_from
+    AND ifnull(time, '') = ifnull(NEW.time, '')
+    AND ifnull(message, '') = ifnull(NEW.message, '')
+    AND ifnull(unread, '') = ifnull(NEW.unread, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in friend_request');
+END;
 
 CREATE TABLE IF NOT EXISTS `friendlist` (
   owner INTEGER,
   flid TEXT,
   name TEXT,
   type TEXT,
-  UNIQUE (owner, flid, name, type)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `friendlist_owner` ON `friendlist` (owner);
+CREATE INDEX IF NOT EXISTS `friendlist_flid` ON `friendlist` (flid);
+CREATE TRIGGER IF NOT EXISTS `friendlist_dedupe` BEFORE INSERT ON `friendlist`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `friendlist` WHERE owner IS NEW.owner
+    AND flid IS NEW.flid
+    AND ifnull(name, '') = ifnull(NEW.name, '')
+    AND ifnull(type, '') = ifnull(NEW.type, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in friendlist');
+END;
 
 CREATE TABLE IF NOT EXISTS `friendlist_member` (
   flid TEXT,
   uid INTEGER,
-  UNIQUE (flid, uid)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `friendlist_member_flid` ON `friendlist_member` (flid);
+CREATE INDEX IF NOT EXISTS `friendlist_member_uid` ON `friendlist_member` (uid);
+CREATE TRIGGER IF NOT EXISTS `friendlist_member_dedupe` BEFORE INSERT ON `friendlist_member`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `friendlist_member` WHERE flid IS NEW.flid
+    AND uid IS NEW.uid)
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in friendlist_member');
+END;
 
 CREATE TABLE IF NOT EXISTS `group` (
   gid INTEGER,
@@ -264,8 +558,35 @@ CREATE TABLE IF NOT EXISTS `group` (
   icon68 TEXT,
   email TEXT,
   version INTEGER,
-  UNIQUE (gid, name, nid, pic_small, pic_big, pic, description, group_type, group_subtype, recent_news, creator, update_time, office, website, venue, privacy, icon, icon34, icon68, email, version)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `group_gid` ON `group` (gid);
+CREATE TRIGGER IF NOT EXISTS `group_dedupe` BEFORE INSERT ON `group`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `group` WHERE gid IS NEW.gid
+    AND ifnull(name, '') = ifnull(NEW.name, '')
+    AND ifnull(nid, '') = ifnull(NEW.nid, '')
+    AND ifnull(pic_small, '') = ifnull(NEW.pic_small, '')
+    AND ifnull(pic_big, '') = ifnull(NEW.pic_big, '')
+    AND ifnull(pic, '') = ifnull(NEW.pic, '')
+    AND ifnull(description, '') = ifnull(NEW.description, '')
+    AND ifnull(group_type, '') = ifnull(NEW.group_type, '')
+    AND ifnull(group_subtype, '') = ifnull(NEW.group_subtype, '')
+    AND ifnull(recent_news, '') = ifnull(NEW.recent_news, '')
+    AND ifnull(creator, '') = ifnull(NEW.creator, '')
+    AND ifnull(update_time, '') = ifnull(NEW.update_time, '')
+    AND ifnull(office, '') = ifnull(NEW.office, '')
+    AND ifnull(website, '') = ifnull(NEW.website, '')
+    AND ifnull(venue, '') = ifnull(NEW.venue, '')
+    AND ifnull(privacy, '') = ifnull(NEW.privacy, '')
+    AND ifnull(icon, '') = ifnull(NEW.icon, '')
+    AND ifnull(icon34, '') = ifnull(NEW.icon34, '')
+    AND ifnull(icon68, '') = ifnull(NEW.icon68, '')
+    AND ifnull(email, '') = ifnull(NEW.email, '')
+    AND ifnull(version, '') = ifnull(NEW.version, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in group');
+END;
 
 CREATE TABLE IF NOT EXISTS `group_member` (
   uid TEXT,
@@ -274,16 +595,41 @@ CREATE TABLE IF NOT EXISTS `group_member` (
   positions ,
   unread INTEGER,
   bookmark_order INTEGER,
-  UNIQUE (uid, gid, administrator, positions, unread, bookmark_order)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `group_member_uid` ON `group_member` (uid);
+CREATE INDEX IF NOT EXISTS `group_member_gid` ON `group_member` (gid);
+CREATE TRIGGER IF NOT EXISTS `group_member_dedupe` BEFORE INSERT ON `group_member`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `group_member` WHERE uid IS NEW.uid
+    AND gid IS NEW.gid
+    AND ifnull(administrator, '') = ifnull(NEW.administrator, '')
+    AND ifnull(positions, '') = ifnull(NEW.positions, '')
+    AND ifnull(unread, '') = ifnull(NEW.unread, '')
+    AND ifnull(bookmark_order, '') = ifnull(NEW.bookmark_order, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in group_member');
+END;
 
 CREATE TABLE IF NOT EXISTS `like` (
   object_id INTEGER,
   post_id TEXT,
   user_id INTEGER,
   object_type TEXT,
-  UNIQUE (object_id, post_id, user_id, object_type)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `like_object_id` ON `like` (object_id);
+CREATE INDEX IF NOT EXISTS `like_post_id` ON `like` (post_id);
+CREATE INDEX IF NOT EXISTS `like_user_id` ON `like` (user_id);
+CREATE TRIGGER IF NOT EXISTS `like_dedupe` BEFORE INSERT ON `like`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `like` WHERE object_id IS NEW.object_id
+    AND post_id IS NEW.post_id
+    AND user_id IS NEW.user_id
+    AND ifnull(object_type, '') = ifnull(NEW.object_type, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in like');
+END;
 
 CREATE TABLE IF NOT EXISTS `link` (
   link_id INTEGER,
@@ -295,8 +641,24 @@ CREATE TABLE IF NOT EXISTS `link` (
   url TEXT,
   picture TEXT,
   image_urls ,
-  UNIQUE (link_id, owner, owner_comment, created_time, title, summary, url, picture, image_urls)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `link_link_id` ON `link` (link_id);
+CREATE INDEX IF NOT EXISTS `link_owner` ON `link` (owner);
+CREATE TRIGGER IF NOT EXISTS `link_dedupe` BEFORE INSERT ON `link`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `link` WHERE link_id IS NEW.link_id
+    AND owner IS NEW.owner
+    AND ifnull(owner_comment, '') = ifnull(NEW.owner_comment, '')
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, '')
+    AND ifnull(title, '') = ifnull(NEW.title, '')
+    AND ifnull(summary, '') = ifnull(NEW.summary, '')
+    AND ifnull(url, '') = ifnull(NEW.url, '')
+    AND ifnull(picture, '') = ifnull(NEW.picture, '')
+    AND ifnull(image_urls, '') = ifnull(NEW.image_urls, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in link');
+END;
 
 CREATE TABLE IF NOT EXISTS `link_stat` (
   url TEXT,
@@ -308,8 +670,23 @@ CREATE TABLE IF NOT EXISTS `link_stat` (
   click_count INTEGER,
   comments_fbid INTEGER,
   commentsbox_count INTEGER,
-  UNIQUE (url, normalized_url, share_count, like_count, comment_count, total_count, click_count, comments_fbid, commentsbox_count)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `link_stat_url` ON `link_stat` (url);
+CREATE TRIGGER IF NOT EXISTS `link_stat_dedupe` BEFORE INSERT ON `link_stat`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `link_stat` WHERE url IS NEW.url
+    AND ifnull(normalized_url, '') = ifnull(NEW.normalized_url, '')
+    AND ifnull(share_count, '') = ifnull(NEW.share_count, '')
+    AND ifnull(like_count, '') = ifnull(NEW.like_count, '')
+    AND ifnull(comment_count, '') = ifnull(NEW.comment_count, '')
+    AND ifnull(total_count, '') = ifnull(NEW.total_count, '')
+    AND ifnull(click_count, '') = ifnull(NEW.click_count, '')
+    AND ifnull(comments_fbid, '') = ifnull(NEW.comments_fbid, '')
+    AND ifnull(commentsbox_count, '') = ifnull(NEW.commentsbox_count, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in link_stat');
+END;
 
 CREATE TABLE IF NOT EXISTS `location_post` (
   id INTEGER,
@@ -321,8 +698,26 @@ CREATE TABLE IF NOT EXISTS `location_post` (
   page_type TEXT,
   coords ,
   type TEXT,
-  UNIQUE (id, author_uid, app_id, timestamp, tagged_uids, page_id, page_type, coords, type)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `location_post_id` ON `location_post` (id);
+CREATE INDEX IF NOT EXISTS `location_post_author_uid` ON `location_post` (author_uid);
+CREATE INDEX IF NOT EXISTS `location_post_tagged_uids` ON `location_post` (tagged_uids);
+CREATE INDEX IF NOT EXISTS `location_post_page_id` ON `location_post` (page_id);
+CREATE TRIGGER IF NOT EXISTS `location_post_dedupe` BEFORE INSERT ON `location_post`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `location_post` WHERE id IS NEW.id
+    AND author_uid IS NEW.author_uid
+    AND ifnull(app_id, '') = ifnull(NEW.app_id, '')
+    AND ifnull(timestamp, '') = ifnull(NEW.timestamp, '')
+    AND tagged_uids IS NEW.tagged_uids
+    AND page_id IS NEW.page_id
+    AND ifnull(page_type, '') = ifnull(NEW.page_type, '')
+    AND ifnull(coords, '') = ifnull(NEW.coords, '')
+    AND ifnull(type, '') = ifnull(NEW.type, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in location_post');
+END;
 
 CREATE TABLE IF NOT EXISTS `mailbox_folder` (
   folder_id TEXT,
@@ -330,8 +725,20 @@ CREATE TABLE IF NOT EXISTS `mailbox_folder` (
   name TEXT,
   unread_count INTEGER,
   total_count INTEGER,
-  UNIQUE (folder_id, viewer_id, name, unread_count, total_count)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `mailbox_folder_folder_id` ON `mailbox_folder` (folder_id);
+CREATE INDEX IF NOT EXISTS `mailbox_folder_viewer_id` ON `mailbox_folder` (viewer_id);
+CREATE TRIGGER IF NOT EXISTS `mailbox_folder_dedupe` BEFORE INSERT ON `mailbox_folder`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `mailbox_folder` WHERE folder_id IS NEW.folder_id
+    AND viewer_id IS NEW.viewer_id
+    AND ifnull(name, '') = ifnull(NEW.name, '')
+    AND ifnull(unread_count, '') = ifnull(NEW.unread_count, '')
+    AND ifnull(total_count, '') = ifnull(NEW.total_count, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in mailbox_folder');
+END;
 
 CREATE TABLE IF NOT EXISTS `message` (
   message_id TEXT,
@@ -341,8 +748,22 @@ CREATE TABLE IF NOT EXISTS `message` (
   created_time INTEGER,
   attachment ,
   viewer_id TEXT,
-  UNIQUE (message_id, thread_id, author_id, body, created_time, attachment, viewer_id)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `message_message_id` ON `message` (message_id);
+CREATE INDEX IF NOT EXISTS `message_thread_id` ON `message` (thread_id);
+CREATE TRIGGER IF NOT EXISTS `message_dedupe` BEFORE INSERT ON `message`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `message` WHERE message_id IS NEW.message_id
+    AND thread_id IS NEW.thread_id
+    AND ifnull(author_id, '') = ifnull(NEW.author_id, '')
+    AND ifnull(body, '') = ifnull(NEW.body, '')
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, '')
+    AND ifnull(attachment, '') = ifnull(NEW.attachment, '')
+    AND ifnull(viewer_id, '') = ifnull(NEW.viewer_id, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in message');
+END;
 
 CREATE TABLE IF NOT EXISTS `note` (
   uid INTEGER,
@@ -354,8 +775,24 @@ CREATE TABLE IF NOT EXISTS `note` (
   title TEXT,
   like_info ,
   comment_info ,
-  UNIQUE (uid, note_id, created_time, updated_time, content, content_html, title, like_info, comment_info)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `note_uid` ON `note` (uid);
+CREATE INDEX IF NOT EXISTS `note_note_id` ON `note` (note_id);
+CREATE TRIGGER IF NOT EXISTS `note_dedupe` BEFORE INSERT ON `note`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `note` WHERE uid IS NEW.uid
+    AND note_id IS NEW.note_id
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, '')
+    AND ifnull(updated_time, '') = ifnull(NEW.updated_time, '')
+    AND ifnull(content, '') = ifnull(NEW.content, '')
+    AND ifnull(content_html, '') = ifnull(NEW.content_html, '')
+    AND ifnull(title, '') = ifnull(NEW.title, '')
+    AND ifnull(like_info, '') = ifnull(NEW.like_info, '')
+    AND ifnull(comment_info, '') = ifnull(NEW.comment_info, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in note');
+END;
 
 CREATE TABLE IF NOT EXISTS `notification` (
   notification_id TEXT,
@@ -372,16 +809,47 @@ CREATE TABLE IF NOT EXISTS `notification` (
   object_id TEXT,
   object_type TEXT,
   icon_url TEXT,
-  UNIQUE (notification_id, sender_id, recipient_id, title_html, title_text, body_html, body_text, href, app_id, is_unread, is_hidden, object_id, object_type, icon_url)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `notification_recipient_id` ON `notification` (recipient_id);
+CREATE TRIGGER IF NOT EXISTS `notification_dedupe` BEFORE INSERT ON `notification`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `notification` WHERE ifnull(notification_id, '') = ifnull(NEW.notification_id, '')
+    AND ifnull(sender_id, '') = ifnull(NEW.sender_id, '')
+    AND recipient_id IS NEW.recipient_id
+    AND ifnull(title_html, '') = ifnull(NEW.title_html, '')
+    AND ifnull(title_text, '') = ifnull(NEW.title_text, '')
+    AND ifnull(body_html, '') = ifnull(NEW.body_html, '')
+    AND ifnull(body_text, '') = ifnull(NEW.body_text, '')
+    AND ifnull(href, '') = ifnull(NEW.href, '')
+    AND ifnull(app_id, '') = ifnull(NEW.app_id, '')
+    AND ifnull(is_unread, '') = ifnull(NEW.is_unread, '')
+    AND ifnull(is_hidden, '') = ifnull(NEW.is_hidden, '')
+    AND ifnull(object_id, '') = ifnull(NEW.object_id, '')
+    AND ifnull(object_type, '') = ifnull(NEW.object_type, '')
+    AND ifnull(icon_url, '') = ifnull(NEW.icon_url, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in notification');
+END;
 
 CREATE TABLE IF NOT EXISTS `object_url` (
   url TEXT,
   id INTEGER,
   type TEXT,
   site TEXT,
-  UNIQUE (url, id, type, site)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `object_url_url` ON `object_url` (url);
+CREATE INDEX IF NOT EXISTS `object_url_id` ON `object_url` (id);
+CREATE TRIGGER IF NOT EXISTS `object_url_dedupe` BEFORE INSERT ON `object_url`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `object_url` WHERE url IS NEW.url
+    AND id IS NEW.id
+    AND ifnull(type, '') = ifnull(NEW.type, '')
+    AND ifnull(site, '') = ifnull(NEW.site, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in object_url');
+END;
 
 CREATE TABLE IF NOT EXISTS `offer` (
   id INTEGER,
@@ -392,8 +860,23 @@ CREATE TABLE IF NOT EXISTS `offer` (
   claim_limit INTEGER,
   created_time INTEGER,
   expiration_time TEXT,
-  UNIQUE (id, owner_id, title, image_url, terms, claim_limit, created_time, expiration_time)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `offer_id` ON `offer` (id);
+CREATE INDEX IF NOT EXISTS `offer_owner_id` ON `offer` (owner_id);
+CREATE TRIGGER IF NOT EXISTS `offer_dedupe` BEFORE INSERT ON `offer`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `offer` WHERE id IS NEW.id
+    AND owner_id IS NEW.owner_id
+    AND ifnull(title, '') = ifnull(NEW.title, '')
+    AND ifnull(image_url, '') = ifnull(NEW.image_url, '')
+    AND ifnull(terms, '') = ifnull(NEW.terms, '')
+    AND ifnull(claim_limit, '') = ifnull(NEW.claim_limit, '')
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, '')
+    AND ifnull(expiration_time, '') = ifnull(NEW.expiration_time, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in offer');
+END;
 
 CREATE TABLE IF NOT EXISTS `page` (
   page_id INTEGER,
@@ -469,21 +952,120 @@ CREATE TABLE IF NOT EXISTS `page` (
   built TEXT,
   features TEXT,
   mpg TEXT,
-  UNIQUE (page_id, name, username, description, page_url, categories, is_community_page, pic_small, pic_big, pic_square, pic, pic_large, pic_cover, unread_notif_count, new_like_count, fan_count, global_brand_like_count, global_brand_talking_about_count, global_brand_parent_page_id, type, website, has_added_app, general_info, can_post, checkins, is_published, founded, company_overview, mission, products, location, parking, hours, pharma_safety_info, public_transit, attire, payment_options, culinary_team, general_manager, price_range, restaurant_services, restaurant_specialties, phone, release_date, genre, starring, screenplay_by, directed_by, produced_by, studio, awards, plot_outline, season, network, schedule, written_by, band_members, hometown, current_location, record_label, booking_agent, press_contact, artists_we_like, influences, band_interests, bio, affiliation, birthday, personal_info, personal_interests, built, features, mpg)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `page_page_id` ON `page` (page_id);
+CREATE INDEX IF NOT EXISTS `page_name` ON `page` (name);
+CREATE INDEX IF NOT EXISTS `page_username` ON `page` (username);
+CREATE TRIGGER IF NOT EXISTS `page_dedupe` BEFORE INSERT ON `page`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `page` WHERE page_id IS NEW.page_id
+    AND name IS NEW.name
+    AND username IS NEW.username
+    AND ifnull(description, '') = ifnull(NEW.description, '')
+    AND ifnull(page_url, '') = ifnull(NEW.page_url, '')
+    AND ifnull(categories, '') = ifnull(NEW.categories, '')
+    AND ifnull(is_community_page, '') = ifnull(NEW.is_community_page, '')
+    AND ifnull(pic_small, '') = ifnull(NEW.pic_small, '')
+    AND ifnull(pic_big, '') = ifnull(NEW.pic_big, '')
+    AND ifnull(pic_square, '') = ifnull(NEW.pic_square, '')
+    AND ifnull(pic, '') = ifnull(NEW.pic, '')
+    AND ifnull(pic_large, '') = ifnull(NEW.pic_large, '')
+    AND ifnull(pic_cover, '') = ifnull(NEW.pic_cover, '')
+    AND ifnull(unread_notif_count, '') = ifnull(NEW.unread_notif_count, '')
+    AND ifnull(new_like_count, '') = ifnull(NEW.new_like_count, '')
+    AND ifnull(fan_count, '') = ifnull(NEW.fan_count, '')
+    AND ifnull(global_brand_like_count, '') = ifnull(NEW.global_brand_like_count, '')
+    AND ifnull(global_brand_talking_about_count, '') = ifnull(NEW.global_brand_talking_about_count, '')
+    AND ifnull(global_brand_parent_page_id, '') = ifnull(NEW.global_brand_parent_page_id, '')
+    AND ifnull(type, '') = ifnull(NEW.type, '')
+    AND ifnull(website, '') = ifnull(NEW.website, '')
+    AND ifnull(has_added_app, '') = ifnull(NEW.has_added_app, '')
+    AND ifnull(general_info, '') = ifnull(NEW.general_info, '')
+    AND ifnull(can_post, '') = ifnull(NEW.can_post, '')
+    AND ifnull(checkins, '') = ifnull(NEW.checkins, '')
+    AND ifnull(is_published, '') = ifnull(NEW.is_published, '')
+    AND ifnull(founded, '') = ifnull(NEW.founded, '')
+    AND ifnull(company_overview, '') = ifnull(NEW.company_overview, '')
+    AND ifnull(mission, '') = ifnull(NEW.mission, '')
+    AND ifnull(products, '') = ifnull(NEW.products, '')
+    AND ifnull(location, '') = ifnull(NEW.location, '')
+    AND ifnull(parking, '') = ifnull(NEW.parking, '')
+    AND ifnull(hours, '') = ifnull(NEW.hours, '')
+    AND ifnull(pharma_safety_info, '') = ifnull(NEW.pharma_safety_info, '')
+    AND ifnull(public_transit, '') = ifnull(NEW.public_transit, '')
+    AND ifnull(attire, '') = ifnull(NEW.attire, '')
+    AND ifnull(payment_options, '') = ifnull(NEW.payment_options, '')
+    AND ifnull(culinary_team, '') = ifnull(NEW.culinary_team, '')
+    AND ifnull(general_manager, '') = ifnull(NEW.general_manager, '')
+    AND ifnull(price_range, '') = ifnull(NEW.price_range, '')
+    AND ifnull(restaurant_services, '') = ifnull(NEW.restaurant_services, '')
+    AND ifnull(restaurant_specialties, '') = ifnull(NEW.restaurant_specialties, '')
+    AND ifnull(phone, '') = ifnull(NEW.phone, '')
+    AND ifnull(release_date, '') = ifnull(NEW.release_date, '')
+    AND ifnull(genre, '') = ifnull(NEW.genre, '')
+    AND ifnull(starring, '') = ifnull(NEW.starring, '')
+    AND ifnull(screenplay_by, '') = ifnull(NEW.screenplay_by, '')
+    AND ifnull(directed_by, '') = ifnull(NEW.directed_by, '')
+    AND ifnull(produced_by, '') = ifnull(NEW.produced_by, '')
+    AND ifnull(studio, '') = ifnull(NEW.studio, '')
+    AND ifnull(awards, '') = ifnull(NEW.awards, '')
+    AND ifnull(plot_outline, '') = ifnull(NEW.plot_outline, '')
+    AND ifnull(season, '') = ifnull(NEW.season, '')
+    AND ifnull(network, '') = ifnull(NEW.network, '')
+    AND ifnull(schedule, '') = ifnull(NEW.schedule, '')
+    AND ifnull(written_by, '') = ifnull(NEW.written_by, '')
+    AND ifnull(band_members, '') = ifnull(NEW.band_members, '')
+    AND ifnull(hometown, '') = ifnull(NEW.hometown, '')
+    AND ifnull(current_location, '') = ifnull(NEW.current_location, '')
+    AND ifnull(record_label, '') = ifnull(NEW.record_label, '')
+    AND ifnull(booking_agent, '') = ifnull(NEW.booking_agent, '')
+    AND ifnull(press_contact, '') = ifnull(NEW.press_contact, '')
+    AND ifnull(artists_we_like, '') = ifnull(NEW.artists_we_like, '')
+    AND ifnull(influences, '') = ifnull(NEW.influences, '')
+    AND ifnull(band_interests, '') = ifnull(NEW.band_interests, '')
+    AND ifnull(bio, '') = ifnull(NEW.bio, '')
+    AND ifnull(affiliation, '') = ifnull(NEW.affiliation, '')
+    AND ifnull(birthday, '') = ifnull(NEW.birthday, '')
+    AND ifnull(personal_info, '') = ifnull(NEW.personal_info, '')
+    AND ifnull(personal_interests, '') = ifnull(NEW.personal_interests, '')
+    AND ifnull(built, '') = ifnull(NEW.built, '')
+    AND ifnull(features, '') = ifnull(NEW.features, '')
+    AND ifnull(mpg, '') = ifnull(NEW.mpg, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in page');
+END;
 
 CREATE TABLE IF NOT EXISTS `page_admin` (
   uid TEXT,
   page_id TEXT,
   type TEXT,
-  UNIQUE (uid, page_id, type)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `page_admin_uid` ON `page_admin` (uid);
+CREATE INDEX IF NOT EXISTS `page_admin_page_id` ON `page_admin` (page_id);
+CREATE TRIGGER IF NOT EXISTS `page_admin_dedupe` BEFORE INSERT ON `page_admin`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `page_admin` WHERE uid IS NEW.uid
+    AND page_id IS NEW.page_id
+    AND ifnull(type, '') = ifnull(NEW.type, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in page_admin');
+END;
 
 CREATE TABLE IF NOT EXISTS `page_blocked_user` (
   page_id TEXT,
   uid TEXT,
-  UNIQUE (page_id, uid)
+  _row_hash TEXT UNIQUE
 );
+CREATE INDEX IF NOT EXISTS `page_blocked_user_page_id` ON `page_blocked_user` (page_id);
+CREATE TRIGGER IF NOT EXISTS `page_blocked_user_dedupe` BEFORE INSERT ON `page_blocked_user`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `page_blocked_user` WHERE page_id IS NEW.page_id
+    AND ifnull(uid, '') = ifnull(NEW.uid, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in page_blocked_user');
+END;
 
 CREATE TABLE IF NOT EXISTS `page_fan` (
   uid INTEGER,
@@ -491,14 +1073,33 @@ CREATE TABLE IF NOT EXISTS `page_fan` (
   type TEXT,
   profile_section TEXT,
   created_time INTEGER,
-  UNIQUE (uid, page_id, type, profile_section, created_time)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `page_fan_uid` ON `page_fan` (uid);
+CREATE TRIGGER IF NOT EXISTS `page_fan_dedupe` BEFORE INSERT ON `page_fan`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `page_fan` WHERE uid IS NEW.uid
+    AND ifnull(page_id, '') = ifnull(NEW.page_id, '')
+    AND ifnull(type, '') = ifnull(NEW.type, '')
+    AND ifnull(profile_section, '') = ifnull(NEW.profile_section, '')
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in page_fan');
+END;
 
 CREATE TABLE IF NOT EXISTS `page_global_brand_child` (
   parent_page_id INTEGER,
   global_brand_child_page_id INTEGER,
-  UNIQUE (parent_page_id, global_brand_child_page_id)
+  _row_hash TEXT UNIQUE
 );
+CREATE INDEX IF NOT EXISTS `page_global_brand_child_parent_page_id` ON `page_global_brand_child` (parent_page_id);
+CREATE TRIGGER IF NOT EXISTS `page_global_brand_child_dedupe` BEFORE INSERT ON `page_global_brand_child`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `page_global_brand_child` WHERE parent_page_id IS NEW.parent_page_id
+    AND ifnull(global_brand_child_page_id, '') = ifnull(NEW.global_brand_child_page_id, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in page_global_brand_child');
+END;
 
 CREATE TABLE IF NOT EXISTS `page_milestone` (
   id INTEGER,
@@ -509,15 +1110,39 @@ CREATE TABLE IF NOT EXISTS `page_milestone` (
   updated_time INTEGER,
   start_time INTEGER,
   end_time INTEGER,
-  UNIQUE (id, owner_id, title, description, created_time, updated_time, start_time, end_time)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `page_milestone_id` ON `page_milestone` (id);
+CREATE INDEX IF NOT EXISTS `page_milestone_owner_id` ON `page_milestone` (owner_id);
+CREATE TRIGGER IF NOT EXISTS `page_milestone_dedupe` BEFORE INSERT ON `page_milestone`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `page_milestone` WHERE id IS NEW.id
+    AND owner_id IS NEW.owner_id
+    AND ifnull(title, '') = ifnull(NEW.title, '')
+    AND ifnull(description, '') = ifnull(NEW.description, '')
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, '')
+    AND ifnull(updated_time, '') = ifnull(NEW.updated_time, '')
+    AND ifnull(start_time, '') = ifnull(NEW.start_time, '')
+    AND ifnull(end_time, '') = ifnull(NEW.end_time, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in page_milestone');
+END;
 
 CREATE TABLE IF NOT EXISTS `permissions_info` (
   permission_name TEXT,
   header TEXT,
   summary TEXT,
-  UNIQUE (permission_name, header, summary)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `permissions_info_permission_name` ON `permissions_info` (permission_name);
+CREATE TRIGGER IF NOT EXISTS `permissions_info_dedupe` BEFORE INSERT ON `permissions_info`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `permissions_info` WHERE permission_name IS NEW.permission_name
+    AND ifnull(header, '') = ifnull(NEW.header, '')
+    AND ifnull(summary, '') = ifnull(NEW.summary, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in permissions_info');
+END;
 
 CREATE TABLE IF NOT EXISTS `photo` (
   object_id INTEGER,
@@ -545,8 +1170,42 @@ CREATE TABLE IF NOT EXISTS `photo` (
   like_info ,
   comment_info ,
   can_delete INTEGER,
-  UNIQUE (object_id, pid, aid, owner, src_small, src_small_width, src_small_height, src_big, src_big_width, src_big_height, src, src_width, src_height, link, caption, caption_tags, created, modified, position, album_object_id, place_id, images, like_info, comment_info, can_delete)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `photo_object_id` ON `photo` (object_id);
+CREATE INDEX IF NOT EXISTS `photo_pid` ON `photo` (pid);
+CREATE INDEX IF NOT EXISTS `photo_aid` ON `photo` (aid);
+CREATE INDEX IF NOT EXISTS `photo_album_object_id` ON `photo` (album_object_id);
+CREATE TRIGGER IF NOT EXISTS `photo_dedupe` BEFORE INSERT ON `photo`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `photo` WHERE object_id IS NEW.object_id
+    AND pid IS NEW.pid
+    AND aid IS NEW.aid
+    AND ifnull(owner, '') = ifnull(NEW.owner, '')
+    AND ifnull(src_small, '') = ifnull(NEW.src_small, '')
+    AND ifnull(src_small_width, '') = ifnull(NEW.src_small_width, '')
+    AND ifnull(src_small_height, '') = ifnull(NEW.src_small_height, '')
+    AND ifnull(src_big, '') = ifnull(NEW.src_big, '')
+    AND ifnull(src_big_width, '') = ifnull(NEW.src_big_width, '')
+    AND ifnull(src_big_height, '') = ifnull(NEW.src_big_height, '')
+    AND ifnull(src, '') = ifnull(NEW.src, '')
+    AND ifnull(src_width, '') = ifnull(NEW.src_width, '')
+    AND ifnull(src_height, '') = ifnull(NEW.src_height, '')
+    AND ifnull(link, '') = ifnull(NEW.link, '')
+    AND ifnull(caption, '') = ifnull(NEW.caption, '')
+    AND ifnull(caption_tags, '') = ifnull(NEW.caption_tags, '')
+    AND ifnull(created, '') = ifnull(NEW.created, '')
+    AND ifnull(modified, '') = ifnull(NEW.modified, '')
+    AND ifnull(position, '') = ifnull(NEW.position, '')
+    AND album_object_id IS NEW.album_object_id
+    AND ifnull(place_id, '') = ifnull(NEW.place_id, '')
+    AND ifnull(images, '') = ifnull(NEW.images, '')
+    AND ifnull(like_info, '') = ifnull(NEW.like_info, '')
+    AND ifnull(comment_info, '') = ifnull(NEW.comment_info, '')
+    AND ifnull(can_delete, '') = ifnull(NEW.can_delete, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in photo');
+END;
 
 CREATE TABLE IF NOT EXISTS `photo_src` (
   photo_id INTEGER,
@@ -554,8 +1213,19 @@ CREATE TABLE IF NOT EXISTS `photo_src` (
   width INTEGER,
   height INTEGER,
   src TEXT,
-  UNIQUE (photo_id, size, width, height, src)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `photo_src_photo_id` ON `photo_src` (photo_id);
+CREATE TRIGGER IF NOT EXISTS `photo_src_dedupe` BEFORE INSERT ON `photo_src`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `photo_src` WHERE photo_id IS NEW.photo_id
+    AND ifnull(size, '') = ifnull(NEW.size, '')
+    AND ifnull(width, '') = ifnull(NEW.width, '')
+    AND ifnull(height, '') = ifnull(NEW.height, '')
+    AND ifnull(src, '') = ifnull(NEW.src, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in photo_src');
+END;
 
 CREATE TABLE IF NOT EXISTS `photo_tag` (
   object_id INTEGER,
@@ -565,8 +1235,23 @@ CREATE TABLE IF NOT EXISTS `photo_tag` (
   xcoord REAL,
   ycoord REAL,
   created INTEGER,
-  UNIQUE (object_id, pid, subject, text, xcoord, ycoord, created)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `photo_tag_object_id` ON `photo_tag` (object_id);
+CREATE INDEX IF NOT EXISTS `photo_tag_pid` ON `photo_tag` (pid);
+CREATE INDEX IF NOT EXISTS `photo_tag_subject` ON `photo_tag` (subject);
+CREATE TRIGGER IF NOT EXISTS `photo_tag_dedupe` BEFORE INSERT ON `photo_tag`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `photo_tag` WHERE object_id IS NEW.object_id
+    AND pid IS NEW.pid
+    AND subject IS NEW.subject
+    AND ifnull(text, '') = ifnull(NEW.text, '')
+    AND ifnull(xcoord, '') = ifnull(NEW.xcoord, '')
+    AND ifnull(ycoord, '') = ifnull(NEW.ycoord, '')
+    AND ifnull(created, '') = ifnull(NEW.created, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in photo_tag');
+END;
 
 CREATE TABLE IF NOT EXISTS `place` (
   page_id INTEGER,
@@ -577,8 +1262,22 @@ CREATE TABLE IF NOT EXISTS `place` (
   longitude REAL,
   checkin_count INTEGER,
   display_subtext TEXT,
-  UNIQUE (page_id, name, description, geometry, latitude, longitude, checkin_count, display_subtext)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `place_page_id` ON `place` (page_id);
+CREATE TRIGGER IF NOT EXISTS `place_dedupe` BEFORE INSERT ON `place`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `place` WHERE page_id IS NEW.page_id
+    AND ifnull(name, '') = ifnull(NEW.name, '')
+    AND ifnull(description, '') = ifnull(NEW.description, '')
+    AND ifnull(geometry, '') = ifnull(NEW.geometry, '')
+    AND ifnull(latitude, '') = ifnull(NEW.latitude, '')
+    AND ifnull(longitude, '') = ifnull(NEW.longitude, '')
+    AND ifnull(checkin_count, '') = ifnull(NEW.checkin_count, '')
+    AND ifnull(display_subtext, '') = ifnull(NEW.display_subtext, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in place');
+END;
 
 CREATE TABLE IF NOT EXISTS `privacy` (
   id INTEGER,
@@ -590,8 +1289,24 @@ CREATE TABLE IF NOT EXISTS `privacy` (
   owner_id INTEGER,
   networks INTEGER,
   friends TEXT,
-  UNIQUE (id, object_id, value, description, allow, deny, owner_id, networks, friends)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `privacy_id` ON `privacy` (id);
+CREATE INDEX IF NOT EXISTS `privacy_object_id` ON `privacy` (object_id);
+CREATE TRIGGER IF NOT EXISTS `privacy_dedupe` BEFORE INSERT ON `privacy`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `privacy` WHERE id IS NEW.id
+    AND object_id IS NEW.object_id
+    AND ifnull(value, '') = ifnull(NEW.value, '')
+    AND ifnull(description, '') = ifnull(NEW.description, '')
+    AND ifnull(allow, '') = ifnull(NEW.allow, '')
+    AND ifnull(deny, '') = ifnull(NEW.deny, '')
+    AND ifnull(owner_id, '') = ifnull(NEW.owner_id, '')
+    AND ifnull(networks, '') = ifnull(NEW.networks, '')
+    AND ifnull(friends, '') = ifnull(NEW.friends, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in privacy');
+END;
 
 CREATE TABLE IF NOT EXISTS `privacy_setting` (
   name TEXT,
@@ -601,8 +1316,21 @@ CREATE TABLE IF NOT EXISTS `privacy_setting` (
   deny TEXT,
   networks INTEGER,
   friends TEXT,
-  UNIQUE (name, value, description, allow, deny, networks, friends)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `privacy_setting_name` ON `privacy_setting` (name);
+CREATE TRIGGER IF NOT EXISTS `privacy_setting_dedupe` BEFORE INSERT ON `privacy_setting`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `privacy_setting` WHERE name IS NEW.name
+    AND ifnull(value, '') = ifnull(NEW.value, '')
+    AND ifnull(description, '') = ifnull(NEW.description, '')
+    AND ifnull(allow, '') = ifnull(NEW.allow, '')
+    AND ifnull(deny, '') = ifnull(NEW.deny, '')
+    AND ifnull(networks, '') = ifnull(NEW.networks, '')
+    AND ifnull(friends, '') = ifnull(NEW.friends, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in privacy_setting');
+END;
 
 CREATE TABLE IF NOT EXISTS `profile` (
   id INTEGER,
@@ -616,8 +1344,26 @@ CREATE TABLE IF NOT EXISTS `profile` (
   pic_crop ,
   type TEXT,
   username TEXT,
-  UNIQUE (id, can_post, name, url, pic, pic_square, pic_small, pic_big, pic_crop, type, username)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `profile_id` ON `profile` (id);
+CREATE INDEX IF NOT EXISTS `profile_username` ON `profile` (username);
+CREATE TRIGGER IF NOT EXISTS `profile_dedupe` BEFORE INSERT ON `profile`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `profile` WHERE id IS NEW.id
+    AND ifnull(can_post, '') = ifnull(NEW.can_post, '')
+    AND ifnull(name, '') = ifnull(NEW.name, '')
+    AND ifnull(url, '') = ifnull(NEW.url, '')
+    AND ifnull(pic, '') = ifnull(NEW.pic, '')
+    AND ifnull(pic_square, '') = ifnull(NEW.pic_square, '')
+    AND ifnull(pic_small, '') = ifnull(NEW.pic_small, '')
+    AND ifnull(pic_big, '') = ifnull(NEW.pic_big, '')
+    AND ifnull(pic_crop, '') = ifnull(NEW.pic_crop, '')
+    AND ifnull(type, '') = ifnull(NEW.type, '')
+    AND username IS NEW.username)
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in profile');
+END;
 
 CREATE TABLE IF NOT EXISTS `profile_pic` (
   id INTEGER,
@@ -627,8 +1373,23 @@ CREATE TABLE IF NOT EXISTS `profile_pic` (
   is_silhouette INTEGER,
   real_width INTEGER,
   real_height INTEGER,
-  UNIQUE (id, width, height, url, is_silhouette, real_width, real_height)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `profile_pic_id` ON `profile_pic` (id);
+CREATE INDEX IF NOT EXISTS `profile_pic_width` ON `profile_pic` (width);
+CREATE INDEX IF NOT EXISTS `profile_pic_height` ON `profile_pic` (height);
+CREATE TRIGGER IF NOT EXISTS `profile_pic_dedupe` BEFORE INSERT ON `profile_pic`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `profile_pic` WHERE id IS NEW.id
+    AND width IS NEW.width
+    AND height IS NEW.height
+    AND ifnull(url, '') = ifnull(NEW.url, '')
+    AND ifnull(is_silhouette, '') = ifnull(NEW.is_silhouette, '')
+    AND ifnull(real_width, '') = ifnull(NEW.real_width, '')
+    AND ifnull(real_height, '') = ifnull(NEW.real_height, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in profile_pic');
+END;
 
 CREATE TABLE IF NOT EXISTS `profile_view` (
   profile_id INTEGER,
@@ -637,8 +1398,20 @@ CREATE TABLE IF NOT EXISTS `profile_view` (
   custom_image_url TEXT,
   position INTEGER,
   is_permanent INTEGER,
-  UNIQUE (profile_id, app_id, link, custom_image_url, position, is_permanent)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `profile_view_profile_id` ON `profile_view` (profile_id);
+CREATE TRIGGER IF NOT EXISTS `profile_view_dedupe` BEFORE INSERT ON `profile_view`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `profile_view` WHERE profile_id IS NEW.profile_id
+    AND ifnull(app_id, '') = ifnull(NEW.app_id, '')
+    AND ifnull(link, '') = ifnull(NEW.link, '')
+    AND ifnull(custom_image_url, '') = ifnull(NEW.custom_image_url, '')
+    AND ifnull(position, '') = ifnull(NEW.position, '')
+    AND ifnull(is_permanent, '') = ifnull(NEW.is_permanent, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in profile_view');
+END;
 
 CREATE TABLE IF NOT EXISTS `question` (
   id INTEGER,
@@ -646,8 +1419,20 @@ CREATE TABLE IF NOT EXISTS `question` (
   question TEXT,
   created_time INTEGER,
   updated_time INTEGER,
-  UNIQUE (id, owner, question, created_time, updated_time)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `question_id` ON `question` (id);
+CREATE INDEX IF NOT EXISTS `question_owner` ON `question` (owner);
+CREATE TRIGGER IF NOT EXISTS `question_dedupe` BEFORE INSERT ON `question`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `question` WHERE id IS NEW.id
+    AND owner IS NEW.owner
+    AND ifnull(question, '') = ifnull(NEW.question, '')
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, '')
+    AND ifnull(updated_time, '') = ifnull(NEW.updated_time, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in question');
+END;
 
 CREATE TABLE IF NOT EXISTS `question_option` (
   id INTEGER,
@@ -657,14 +1442,36 @@ CREATE TABLE IF NOT EXISTS `question_option` (
   object_id INTEGER,
   owner INTEGER,
   created_time INTEGER,
-  UNIQUE (id, question_id, name, votes, object_id, owner, created_time)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `question_option_id` ON `question_option` (id);
+CREATE INDEX IF NOT EXISTS `question_option_question_id` ON `question_option` (question_id);
+CREATE TRIGGER IF NOT EXISTS `question_option_dedupe` BEFORE INSERT ON `question_option`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `question_option` WHERE id IS NEW.id
+    AND question_id IS NEW.question_id
+    AND ifnull(name, '') = ifnull(NEW.name, '')
+    AND ifnull(votes, '') = ifnull(NEW.votes, '')
+    AND ifnull(object_id, '') = ifnull(NEW.object_id, '')
+    AND ifnull(owner, '') = ifnull(NEW.owner, '')
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in question_option');
+END;
 
 CREATE TABLE IF NOT EXISTS `question_option_votes` (
   option_id INTEGER,
   voter_id INTEGER,
-  UNIQUE (option_id, voter_id)
+  _row_hash TEXT UNIQUE
 );
+CREATE INDEX IF NOT EXISTS `question_option_votes_option_id` ON `question_option_votes` (option_id);
+CREATE TRIGGER IF NOT EXISTS `question_option_votes_dedupe` BEFORE INSERT ON `question_option_votes`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `question_option_votes` WHERE option_id IS NEW.option_id
+    AND ifnull(voter_id, '') = ifnull(NEW.voter_id, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in question_option_votes');
+END;
 
 CREATE TABLE IF NOT EXISTS `review` (
   reviewee_id INTEGER,
@@ -673,14 +1480,36 @@ CREATE TABLE IF NOT EXISTS `review` (
   message TEXT,
   created_time INTEGER,
   rating INTEGER,
-  UNIQUE (reviewee_id, reviewer_id, review_id, message, created_time, rating)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `review_reviewee_id` ON `review` (reviewee_id);
+CREATE INDEX IF NOT EXISTS `review_reviewer_id` ON `review` (reviewer_id);
+CREATE TRIGGER IF NOT EXISTS `review_dedupe` BEFORE INSERT ON `review`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `review` WHERE reviewee_id IS NEW.reviewee_id
+    AND reviewer_id IS NEW.reviewer_id
+    AND ifnull(review_id, '') = ifnull(NEW.review_id, '')
+    AND ifnull(message, '') = ifnull(NEW.message, '')
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, '')
+    AND ifnull(rating, '') = ifnull(NEW.rating, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in review');
+END;
 
 CREATE TABLE IF NOT EXISTS `standard_friend_info` (
   uid1 INTEGER,
   uid2 INTEGER,
-  UNIQUE (uid1, uid2)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `standard_friend_info_uid1` ON `standard_friend_info` (uid1);
+CREATE INDEX IF NOT EXISTS `standard_friend_info_uid2` ON `standard_friend_info` (uid2);
+CREATE TRIGGER IF NOT EXISTS `standard_friend_info_dedupe` BEFORE INSERT ON `standard_friend_info`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `standard_friend_info` WHERE uid1 IS NEW.uid1
+    AND uid2 IS NEW.uid2)
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in standard_friend_info');
+END;
 
 CREATE TABLE IF NOT EXISTS `standard_user_info` (
   uid TEXT,
@@ -698,8 +1527,32 @@ CREATE TABLE IF NOT EXISTS `standard_user_info` (
   proxied_email TEXT,
   current_location TEXT,
   allowed_restrictions TEXT,
-  UNIQUE (uid, name, username, third_party_id, first_name, last_name, locale, affiliations, profile_url, timezone, birthday, sex, proxied_email, current_location, allowed_restrictions)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `standard_user_info_uid` ON `standard_user_info` (uid);
+CREATE INDEX IF NOT EXISTS `standard_user_info_name` ON `standard_user_info` (name);
+CREATE INDEX IF NOT EXISTS `standard_user_info_username` ON `standard_user_info` (username);
+CREATE INDEX IF NOT EXISTS `standard_user_info_third_party_id` ON `standard_user_info` (third_party_id);
+CREATE TRIGGER IF NOT EXISTS `standard_user_info_dedupe` BEFORE INSERT ON `standard_user_info`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `standard_user_info` WHERE uid IS NEW.uid
+    AND name IS NEW.name
+    AND username IS NEW.username
+    AND third_party_id IS NEW.third_party_id
+    AND ifnull(first_name, '') = ifnull(NEW.first_name, '')
+    AND ifnull(last_name, '') = ifnull(NEW.last_name, '')
+    AND ifnull(locale, '') = ifnull(NEW.locale, '')
+    AND ifnull(affiliations, '') = ifnull(NEW.affiliations, '')
+    AND ifnull(profile_url, '') = ifnull(NEW.profile_url, '')
+    AND ifnull(timezone, '') = ifnull(NEW.timezone, '')
+    AND ifnull(birthday, '') = ifnull(NEW.birthday, '')
+    AND ifnull(sex, '') = ifnull(NEW.sex, '')
+    AND ifnull(proxied_email, '') = ifnull(NEW.proxied_email, '')
+    AND ifnull(current_location, '') = ifnull(NEW.current_location, '')
+    AND ifnull(allowed_restrictions, '') = ifnull(NEW.allowed_restrictions, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in standard_user_info');
+END;
 
 CREATE TABLE IF NOT EXISTS `status` (
   uid INTEGER,
@@ -708,8 +1561,21 @@ CREATE TABLE IF NOT EXISTS `status` (
   source INTEGER,
   message TEXT,
   place_id INTEGER,
-  UNIQUE (uid, status_id, time, source, message, place_id)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `status_uid` ON `status` (uid);
+CREATE INDEX IF NOT EXISTS `status_status_id` ON `status` (status_id);
+CREATE TRIGGER IF NOT EXISTS `status_dedupe` BEFORE INSERT ON `status`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `status` WHERE uid IS NEW.uid
+    AND status_id IS NEW.status_id
+    AND ifnull(time, '') = ifnull(NEW.time, '')
+    AND ifnull(source, '') = ifnull(NEW.source, '')
+    AND ifnull(message, '') = ifnull(NEW.message, '')
+    AND ifnull(place_id, '') = ifnull(NEW.place_id, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in status');
+END;
 
 CREATE TABLE IF NOT EXISTS `stream` (
   post_id TEXT,
@@ -738,8 +1604,43 @@ CREATE TABLE IF NOT EXISTS `stream` (
   description TEXT,
   description_tags ,
   type INTEGER,
-  UNIQUE (post_id, viewer_id, app_id, source_id, updated_time, created_time, filter_key, attribution, actor_id, target_id, message, app_data, action_links, attachment, impressions, comments, likes, place, privacy, permalink, xid, tagged_ids, message_tags, description, description_tags, type)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `stream_post_id` ON `stream` (post_id);
+CREATE INDEX IF NOT EXISTS `stream_source_id` ON `stream` (source_id);
+CREATE INDEX IF NOT EXISTS `stream_filter_key` ON `stream` (filter_key);
+CREATE INDEX IF NOT EXISTS `stream_xid` ON `stream` (xid);
+CREATE TRIGGER IF NOT EXISTS `stream_dedupe` BEFORE INSERT ON `stream`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `stream` WHERE post_id IS NEW.post_id
+    AND ifnull(viewer_id, '') = ifnull(NEW.viewer_id, '')
+    AND ifnull(app_id, '') = ifnull(NEW.app_id, '')
+    AND source_id IS NEW.source_id
+    AND ifnull(updated_time, '') = ifnull(NEW.updated_time, '')
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, '')
+    AND filter_key IS NEW.filter_key
+    AND ifnull(attribution, '') = ifnull(NEW.attribution, '')
+    AND ifnull(actor_id, '') = ifnull(NEW.actor_id, '')
+    AND ifnull(target_id, '') = ifnull(NEW.target_id, '')
+    AND ifnull(message, '') = ifnull(NEW.message, '')
+    AND ifnull(app_data, '') = ifnull(NEW.app_data, '')
+    AND ifnull(action_links, '') = ifnull(NEW.action_links, '')
+    AND ifnull(attachment, '') = ifnull(NEW.attachment, '')
+    AND ifnull(impressions, '') = ifnull(NEW.impressions, '')
+    AND ifnull(comments, '') = ifnull(NEW.comments, '')
+    AND ifnull(likes, '') = ifnull(NEW.likes, '')
+    AND ifnull(place, '') = ifnull(NEW.place, '')
+    AND ifnull(privacy, '') = ifnull(NEW.privacy, '')
+    AND ifnull(permalink, '') = ifnull(NEW.permalink, '')
+    AND xid IS NEW.xid
+    AND ifnull(tagged_ids, '') = ifnull(NEW.tagged_ids, '')
+    AND ifnull(message_tags, '') = ifnull(NEW.message_tags, '')
+    AND ifnull(description, '') = ifnull(NEW.description, '')
+    AND ifnull(description_tags, '') = ifnull(NEW.description_tags, '')
+    AND ifnull(type, '') = ifnull(NEW.type, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in stream');
+END;
 
 CREATE TABLE IF NOT EXISTS `stream_filter` (
   uid INTEGER,
@@ -750,15 +1651,41 @@ CREATE TABLE IF NOT EXISTS `stream_filter` (
   is_visible INTEGER,
   type TEXT,
   value INTEGER,
-  UNIQUE (uid, filter_key, name, rank, icon_url, is_visible, type, value)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `stream_filter_uid` ON `stream_filter` (uid);
+CREATE INDEX IF NOT EXISTS `stream_filter_filter_key` ON `stream_filter` (filter_key);
+CREATE TRIGGER IF NOT EXISTS `stream_filter_dedupe` BEFORE INSERT ON `stream_filter`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `stream_filter` WHERE uid IS NEW.uid
+    AND filter_key IS NEW.filter_key
+    AND ifnull(name, '') = ifnull(NEW.name, '')
+    AND ifnull(rank, '') = ifnull(NEW.rank, '')
+    AND ifnull(icon_url, '') = ifnull(NEW.icon_url, '')
+    AND ifnull(is_visible, '') = ifnull(NEW.is_visible, '')
+    AND ifnull(type, '') = ifnull(NEW.type, '')
+    AND ifnull(value, '') = ifnull(NEW.value, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in stream_filter');
+END;
 
 CREATE TABLE IF NOT EXISTS `stream_tag` (
   post_id TEXT,
   actor_id TEXT,
   target_id TEXT,
-  UNIQUE (post_id, actor_id, target_id)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `stream_tag_post_id` ON `stream_tag` (post_id);
+CREATE INDEX IF NOT EXISTS `stream_tag_actor_id` ON `stream_tag` (actor_id);
+CREATE INDEX IF NOT EXISTS `stream_tag_target_id` ON `stream_tag` (target_id);
+CREATE TRIGGER IF NOT EXISTS `stream_tag_dedupe` BEFORE INSERT ON `stream_tag`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `stream_tag` WHERE post_id IS NEW.post_id
+    AND actor_id IS NEW.actor_id
+    AND target_id IS NEW.target_id)
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in stream_tag');
+END;
 
 CREATE TABLE IF NOT EXISTS `thread` (
   thread_id TEXT,
@@ -774,8 +1701,28 @@ CREATE TABLE IF NOT EXISTS `thread` (
   object_id INTEGER,
   unread INTEGER,
   viewer_id TEXT,
-  UNIQUE (thread_id, folder_id, subject, recipients, updated_time, parent_message_id, parent_thread_id, message_count, snippet, snippet_author, object_id, unread, viewer_id)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `thread_thread_id` ON `thread` (thread_id);
+CREATE INDEX IF NOT EXISTS `thread_folder_id` ON `thread` (folder_id);
+CREATE TRIGGER IF NOT EXISTS `thread_dedupe` BEFORE INSERT ON `thread`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `thread` WHERE thread_id IS NEW.thread_id
+    AND folder_id IS NEW.folder_id
+    AND ifnull(subject, '') = ifnull(NEW.subject, '')
+    AND ifnull(recipients, '') = ifnull(NEW.recipients, '')
+    AND ifnull(updated_time, '') = ifnull(NEW.updated_time, '')
+    AND ifnull(parent_message_id, '') = ifnull(NEW.parent_message_id, '')
+    AND ifnull(parent_thread_id, '') = ifnull(NEW.parent_thread_id, '')
+    AND ifnull(message_count, '') = ifnull(NEW.message_count, '')
+    AND ifnull(snippet, '') = ifnull(NEW.snippet, '')
+    AND ifnull(snippet_author, '') = ifnull(NEW.snippet_author, '')
+    AND ifnull(object_id, '') = ifnull(NEW.object_id, '')
+    AND ifnull(unread, '') = ifnull(NEW.unread, '')
+    AND ifnull(viewer_id, '') = ifnull(NEW.viewer_id, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in thread');
+END;
 
 CREATE TABLE IF NOT EXISTS `translation` (
   locale TEXT,
@@ -786,8 +1733,24 @@ CREATE TABLE IF NOT EXISTS `translation` (
   approval_status TEXT,
   pre_hash_string TEXT,
   best_string TEXT,
-  UNIQUE (locale, native_hash, native_string, description, translation, approval_status, pre_hash_string, best_string)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `translation_locale` ON `translation` (locale);
+CREATE INDEX IF NOT EXISTS `translation_native_hash` ON `translation` (native_hash);
+CREATE INDEX IF NOT EXISTS `translation_pre_hash_string` ON `translation` (pre_hash_string);
+CREATE TRIGGER IF NOT EXISTS `translation_dedupe` BEFORE INSERT ON `translation`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `translation` WHERE locale IS NEW.locale
+    AND native_hash IS NEW.native_hash
+    AND ifnull(native_string, '') = ifnull(NEW.native_string, '')
+    AND ifnull(description, '') = ifnull(NEW.description, '')
+    AND ifnull(translation, '') = ifnull(NEW.translation, '')
+    AND ifnull(approval_status, '') = ifnull(NEW.approval_status, '')
+    AND pre_hash_string IS NEW.pre_hash_string
+    AND ifnull(best_string, '') = ifnull(NEW.best_string, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in translation');
+END;
 
 CREATE TABLE IF NOT EXISTS `unified_message` (
   message_id TEXT,
@@ -806,8 +1769,33 @@ CREATE TABLE IF NOT EXISTS `unified_message` (
   attachment_map ,
   shares ,
   share_map ,
-  UNIQUE (message_id, thread_id, subject, body, unread, action_id, timestamp, tags, sender, recipients, object_sender, html_body, attachments, attachment_map, shares, share_map)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `unified_message_message_id` ON `unified_message` (message_id);
+CREATE INDEX IF NOT EXISTS `unified_message_thread_id` ON `unified_message` (thread_id);
+CREATE INDEX IF NOT EXISTS `unified_message_unread` ON `unified_message` (unread);
+CREATE INDEX IF NOT EXISTS `unified_message_timestamp` ON `unified_message` (timestamp);
+CREATE TRIGGER IF NOT EXISTS `unified_message_dedupe` BEFORE INSERT ON `unified_message`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `unified_message` WHERE message_id IS NEW.message_id
+    AND thread_id IS NEW.thread_id
+    AND ifnull(subject, '') = ifnull(NEW.subject, '')
+    AND ifnull(body, '') = ifnull(NEW.body, '')
+    AND unread IS NEW.unread
+    AND ifnull(action_id, '') = ifnull(NEW.action_id, '')
+    AND timestamp IS NEW.timestamp
+    AND ifnull(tags, '') = ifnull(NEW.tags, '')
+    AND ifnull(sender, '') = ifnull(NEW.sender, '')
+    AND ifnull(recipients, '') = ifnull(NEW.recipients, '')
+    AND ifnull(object_sender, '') = ifnull(NEW.object_sender, '')
+    AND ifnull(html_body, '') = ifnull(NEW.html_body, '')
+    AND ifnull(attachments, '') = ifnull(NEW.attachments, '')
+    AND ifnull(attachment_map, '') = ifnull(NEW.attachment_map, '')
+    AND ifnull(shares, '') = ifnull(NEW.shares, '')
+    AND ifnull(share_map, '') = ifnull(NEW.share_map, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in unified_message');
+END;
 
 CREATE TABLE IF NOT EXISTS `unified_thread` (
   action_id TEXT,
@@ -834,8 +1822,43 @@ CREATE TABLE IF NOT EXISTS `unified_thread` (
   thread_participants ,
   timestamp TEXT,
   unread INTEGER,
-  UNIQUE (action_id, archived, can_reply, folder, former_participants, has_attachments, is_subscribed, last_visible_add_action_id, name, num_messages, num_unread, object_participants, participants, senders, single_recipient, snippet, snippet_sender, snippet_message_has_attachment, subject, tags, thread_id, thread_participants, timestamp, unread)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `unified_thread_archived` ON `unified_thread` (archived);
+CREATE INDEX IF NOT EXISTS `unified_thread_folder` ON `unified_thread` (folder);
+CREATE INDEX IF NOT EXISTS `unified_thread_single_recipient` ON `unified_thread` (single_recipient);
+CREATE INDEX IF NOT EXISTS `unified_thread_thread_id` ON `unified_thread` (thread_id);
+CREATE INDEX IF NOT EXISTS `unified_thread_timestamp` ON `unified_thread` (timestamp);
+CREATE INDEX IF NOT EXISTS `unified_thread_unread` ON `unified_thread` (unread);
+CREATE TRIGGER IF NOT EXISTS `unified_thread_dedupe` BEFORE INSERT ON `unified_thread`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `unified_thread` WHERE ifnull(action_id, '') = ifnull(NEW.action_id, '')
+    AND archived IS NEW.archived
+    AND ifnull(can_reply, '') = ifnull(NEW.can_reply, '')
+    AND folder IS NEW.folder
+    AND ifnull(former_participants, '') = ifnull(NEW.former_participants, '')
+    AND ifnull(has_attachments, '') = ifnull(NEW.has_attachments, '')
+    AND ifnull(is_subscribed, '') = ifnull(NEW.is_subscribed, '')
+    AND ifnull(last_visible_add_action_id, '') = ifnull(NEW.last_visible_add_action_id, '')
+    AND ifnull(name, '') = ifnull(NEW.name, '')
+    AND ifnull(num_messages, '') = ifnull(NEW.num_messages, '')
+    AND ifnull(num_unread, '') = ifnull(NEW.num_unread, '')
+    AND ifnull(object_participants, '') = ifnull(NEW.object_participants, '')
+    AND ifnull(participants, '') = ifnull(NEW.participants, '')
+    AND ifnull(senders, '') = ifnull(NEW.senders, '')
+    AND single_recipient IS NEW.single_recipient
+    AND ifnull(snippet, '') = ifnull(NEW.snippet, '')
+    AND ifnull(snippet_sender, '') = ifnull(NEW.snippet_sender, '')
+    AND ifnull(snippet_message_has_attachment, '') = ifnull(NEW.snippet_message_has_attachment, '')
+    AND ifnull(subject, '') = ifnull(NEW.subject, '')
+    AND ifnull(tags, '') = ifnull(NEW.tags, '')
+    AND thread_id IS NEW.thread_id
+    AND ifnull(thread_participants, '') = ifnull(NEW.thread_participants, '')
+    AND timestamp IS NEW.timestamp
+    AND unread IS NEW.unread)
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in unified_thread');
+END;
 
 CREATE TABLE IF NOT EXISTS `unified_thread_action` (
   action_id TEXT,
@@ -844,8 +1867,20 @@ CREATE TABLE IF NOT EXISTS `unified_thread_action` (
   timestamp TEXT,
   type INTEGER,
   users ,
-  UNIQUE (action_id, actor, thread_id, timestamp, type, users)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `unified_thread_action_thread_id` ON `unified_thread_action` (thread_id);
+CREATE TRIGGER IF NOT EXISTS `unified_thread_action_dedupe` BEFORE INSERT ON `unified_thread_action`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `unified_thread_action` WHERE ifnull(action_id, '') = ifnull(NEW.action_id, '')
+    AND ifnull(actor, '') = ifnull(NEW.actor, '')
+    AND thread_id IS NEW.thread_id
+    AND ifnull(timestamp, '') = ifnull(NEW.timestamp, '')
+    AND ifnull(type, '') = ifnull(NEW.type, '')
+    AND ifnull(users, '') = ifnull(NEW.users, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in unified_thread_action');
+END;
 
 CREATE TABLE IF NOT EXISTS `unified_thread_count` (
   folder TEXT,
@@ -854,14 +1889,39 @@ CREATE TABLE IF NOT EXISTS `unified_thread_count` (
   last_action_id INTEGER,
   last_seen_time INTEGER,
   total_threads INTEGER,
-  UNIQUE (folder, unread_count, unseen_count, last_action_id, last_seen_time, total_threads)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `unified_thread_count_folder` ON `unified_thread_count` (folder);
+CREATE INDEX IF NOT EXISTS `unified_thread_count_unread_count` ON `unified_thread_count` (unread_count);
+CREATE INDEX IF NOT EXISTS `unified_thread_count_unseen_count` ON `unified_thread_count` (unseen_count);
+CREATE INDEX IF NOT EXISTS `unified_thread_count_last_action_id` ON `unified_thread_count` (last_action_id);
+CREATE INDEX IF NOT EXISTS `unified_thread_count_last_seen_time` ON `unified_thread_count` (last_seen_time);
+CREATE INDEX IF NOT EXISTS `unified_thread_count_total_threads` ON `unified_thread_count` (total_threads);
+CREATE TRIGGER IF NOT EXISTS `unified_thread_count_dedupe` BEFORE INSERT ON `unified_thread_count`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `unified_thread_count` WHERE folder IS NEW.folder
+    AND unread_count IS NEW.unread_count
+    AND unseen_count IS NEW.unseen_count
+    AND last_action_id IS NEW.last_action_id
+    AND last_seen_time IS NEW.last_seen_time
+    AND total_threads IS NEW.total_threads)
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in unified_thread_count');
+END;
 
 CREATE TABLE IF NOT EXISTS `url_like` (
   user_id TEXT,
   url TEXT,
-  UNIQUE (user_id, url)
+  _row_hash TEXT UNIQUE
 );
+CREATE INDEX IF NOT EXISTS `url_like_user_id` ON `url_like` (user_id);
+CREATE TRIGGER IF NOT EXISTS `url_like_dedupe` BEFORE INSERT ON `url_like`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `url_like` WHERE user_id IS NEW.user_id
+    AND ifnull(url, '') = ifnull(NEW.url, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in url_like');
+END;
 
 CREATE TABLE IF NOT EXISTS `user` (
   uid INTEGER,
@@ -938,8 +1998,91 @@ CREATE TABLE IF NOT EXISTS `user` (
   friend_count INTEGER,
   mutual_friend_count INTEGER,
   can_post INTEGER,
-  UNIQUE (uid, username, first_name, middle_name, last_name, name, pic_small, pic_big, pic_square, pic, affiliations, profile_update_time, timezone, religion, birthday, birthday_date, devices, sex, hometown_location, meeting_sex, meeting_for, relationship_status, significant_other_id, political, current_location, activities, interests, is_app_user, music, tv, movies, books, quotes, about_me, hs_info, education_history, work_history, notes_count, wall_count, status, has_added_app, online_presence, locale, proxied_email, profile_url, email_hashes, pic_small_with_logo, pic_big_with_logo, pic_square_with_logo, pic_with_logo, pic_cover, allowed_restrictions, verified, profile_blurb, family, website, is_blocked, contact_email, email, third_party_id, name_format, video_upload_limits, games, work, education, sports, favorite_athletes, favorite_teams, inspirational_people, languages, likes_count, friend_count, mutual_friend_count, can_post)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `user_uid` ON `user` (uid);
+CREATE INDEX IF NOT EXISTS `user_username` ON `user` (username);
+CREATE INDEX IF NOT EXISTS `user_name` ON `user` (name);
+CREATE INDEX IF NOT EXISTS `user_third_party_id` ON `user` (third_party_id);
+CREATE TRIGGER IF NOT EXISTS `user_dedupe` BEFORE INSERT ON `user`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `user` WHERE uid IS NEW.uid
+    AND username IS NEW.username
+    AND ifnull(first_name, '') = ifnull(NEW.first_name, '')
+    AND ifnull(middle_name, '') = ifnull(NEW.middle_name, '')
+    AND ifnull(last_name, '') = ifnull(NEW.last_name, '')
+    AND name IS NEW.name
+    AND ifnull(pic_small, '') = ifnull(NEW.pic_small, '')
+    AND ifnull(pic_big, '') = ifnull(NEW.pic_big, '')
+    AND ifnull(pic_square, '') = ifnull(NEW.pic_square, '')
+    AND ifnull(pic, '') = ifnull(NEW.pic, '')
+    AND ifnull(affiliations, '') = ifnull(NEW.affiliations, '')
+    AND ifnull(profile_update_time, '') = ifnull(NEW.profile_update_time, '')
+    AND ifnull(timezone, '') = ifnull(NEW.timezone, '')
+    AND ifnull(religion, '') = ifnull(NEW.religion, '')
+    AND ifnull(birthday, '') = ifnull(NEW.birthday, '')
+    AND ifnull(birthday_date, '') = ifnull(NEW.birthday_date, '')
+    AND ifnull(devices, '') = ifnull(NEW.devices, '')
+    AND ifnull(sex, '') = ifnull(NEW.sex, '')
+    AND ifnull(hometown_location, '') = ifnull(NEW.hometown_location, '')
+    AND ifnull(meeting_sex, '') = ifnull(NEW.meeting_sex, '')
+    AND ifnull(meeting_for, '') = ifnull(NEW.meeting_for, '')
+    AND ifnull(relationship_status, '') = ifnull(NEW.relationship_status, '')
+    AND ifnull(significant_other_id, '') = ifnull(NEW.significant_other_id, '')
+    AND ifnull(political, '') = ifnull(NEW.political, '')
+    AND ifnull(current_location, '') = ifnull(NEW.current_location, '')
+    AND ifnull(activities, '') = ifnull(NEW.activities, '')
+    AND ifnull(interests, '') = ifnull(NEW.interests, '')
+    AND ifnull(is_app_user, '') = ifnull(NEW.is_app_user, '')
+    AND ifnull(music, '') = ifnull(NEW.music, '')
+    AND ifnull(tv, '') = ifnull(NEW.tv, '')
+    AND ifnull(movies, '') = ifnull(NEW.movies, '')
+    AND ifnull(books, '') = ifnull(NEW.books, '')
+    AND ifnull(quotes, '') = ifnull(NEW.quotes, '')
+    AND ifnull(about_me, '') = ifnull(NEW.about_me, '')
+    AND ifnull(hs_info, '') = ifnull(NEW.hs_info, '')
+    AND ifnull(education_history, '') = ifnull(NEW.education_history, '')
+    AND ifnull(work_history, '') = ifnull(NEW.work_history, '')
+    AND ifnull(notes_count, '') = ifnull(NEW.notes_count, '')
+    AND ifnull(wall_count, '') = ifnull(NEW.wall_count, '')
+    AND ifnull(status, '') = ifnull(NEW.status, '')
+    AND ifnull(has_added_app, '') = ifnull(NEW.has_added_app, '')
+    AND ifnull(online_presence, '') = ifnull(NEW.online_presence, '')
+    AND ifnull(locale, '') = ifnull(NEW.locale, '')
+    AND ifnull(proxied_email, '') = ifnull(NEW.proxied_email, '')
+    AND ifnull(profile_url, '') = ifnull(NEW.profile_url, '')
+    AND ifnull(email_hashes, '') = ifnull(NEW.email_hashes, '')
+    AND ifnull(pic_small_with_logo, '') = ifnull(NEW.pic_small_with_logo, '')
+    AND ifnull(pic_big_with_logo, '') = ifnull(NEW.pic_big_with_logo, '')
+    AND ifnull(pic_square_with_logo, '') = ifnull(NEW.pic_square_with_logo, '')
+    AND ifnull(pic_with_logo, '') = ifnull(NEW.pic_with_logo, '')
+    AND ifnull(pic_cover, '') = ifnull(NEW.pic_cover, '')
+    AND ifnull(allowed_restrictions, '') = ifnull(NEW.allowed_restrictions, '')
+    AND ifnull(verified, '') = ifnull(NEW.verified, '')
+    AND ifnull(profile_blurb, '') = ifnull(NEW.profile_blurb, '')
+    AND ifnull(family, '') = ifnull(NEW.family, '')
+    AND ifnull(website, '') = ifnull(NEW.website, '')
+    AND ifnull(is_blocked, '') = ifnull(NEW.is_blocked, '')
+    AND ifnull(contact_email, '') = ifnull(NEW.contact_email, '')
+    AND ifnull(email, '') = ifnull(NEW.email, '')
+    AND third_party_id IS NEW.third_party_id
+    AND ifnull(name_format, '') = ifnull(NEW.name_format, '')
+    AND ifnull(video_upload_limits, '') = ifnull(NEW.video_upload_limits, '')
+    AND ifnull(games, '') = ifnull(NEW.games, '')
+    AND ifnull(work, '') = ifnull(NEW.work, '')
+    AND ifnull(education, '') = ifnull(NEW.education, '')
+    AND ifnull(sports, '') = ifnull(NEW.sports, '')
+    AND ifnull(favorite_athletes, '') = ifnull(NEW.favorite_athletes, '')
+    AND ifnull(favorite_teams, '') = ifnull(NEW.favorite_teams, '')
+    AND ifnull(inspirational_people, '') = ifnull(NEW.inspirational_people, '')
+    AND ifnull(languages, '') = ifnull(NEW.languages, '')
+    AND ifnull(likes_count, '') = ifnull(NEW.likes_count, '')
+    AND ifnull(friend_count, '') = ifnull(NEW.friend_count, '')
+    AND ifnull(mutual_friend_count, '') = ifnull(NEW.mutual_friend_count, '')
+    AND ifnull(can_post, '') = ifnull(NEW.can_post, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in user');
+END;
 
 CREATE TABLE IF NOT EXISTS `video` (
   vid INTEGER,
@@ -954,14 +2097,44 @@ CREATE TABLE IF NOT EXISTS `video` (
   length REAL,
   src TEXT,
   src_hq TEXT,
-  UNIQUE (vid, owner, title, description, link, thumbnail_link, embed_html, updated_time, created_time, length, src, src_hq)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `video_vid` ON `video` (vid);
+CREATE INDEX IF NOT EXISTS `video_owner` ON `video` (owner);
+CREATE TRIGGER IF NOT EXISTS `video_dedupe` BEFORE INSERT ON `video`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `video` WHERE vid IS NEW.vid
+    AND owner IS NEW.owner
+    AND ifnull(title, '') = ifnull(NEW.title, '')
+    AND ifnull(description, '') = ifnull(NEW.description, '')
+    AND ifnull(link, '') = ifnull(NEW.link, '')
+    AND ifnull(thumbnail_link, '') = ifnull(NEW.thumbnail_link, '')
+    AND ifnull(embed_html, '') = ifnull(NEW.embed_html, '')
+    AND ifnull(updated_time, '') = ifnull(NEW.updated_time, '')
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, '')
+    AND ifnull(length, '') = ifnull(NEW.length, '')
+    AND ifnull(src, '') = ifnull(NEW.src, '')
+    AND ifnull(src_hq, '') = ifnull(NEW.src_hq, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in video');
+END;
 
 CREATE TABLE IF NOT EXISTS `video_tag` (
   vid TEXT,
   subject INTEGER,
   updated_time INTEGER,
   created_time INTEGER,
-  UNIQUE (vid, subject, updated_time, created_time)
-);
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `video_tag_vid` ON `video_tag` (vid);
+CREATE INDEX IF NOT EXISTS `video_tag_subject` ON `video_tag` (subject);
+CREATE TRIGGER IF NOT EXISTS `video_tag_dedupe` BEFORE INSERT ON `video_tag`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `video_tag` WHERE vid IS NEW.vid
+    AND subject IS NEW.subject
+    AND ifnull(updated_time, '') = ifnull(NEW.updated_time, '')
+    AND ifnull(created_time, '') = ifnull(NEW.created_time, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in video_tag');
+END;
 
@@ -8,6 +8,7 @@ __author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
 
 import httplib
 import json
+import sqlite3
 import threading
 import time
 import traceback
@@ -18,6 +19,49 @@ import fql
 import schemautil
 import testutil
 
+# Queries used in the tests below, plus a few more complicated ones. NativeFql
+# is checked against Fql with these, and benchmark.py uses them too.
+QUERIES = (
+  'SELECT *',
+  'SELECT * FROM comment',
+  'SELECT * FROM profile WHERE id = me()',
+  'SELECT * WHERE x',
+  'SELECT id',
+  'SELECT id FROM profile',
+  'SELECT name WHERE id = me()',
+  'INSERT id FROM profile WHERE id = me()',
+  'SELECT bad syntax FROM profile WHERE id = me()',
+  'SELECT can_post FROM profile WHERE id = me()',
+  'SELECT categories FROM page WHERE name = "my_page"',
+  'SELECT id FROM profile WHERE pic = "http://url.to/image"',
+  'SELECT id FROM profile WHERE username = "alice"',
+  'SELECT id FROM profile WHERE username = "pic pic_big type"',
+  'SELECT id, username FROM profile WHERE id = me()',
+  'SELECT name FROM profile WHERE foo()',
+  'SELECT now() FROM profile WHERE id = me()',
+  'SELECT pic_crop FROM profile WHERE id = me()',
+  'SELECT strlen("asdf") FROM profile WHERE id = me()',
+  'SELECT strlen("asdf", "qwert") FROM profile WHERE id = me()',
+  'SELECT strlen() FROM profile WHERE id = me()',
+  'SELECT strlen(username) FROM profile WHERE id = me()',
+  'SELECT strpos("asdf") FROM profile WHERE id = me()',
+  'SELECT strpos("asdf", "sd") FROM profile WHERE id = me()',
+  'SELECT strpos("asdf", "x") FROM profile WHERE id = me()',
+  'SELECT substr("asdf", 0) FROM profile WHERE id = me()',
+  'SELECT substr("asdf", 1, 2) FROM profile WHERE id = me()',
+  'SELECT substr("asdf", 1, 6) FROM profile WHERE id = me()',
+  'SELECT username FROM profile WHERE id = me() AND username = "alice"',
+  'SELECT username FROM profile WHERE id = me()',
+  "SELECT username FROM profile WHERE username = 'it''s'",
+  'SELECT name FROM profile WHERE id = 1 ORDER BY pic LIMIT 3',
+  'SELECT name FROM profile WHERE id = 1; DROP TABLE profile',
+  'SELECT name, pic FROM profile WHERE id IN '
+    '(SELECT page_id FROM page WHERE name = "my_page" AND page_id > 3) '
+    'ORDER BY name DESC LIMIT 5',
+  'SELECT uid2 FROM friend WHERE uid1 = me() AND uid2 IN '
+    '(SELECT uid FROM user WHERE strlen(name) > 3)',
+  )
+
 
 def insert_test_data(conn):
   """Args:
@@ -56,6 +100,117 @@ class FqlTest(unittest.TestCase):
       self.assertEquals('bar', where.tokens[2].get_name())
 
 
+class NativeFqlTest(unittest.TestCase):
+
+  schema = schemautil.FqlSchema.read()
+
+  def setUp(self):
+    # Fql rewrites function calls itself, NativeFql needs the SQLite functions
+    self.fql_conn = schemautil.get_db(':memory:')
+    insert_test_data(self.fql_conn)
+    self.conn = schemautil.get_db(':memory:')
+    insert_test_data(self.conn)
+    fql.create_functions(self.conn, lambda: 1)
+
+  def run_query(self, conn, parsed):
+    """Returns the query's result rows, or the error's code and message."""
+    try:
+      return conn.execute(parsed.to_sqlite()).fetchall()
+    except fql.FqlError, e:
+      return e.code, e.msg
+    except sqlite3.Error, e:
+      return str(e)
+
+  def test_same_results_as_sqlparse(self):
+    orig_time = time.time
+    try:
+      time.time = lambda: 3.14
+      for query in QUERIES:
+        self.assertEquals(
+          self.run_query(self.fql_conn, fql.Fql(self.schema, query, 1)),
+          self.run_query(self.conn, fql.NativeFql(self.schema, query)),
+          query)
+    finally:
+      time.time = orig_time
+
+  def test_tokenize_round_trip(self):
+    for query in QUERIES:
+      self.assertEquals(query, ''.join(v for t, v in fql.tokenize(query)))
+
+  def test_table_and_where(self):
+    parsed = fql.NativeFql(self.schema, 'SELECT a FROM comment WHERE b')
+    self.assertEquals('comment', parsed.table_name())
+    self.assertEquals('WHERE', parsed.tokens[parsed.where[0]][1])
+
+    parsed = fql.NativeFql(self.schema, 'SELECT a WHERE b ORDER BY c')
+    self.assertEquals('', parsed.table_name())
+    self.assertEquals('WHERE b ', ''.join(
+        v for t, v in parsed.tokens[slice(*parsed.where)]))
+
+  def test_keyword_columns_are_checked(self):
+    self.assertRaises(fql.NotIndexableError, fql.NativeFql(
+        self.schema, 'SELECT id FROM profile WHERE type = "page"').to_sqlite)
+
+  def test_function_params(self):
+    def check(query):
+      fql.NativeFql(self.schema, query).to_sqlite()
+
+    check('SELECT strlen(lower(username)) FROM profile WHERE id = me()')
+    check('SELECT substr(username, strlen("x"), 1 + 2) FROM profile WHERE id = 1')
+    self.assertRaises(fql.ParamMismatchError, check,
+                      'SELECT upper(lower()) FROM profile WHERE id = me()')
+    self.assertRaises(fql.InvalidFunctionError, check,
+                      'SELECT length(username) FROM profile WHERE id = me()')
+
+  def test_parameterized(self):
+    def parameterize(query):
+      return fql.NativeFql(self.schema, query).to_parameterized_sqlite()
+
+    query, params = parameterize(
+      'SELECT name FROM profile WHERE id = 3 AND username = "it""s"')
+    self.assertEquals(
+      'SELECT name FROM `profile` WHERE id = ? AND username = ?', query)
+    self.assertEquals((3, 'it"s'), params)
+
+    self.assertEquals(
+      ('SELECT name FROM `profile` WHERE id = ? AND username = ?', (4, 'x')),
+      parameterize('SELECT name FROM profile WHERE id = 4 AND username = "x"'))
+
+    # literals outside the WHERE clause stay inline
+    self.assertEquals(
+      ('SELECT strlen("asdf") FROM `profile` WHERE id = ? LIMIT 3', (1,)),
+      parameterize('SELECT strlen("asdf") FROM profile WHERE id = 1 LIMIT 3'))
+
+  def test_parameterized_same_results_as_inline(self):
+    conn = self.conn
+    for query in QUERIES:
+      try:
+        inline = fql.NativeFql(self.schema, query).to_sqlite()
+        parameterized = fql.NativeFql(self.schema, query
+                                      ).to_parameterized_sqlite()
+      except fql.FqlError:
+        continue
+
+      try:
+        expected = conn.execute(inline).fetchall()
+      except sqlite3.Error:
+        self.assertRaises(sqlite3.Error, conn.execute, *parameterized)
+      else:
+        self.assertEquals(expected, conn.execute(*parameterized).fetchall(),
+                          query)
+
+
+class IterJsonArrayTest(unittest.TestCase):
+
+  def test_same_as_json_dumps(self):
+    objects = [{'a': 1}, {'b': [2, {'c': 'x\ny'}]}, 3, 'z', [], {}]
+    for batches in ([], [[]], [objects[:1]], [objects], [[], objects[:2], [],
+                                                          objects[2:], []]):
+      expected = json.dumps([obj for batch in batches for obj in batch],
+                            indent=2)
+      self.assertEquals(expected, ''.join(fql.iter_json_array(batches)))
+
+
 class FqlHandlerTest(testutil.HandlerTest):
 
   def setUp(self):
@@ -123,6 +278,26 @@ class FqlHandlerTest(testutil.HandlerTest):
     args['format'] = 'xml'
     self.expect('/fql', expected, args)
 
+  def test_streaming_json(self):
+    self.conn.executemany(
+      'INSERT INTO profile(id, username, pic_crop) VALUES(?, ?, ?)',
+      [(i, 'user %d' % i, '{"uri": "http://pic/%d"}' % i)
+       for i in range(2, schemautil.FETCH_BATCH_SIZE * 2 + 10)])
+    self.conn.commit()
+
+    query = 'SELECT id, username, pic_crop FROM profile WHERE id > 0'
+    cursor = self.conn.execute(query)
+    objects = fql.FqlHandler.schema.sqlite_to_json(cursor, 'profile')
+    self.assertEquals(schemautil.FETCH_BATCH_SIZE * 2 + 9, len(objects))
+    expected = json.dumps(objects, indent=2)
+    resp = self.get_response('/method/fql.query',
+                             {'format': 'json', 'query': query})
+    self.assertEquals(expected, resp.body)
+
+    resp = self.get_response('/method/fql.query',
+                             {'format': 'json', 'query': query + ' AND id < 0'})
+    self.assertEquals('[]', resp.body)
+
   def test_multiple_where_conditions(self):
     self.expect_fql(
       'SELECT username FROM profile WHERE id = me() AND username = "alice"',
@@ -141,15 +316,29 @@ class FqlHandlerTest(testutil.HandlerTest):
     try:
       time.time = lambda: 3.14
       self.expect_fql('SELECT now() FROM profile WHERE id = me()',
-                      [{'3': 3}])
+                      [{'now()': 3}])
     finally:
       time.time = orig_time
 
+  def test_rand_function(self):
+    resp = json.loads(self.get_response('/method/fql.query', {
+          'format': 'json',
+          'query': 'SELECT rand() FROM profile WHERE id = me()'}).body)
+    self.assertEquals(1, len(resp))
+    self.assertTrue(0 <= resp[0]['rand()'] < 1)
+
+  def test_lower_and_upper_functions(self):
+    self.expect_fql(
+      'SELECT lower("AsDf"), upper(username) FROM profile WHERE id = me()',
+      [{'lower("AsDf")': 'asdf', 'upper(username)': 'ALICE'}])
+
   def test_strlen_function(self):
     self.expect_fql('SELECT strlen("asdf") FROM profile WHERE id = me()',
-                    [{'length("asdf")': 4}])
+                    [{'strlen("asdf")': 4}])
     self.expect_fql('SELECT strlen(username) FROM profile WHERE id = me()',
-                    [{'length(username)': 5}])
+                    [{'strlen(username)': 5}])
+    self.expect_fql('SELECT strlen(pic) FROM profile WHERE id = me()',
+                    [{'strlen(pic)': None}])
 
     self.expect_error('SELECT strlen() FROM profile WHERE id = me()',
                       fql.ParamMismatchError('strlen', 1, 0))
@@ -158,18 +347,23 @@ class FqlHandlerTest(testutil.HandlerTest):
 
   def test_substr_function(self):
     self.expect_fql('SELECT substr("asdf", 1, 2) FROM profile WHERE id = me()',
-                    [{'substr("asdf", 2, 2)': 'sd'}])
+                    [{'substr("asdf", 1, 2)': 'sd'}])
     self.expect_fql('SELECT substr("asdf", 1, 6) FROM profile WHERE id = me()',
-                    [{'substr("asdf", 2, 6)': 'sdf'}])
+                    [{'substr("asdf", 1, 6)': 'sdf'}])
+    self.expect_fql('SELECT substr(username, 0, 2) FROM profile WHERE id = me()',
+                    [{'substr(username, 0, 2)': 'al'}])
 
     self.expect_error('SELECT substr("asdf", 0) FROM profile WHERE id = me()',
                       fql.ParamMismatchError('substr', 3, 2))
 
   def test_strpos_function(self):
     self.expect_fql('SELECT strpos("asdf", "sd") FROM profile WHERE id = me()',
-                    [{'1': 1}])
+                    [{'strpos("asdf", "sd")': 1}])
     self.expect_fql('SELECT strpos("asdf", "x") FROM profile WHERE id = me()',
-                    [{'-1': -1}])
+                    [{'strpos("asdf", "x")': -1}])
+    self.expect_fql(
+      'SELECT strpos(username, "ic") FROM profile WHERE strpos(username, "ic") > 0',
+      [{'strpos(username, "ic")': 2}])
 
     self.expect_error('SELECT strpos("asdf") FROM profile WHERE id = me()',
                       fql.ParamMismatchError('strpos', 2, 1))
@@ -205,6 +399,42 @@ class FqlHandlerTest(testutil.HandlerTest):
 </fql_query_response>""" % self.ME,
       args={'format': 'xml'})
 
+  def test_xml_escaping(self):
+    self.conn.execute('INSERT INTO profile(id, username) VALUES(2, ?)',
+                      (u'a<b> & "c" \xe9',))
+    self.conn.commit()
+    self.expect_fql(
+      'SELECT username FROM profile WHERE id = 2',
+      """<?xml version="1.0" encoding="UTF-8"?>
+<fql_query_response xmlns="http://api.facebook.com/1.0/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" list="true">
+<profile>
+<username>a&lt;b&gt; &amp; "c" \xc3\xa9</username>
+</profile>
+</fql_query_response>""",
+      args={'format': 'xml'})
+
+  def test_xml_streaming(self):
+    num = schemautil.FETCH_BATCH_SIZE + 2
+    self.conn.executemany('INSERT INTO profile(id) VALUES(?)',
+                          [(i,) for i in range(2, num + 2)])
+    self.conn.commit()
+    self.expect_fql(
+      'SELECT id FROM profile WHERE id > 1 ORDER BY id',
+      """<?xml version="1.0" encoding="UTF-8"?>
+<fql_query_response xmlns="http://api.facebook.com/1.0/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" list="true">
+%s
+</fql_query_response>""" % '\n'.join('<profile>\n<id>%d</id>\n</profile>' % i
+                                      for i in range(2, num + 2)),
+      args={'format': 'xml'})
+
+    self.expect_fql(
+      'SELECT id FROM profile WHERE id < 0',
+      """<?xml version="1.0" encoding="UTF-8"?>
+<fql_query_response xmlns="http://api.facebook.com/1.0/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" list="true">
+
+</fql_query_response>""",
+      args={'format': 'xml'})
+
   def test_format_defaults_to_xml(self):
     for format in ('foo', ''):
       self.expect_fql(
@@ -277,6 +507,37 @@ class FqlHandlerTest(testutil.HandlerTest):
                     [{'username': 'alice'}],
                     args={'access_token': 'qwert'})
 
+  def test_query_cache(self):
+    cache = fql.FqlHandler.query_cache
+    query = 'SELECT username FROM profile WHERE id = me()'
+    for i in range(2):
+      self.expect_fql(query, [{'username': 'alice'}])
+    self.assertEquals(1, cache.misses)
+    self.assertEquals(1, cache.hits)
+
+    # errors are cached too
+    for i in range(2):
+      self.expect_error('SELECT * FROM profile WHERE id = me()',
+                        fql.WildcardError())
+    self.assertEquals(2, cache.hits)
+
+    # me() is evaluated by SQLite, so it's not part of the cache key
+    fql.FqlHandler.me = int(self.ME) + 1
+    self.expect_fql(query, [])
+    self.assertEquals(3, cache.hits)
+
+  def test_query_cache_now(self):
+    orig_time = time.time
+    try:
+      for now in 3.14, 4.5:
+        time.time = lambda: now
+        self.expect_fql('SELECT now() FROM profile WHERE id = me()',
+                        [{'now()': int(now)}])
+    finally:
+      time.time = orig_time
+
+    self.assertEquals(1, fql.FqlHandler.query_cache.hits)
+
   def test_invalid_access_token(self):
     self.expect_error('SELECT username FROM profile WHERE id = me()',
                       fql.InvalidAccessTokenError(),
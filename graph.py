@@ -8,9 +8,12 @@ or an alias.
 
 __author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
 
+import base64
+import copy
 import json
 import os
 import sqlite3
+import threading
 import traceback
 import types
 import urllib
@@ -22,9 +25,34 @@ import sys
 
 import webapp2
 
+import cache
 import oauth
+import posted
 import schemautil
 
+# maximum number of ids and aliases to cache the graph_objects lookups of.
+ALIAS_CACHE_SIZE = 10000
+
+# maximum total size, in bytes of JSON, of the graph_objects and
+# graph_connections rows to cache decoded.
+OBJECT_CACHE_BYTES = 32 * 1024 * 1024
+
+# query parameters for paging through connections.
+# http://developers.facebook.com/docs/reference/api/pagination/
+PAGING_ARGS = ('limit', 'offset', 'since', 'until', 'after', 'before')
+
+# number of elements per page when paging without a limit.
+DEFAULT_PAGE_LIMIT = 25
+
+# selects the given fields of the JSON object in the data column. json_each()
+# returns true and false as 1 and 0, so they're converted back.
+PROJECTION_SQL = """(SELECT json_group_object(key, CASE type
+  WHEN 'true' THEN json('true') WHEN 'false' THEN json('false') ELSE value END)
+  FROM json_each(data) WHERE key IN (%s))"""
+
+# valid ?fields= field names. they're inlined into PROJECTION_SQL.
+FIELD_RE = re.compile(r'^\w+$')
+
 # the one connection that returns an HTTP 302 redirect instead of a normal
 # 200 with response data.
 # http://developers.facebook.com/docs/reference/api/#pictures
@@ -116,6 +144,9 @@ class NoNodeError(JsonError):
   message = 'No node specified'
   type = 'Exception'
 
+class ParameterError(JsonError):
+  message = '(#100) Invalid value for parameter %s: %s'
+
 class InternalError(JsonError):
   status = 500
   message = '%s'
@@ -142,6 +173,25 @@ def is_int(str):
 
 not_int = lambda str: not is_int(str)
 
+def encode_cursor(ordinal):
+  """Returns an opaque paging cursor for a connection element's ordinal."""
+  return base64.urlsafe_b64encode(str(ordinal)).rstrip('=')
+
+def decode_cursor(cursor):
+  """Returns the ordinal in a paging cursor.
+
+  Raises: TypeError or ValueError if the cursor is invalid
+  """
+  cursor = str(cursor)
+  return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+
+def non_negative_int(str):
+  """Parses an integer >= 0. Raises ValueError otherwise."""
+  val = int(str)
+  if val < 0:
+    raise ValueError(str)
+  return val
+
 class UTCTZ(datetime.tzinfo):
   def utcoffset(self, dt):
     return datetime.timedelta(0)
@@ -308,15 +358,39 @@ class GraphHandler(webapp2.RequestHandler):
   connections, because /xyz?... could be either an object or connection request
   depending on what xyz is.
 
+  Thread safe as long as conn is, e.g. a schemautil.ThreadLocalConnection.
+  POSTs are serialized by posted_lock, since they read, modify, and write back
+  posted objects, and each commits its writes before it responds.
+
   Class attributes:
     conn: sqlite3.Connection
     me: integer, the user id that /me should use
     schema: schemautil.GraphSchema
     all_connections: set of all string connection names
+    posted: posted.PostedStore with the posted objects and connection elements
+    posted_lock: threading.RLock
+    json1: boolean, whether SQLite has the JSON1 functions that ?fields= uses
+    alias_cache: cache.LruCache mapping id or alias to tuple of the (id, alias)
+      graph_objects rows it matches.
+    object_cache: cache.LruCache mapping ('object', id) to decoded graph_objects
+      data and ('connection', id, connection) to tuple of decoded
+      graph_connections data. Bounded by the size of the JSON. The cached
+      objects are shared, so callers must copy them before modifying them.
+    local: threading.local with the data_version of this thread's connection
+    graph_version: integer, the graph_version.version that the caches match,
+      or None if it hasn't been read yet
+
+  The caches only hold graph_objects and graph_connections data. Posted objects
+  and elements are stored separately and overlaid on it, so POSTs don't clear
+  the caches. Both caches are cleared when another connection, e.g.
+  download.py, changes graph_objects or graph_connections, and by DELETE /clear.
   """
 
   ROUTES = [webapp2.Route('<id:(/[^/]*)?><connection:(/[^/]*)?/?>', 'graph.GraphHandler')]
 
+  # tuple of string field names that GET requests select, or None for all
+  fields = None
+
   @classmethod
   def init(cls, conn, me):
     """Args:
@@ -326,36 +400,177 @@ class GraphHandler(webapp2.RequestHandler):
     cls.conn = conn
     cls.me = me
     cls.schema = schemautil.GraphSchema.read()
+    cls.json1 = schemautil.has_json1(conn)
     cls.all_connections = reduce(set.union, cls.schema.connections.values(), set())
-    cls.posted_graph_objects = {}
-    cls.posted_connections = {}  # maps id -> connection -> list of elements
+    cls.posted = posted.PostedStore(conn)
+    cls.posted_lock = threading.RLock()
+    cls.alias_cache = cache.LruCache(ALIAS_CACHE_SIZE)
+    cls.object_cache = cache.LruCache(max_bytes=OBJECT_CACHE_BYTES)
+    cls.local = threading.local()
+    cls.graph_version = None
+
+  @classmethod
+  def clear_caches(cls):
+    """Clears the alias and object caches."""
+    cls.alias_cache.clear()
+    cls.object_cache.clear()
+    cls.posted.reset()
+
+  def check_data_version(self):
+    """Clears the caches if another connection has changed the Graph API data.
+
+    PRAGMA data_version changes when other connections commit anything, e.g.
+    OAuth tokens or posted data, so it's only a cheap first check. Its values
+    are per connection, so the last one is stored per thread. When it changes,
+    this rereads graph_version, which triggers on graph_objects and
+    graph_connections increment on every change, and only clears the caches if
+    that changed too. Posted data may have changed either way, so the posted store
+    is always reset.
+    """
+    version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+    last = getattr(self.local, 'data_version', None)
+    self.local.data_version = version
+    if version == last:
+      return
+    elif last is not None:
+      self.posted.reset()
+
+    # each thread's first request gets here before it fills the caches
+    graph_version = self.conn.execute(
+      'SELECT version FROM graph_version').fetchone()[0]
+    if self.graph_version is not None and graph_version != self.graph_version:
+      self.alias_cache.clear()
+      self.object_cache.clear()
+    GraphHandler.graph_version = graph_version
 
   def _get(self, id, connection):
+    namedict, connection = self.prepare(id, connection)
+    return self.fetch(namedict, connection)
+
+  def prepare(self, id, connection):
+    """Checks the access token and looks up the requested ids.
+
+    Args:
+      id: string, the path id, or a connection name for /<connection>?ids=...
+      connection: string
+
+    Returns: (NameDict, string connection) tuple
+
+    Raises: GraphError
+    """
     if id in self.all_connections and not connection:
       connection = id
       id = None
 
-    try:
-      token =  self.request.get('access_token')
-      if token and not oauth.AccessTokenHandler.is_valid_token(self.conn, token):
-        raise ValidationError()
+    token =  self.request.get('access_token')
+    if token and not oauth.AccessTokenHandler.is_valid_token(self.conn, token):
+      raise ValidationError()
+
+    self.check_data_version()
+    return self.prepare_ids(id), connection
+
+  def fetch(self, namedict, connection):
+    """Returns the decoded objects or connections for a request.
+
+    Args:
+      namedict: NameDict
+      connection: string
 
-      namedict = self.prepare_ids(id)
+    Raises: GraphError
+    """
+    if connection:
+      resp = self.get_connections(namedict, connection)
+    else:
+      resp = self.get_objects(namedict)
 
-      if connection:
-        resp = self.get_connections(namedict, connection)
+    if namedict.single:
+      if not resp:
+        resp = []
       else:
-        resp = self.get_objects(namedict)
+        assert len(resp) == 1
+        resp = resp.values()[0]
+    return resp
 
-      if namedict.single:
-        if not resp:
-          resp = []
-        else:
-          assert len(resp) == 1
-          resp = resp.values()[0]
-      return resp
-    except GraphError as e:
-      raise e
+  def get_fields(self):
+    """Parses the fields query parameter, if any.
+
+    Returns: tuple of string field names, or None. Always includes id, like
+      Facebook.
+
+    Raises: ParameterError
+    """
+    val = self.request.get('fields')
+    if not val:
+      return None
+
+    fields = [field.strip() for field in val.split(',') if field.strip()]
+    if not all(FIELD_RE.match(field) for field in fields):
+      raise ParameterError('fields', val)
+    if 'id' not in fields:
+      fields.insert(0, 'id')
+    return tuple(fields)
+
+  def project(self, object):
+    """Returns a copy of object with only the selected fields.
+
+    Returns object itself if there are no selected fields or it's not a dict.
+    """
+    if not self.fields or not isinstance(object, dict):
+      return object
+    return dict((field, object[field]) for field in self.fields
+                if field in object)
+
+  def data_column(self, connection=None):
+    """Returns the SQL expression to select the data column with.
+
+    If fields are selected and SQLite has JSON1, this selects them in SQLite,
+    so that wide objects aren't decoded in Python. Otherwise, it's just data.
+
+    Args:
+      connection: string
+    """
+    if self.fields and self.json1 and connection != REDIRECT_CONNECTION:
+      return PROJECTION_SQL % ','.join("'%s'" % field for field in self.fields)
+    return 'data'
+
+  def get_stored_json(self, namedict, connection):
+    """Returns the response body for a /<id> or /<id>/<connection> request by
+    splicing together the stored JSON, without decoding it.
+
+    Only handles the common case. Returns None for ?ids=... requests, ids with
+    posted objects or connections, paged connections, and redirect or unknown
+    connections, which need fetch().
+
+    Args:
+      namedict: NameDict
+      connection: string
+
+    Returns: string JSON or None
+    """
+    if (not namedict.single or len(namedict) != 1 or
+        connection == REDIRECT_CONNECTION or
+        (connection and connection not in self.all_connections) or
+        (connection and self.get_paging()) or
+        (self.fields and not self.json1)):
+      return None
+
+    id, name = namedict.items()[0]
+    if (self.posted.object_ids((id, name)) or
+        self.posted.has_connections((id, name))):
+      return None
+
+    if not connection:
+      row = self.conn.execute('SELECT %s FROM graph_objects WHERE id = ?' %
+                              self.data_column(), (id,)).fetchone()
+      return row[0] if row else None
+
+    rows = self.conn.execute(
+      'SELECT %s FROM graph_connections WHERE id = ? AND connection = ? '
+      'ORDER BY ordinal' % self.data_column(connection),
+      (id, connection)).fetchall()
+    if not rows:
+      return '{\n  "data": []\n}'
+    return '{\n  "data": [\n    %s\n  ]\n}' % ',\n    '.join(row[0] for row in rows)
 
 
   def get(self, id, connection):
@@ -374,8 +589,13 @@ class GraphHandler(webapp2.RequestHandler):
       id = id.strip("/")
 
     try:
-      resp = self._get(id, connection)
-      json.dump(resp, self.response.out, indent=2)
+      self.fields = self.get_fields()
+      namedict, connection = self.prepare(id, connection)
+      body = self.get_stored_json(namedict, connection)
+      if body is not None:
+        self.response.write(body)
+      else:
+        json.dump(self.fetch(namedict, connection), self.response.out, indent=2)
     except GraphError, e:
       # i don't use webapp2's handle_exception() because there's no way to get
       # the original exception's traceback, which makes testing difficult.
@@ -384,12 +604,29 @@ class GraphHandler(webapp2.RequestHandler):
 
 
   def post(self, id, connection):
+    # commit before responding, so that successful POSTs are durable
+    with self.posted_lock:
+      try:
+        self._post(id, connection)
+        if self.response.status_int == 200:
+          self.posted.commit()
+      except sqlite3.Error, e:
+        error = InternalError(unicode(e))
+        self.response.clear()
+        self.response.write(error.message)
+        self.response.set_status(error.status)
+      finally:
+        # drops partial writes from failed POSTs
+        self.posted.discard()
+
+  def _post(self, id, connection):
     id = id.strip("/")
     connection = connection.strip("/")
 
     # try to get the base object we're posting to
     try:
-      graph_obj = self._get(id, None)
+      # _get() may return cached objects, which are shared
+      graph_obj = copy.deepcopy(self._get(id, None))
     except GraphError as e:
       self.response.write(e.message)
       self.response.set_status(e.status)
@@ -421,9 +658,13 @@ class GraphHandler(webapp2.RequestHandler):
     else:
       # The connection determines what type of object to create
       try:
-        graph_obj = self.create_graph_object(fields, self.request.POST, id, connection, graph_obj)
+        parent_obj = graph_obj
+        graph_obj = self.create_graph_object(fields, self.request.POST, id, connection, parent_obj)
+        if self.posted.object_ids((id,)):
+          # _get() returned a copy, so store the updated parent back
+          self.posted.put_object(id, parent_obj)
         obj_id = graph_obj["id"]
-        GraphHandler.posted_graph_objects[obj_id] = graph_obj
+        self.posted.put_object(obj_id, graph_obj)
         resp = {"id": obj_id}
       except GraphError as e:
         self.response.write(e.message)
@@ -443,8 +684,9 @@ class GraphHandler(webapp2.RequestHandler):
 
   def delete(self, id, connection):
     if id == "/clear":
-      GraphHandler.posted_graph_objects = {}
-      GraphHandler.posted_connections = {}
+      with self.posted_lock:
+        self.posted.clear()
+        self.clear_caches()
       response_code = "ok"
     else:
       response_code = "fail"
@@ -457,19 +699,32 @@ class GraphHandler(webapp2.RequestHandler):
       raise BadGetError()
 
     ids = namedict.keys()
-
-
-    cursor = self.conn.execute(
-      'SELECT id, data FROM graph_objects WHERE id IN (%s)' % self.qmarks(ids),
-      ids)
-    ret_dict = dict((namedict[obj_id], json.loads(data)) for obj_id, data in cursor.fetchall())
+    ret_dict = {}
+    uncached = []
+    # the cache only has whole objects, so skip it if SQLite selects fields
+    column = self.data_column()
+    use_cache = column == 'data'
+    for obj_id in ids:
+      obj = self.object_cache.get(('object', obj_id)) if use_cache else None
+      if obj is None:
+        uncached.append(obj_id)
+      else:
+        ret_dict[namedict[obj_id]] = obj
+
+    if uncached:
+      rows = schemautil.execute_chunked(
+        self.conn, 'SELECT id, %s FROM graph_objects WHERE id IN (%%s)' % column,
+        uncached)
+      for obj_id, data in rows:
+        obj = json.loads(data)
+        if use_cache:
+          self.object_cache.put(('object', obj_id), obj, len(data))
+        ret_dict[namedict[obj_id]] = obj
 
     # Anything in the published graph objects overwrite the normal results
-    for obj_id in ids:
-      if obj_id in GraphHandler.posted_graph_objects:
-        ret_dict[obj_id] = GraphHandler.posted_graph_objects[obj_id]
+    ret_dict.update(self.posted.get_objects(ids))
 
-    return ret_dict
+    return dict((name, self.project(obj)) for name, obj in ret_dict.items())
 
   def get_connections(self, namedict, connection):
     if not namedict:
@@ -477,27 +732,204 @@ class GraphHandler(webapp2.RequestHandler):
     elif connection not in self.all_connections:
       raise UnknownPathError(connection)
 
-    ids = namedict.keys()
-    query = ('SELECT id, data FROM graph_connections '
-               'WHERE id IN (%s) AND connection = ?' % self.qmarks(ids))
-    cursor = self.conn.execute(query, ids + [connection])
-    rows = cursor.fetchall()
+    paging = None
+    if connection != REDIRECT_CONNECTION:
+      paging = self.get_paging()
+    if paging:
+      return dict((name, self.get_page(id, name, connection, paging))
+                  for id, name in namedict.items())
 
-    if connection == REDIRECT_CONNECTION and rows:
-      self.redirect(json.loads(rows[0][1]), abort=True)  # this raises
+    ids = namedict.keys()
+    found = {}
+    uncached = []
+    # the cache only has whole objects, so skip it if SQLite selects fields
+    column = self.data_column(connection)
+    use_cache = column == 'data'
+    for id in ids:
+      data = (self.object_cache.get(('connection', id, connection))
+              if use_cache else None)
+      if data is None:
+        uncached.append(id)
+      else:
+        found[id] = data
+
+    if uncached:
+      query = ('SELECT id, %s FROM graph_connections '
+                 'WHERE id IN (%%s) AND connection = ? ORDER BY ordinal' % column)
+      rows = dict((id, []) for id in uncached)
+      sizes = dict.fromkeys(uncached, 0)
+      for id, data in schemautil.execute_chunked(
+          self.conn, query, uncached, connection):
+        rows[id].append(json.loads(data))
+        sizes[id] += len(data)
+      for id, data in rows.items():
+        found[id] = tuple(data)
+        if use_cache:
+          self.object_cache.put(('connection', id, connection), found[id],
+                                sizes[id])
+
+    if connection == REDIRECT_CONNECTION:
+      for id in sorted(found):
+        if found[id]:
+          self.redirect(found[id][0], abort=True)  # this raises
 
     resp = {}
     # add posted data first b/c it must be newer
     for name in namedict.values():
-      posted_data = GraphHandler.posted_connections.get(name, {}).get(connection, [])
-      resp[name] = {"data": posted_data}
+      resp[name] = {"data": [elem for seq, elem in
+                             self.posted.elements(name, connection)]}
 
-    for id, data in rows:
-      resp[namedict[id]]['data'].extend(posted_data)
-      resp[namedict[id]]['data'].append(json.loads(data))
+    for id, data in found.items():
+      resp[namedict[id]]['data'].extend(data)
 
+    if self.fields:
+      for page in resp.values():
+        page['data'] = [self.project(elem) for elem in page['data']]
     return resp
 
+  def get_paging(self):
+    """Parses the paging query parameters, if any.
+
+    Returns: dict mapping each of PAGING_ARGS to its value or None, or None if
+      there's no request or it doesn't have any paging parameters. since and
+      until are converted to unix timestamps, and after and before to ordinals.
+
+    Raises: ParameterError
+    """
+    if self.request is None:
+      return None
+
+    args = self.request.GET
+    if not any(args.get(arg) for arg in PAGING_ARGS):
+      return None
+
+    paging = {}
+    for arg, parse in (('limit', non_negative_int),
+                       ('offset', non_negative_int),
+                       ('since', schemautil.parse_timestamp),
+                       ('until', schemautil.parse_timestamp),
+                       ('after', decode_cursor),
+                       ('before', decode_cursor)):
+      val = args.get(arg)
+      try:
+        paging[arg] = parse(val) if val else None
+      except (TypeError, ValueError):
+        raise ParameterError(arg, val)
+
+    if paging['limit'] is None:
+      paging['limit'] = DEFAULT_PAGE_LIMIT
+    return paging
+
+  def get_page(self, id, name, connection, paging):
+    """Returns a page of a connection's elements and a paging object.
+
+    Elements are ordered by their ordinal column. Posted elements come first,
+    newest first, with their negated seq as their ordinal, so that cursors work
+    across both and stay valid as more elements are posted. Both are paged in
+    SQL, which uses the (id, connection, ordinal) and (id, connection, seq)
+    indices.
+
+    Args:
+      id: string
+      name: string, the id or alias the request used
+      connection: string
+      paging: dict returned by get_paging()
+
+    Returns: dict with 'data' and 'paging' values
+    """
+    limit = paging['limit']
+    since, until, after, before = [paging[arg] for arg in
+                                   ('since', 'until', 'after', 'before')]
+    # offset paging and cursor paging are separate, like Facebook's
+    cursors = after is not None or before is not None
+    offset = 0 if cursors else paging['offset'] or 0
+
+    # cursors after a stored element are past all of the posted elements
+    skip_posted = after is not None and after >= 0
+    posted_filter = {
+      'since': since,
+      'until': until,
+      'min_seq': -before if before is not None and before <= 0 else None,
+      'max_seq': -after if after is not None else None,
+      }
+
+    def posted_elements(**kwargs):
+      """Returns (ordinal, element) tuples of the matching posted elements."""
+      if skip_posted:
+        return []
+      kwargs.update(posted_filter)
+      return [(-seq, elem) for seq, elem in
+              self.posted.elements(name, connection, **kwargs)]
+
+    conditions = (('created_time >= ?', since), ('created_time <= ?', until),
+                  ('ordinal > ?', after), ('ordinal < ?', before))
+
+    # fetch one extra element to see if there's another page
+    backward = before is not None and after is None
+    where = ' AND '.join(['id = ?', 'connection = ?'] +
+                         [cond for cond, val in conditions if val is not None])
+    query = ('SELECT ordinal, %s FROM graph_connections WHERE %s '
+             'ORDER BY ordinal %s LIMIT ? OFFSET ?' %
+             (self.data_column(connection), where,
+              'DESC' if backward else 'ASC'))
+    params = [id, connection] + [val for cond, val in conditions if val is not None]
+
+    if backward:
+      # stored elements come before posted ones when walking backward
+      rows = self.conn.execute(query, params + [limit + 1, 0]).fetchall()
+      window = [(ordinal, json.loads(data)) for ordinal, data in rows]
+      if len(window) <= limit:
+        window += posted_elements(limit=limit + 1 - len(window),
+                                  newest_first=False)
+      more = len(window) > limit
+      elements = window[:limit][::-1]
+    else:
+      window = posted_elements(limit=limit + 1, offset=offset)
+      if len(window) <= limit:
+        # the posted elements ran out, so skip the rest of the offset in the
+        # stored elements
+        if window or not offset or skip_posted:
+          num_posted = offset + len(window) if window else 0
+        else:
+          num_posted = self.posted.count(name, connection, **posted_filter)
+        rows = self.conn.execute(query, params + [
+            limit + 1 - len(window), max(0, offset - num_posted)]).fetchall()
+        window += [(ordinal, json.loads(data)) for ordinal, data in rows]
+      more = len(window) > limit
+      elements = window[:limit]
+
+    page = {'data': [self.project(elem) for ordinal, elem in elements]}
+    if not elements:
+      return page
+
+    first = encode_cursor(elements[0][0])
+    last = encode_cursor(elements[-1][0])
+    links = {'cursors': {'before': first, 'after': last}}
+    if paging['offset'] is not None and not cursors:
+      if more:
+        links['next'] = self.page_url(offset=offset + limit)
+      if offset:
+        links['previous'] = self.page_url(offset=max(0, offset - limit))
+    else:
+      if more or backward:
+        links['next'] = self.page_url(after=last)
+      if (more and backward) or after is not None:
+        links['previous'] = self.page_url(before=first)
+    page['paging'] = links
+    return page
+
+  def page_url(self, **args):
+    """Returns this request's URL with different paging parameters.
+
+    Args:
+      args: the new paging query parameters
+    """
+    query = dict((name, val.encode('utf-8'))
+                 for name, val in self.request.GET.items()
+                 if name not in ('offset', 'after', 'before'))
+    query.update(args)
+    return '%s?%s' % (self.request.path_url, urllib.urlencode(sorted(query.items())))
+
   def prepare_ids(self, path_id):
     """Returns the id(s) for this request.
 
@@ -529,20 +961,13 @@ class GraphHandler(webapp2.RequestHandler):
       names.remove('me')
       names.add(self.me)
 
-    qmarks = self.qmarks(names)
-    cursor = self.conn.execute(
-      'SELECT id, alias FROM graph_objects WHERE id IN (%s) OR alias IN (%s)' %
-        (qmarks, qmarks),
-      tuple(names) * 2)
-
     namedict = NameDict()
     namedict.single = bool(path_id)
-    for id, alias in cursor.fetchall():
+    for id, alias in self.lookup_names(names):
       assert id in names or alias in names
       namedict[id] = 'me' if me else alias if alias in names else id
-    for name in names:
-      if name in GraphHandler.posted_graph_objects:
-        namedict[name] = name
+    for name in self.posted.object_ids(names):
+      namedict[name] = name
 
     not_found = names - set(namedict.values() + namedict.keys())
     if not_found:
@@ -558,10 +983,39 @@ class GraphHandler(webapp2.RequestHandler):
 
     return namedict
 
-  def qmarks(self, values):
-    """Returns a '?, ?, ...' string with a question mark per value.
+  def lookup_names(self, names):
+    """Looks up ids and aliases in graph_objects, using alias_cache.
+
+    Args:
+      names: set of string ids and/or aliases
+
+    Returns: set of (id, alias) tuples of the graph_objects rows that match
     """
-    return ','.join('?' * len(values))
+    rows = set()
+    uncached = []
+    for name in names:
+      cached = self.alias_cache.get(name)
+      if cached is None:
+        uncached.append(name)
+      else:
+        rows.update(cached)
+
+    if uncached:
+      # a UNION of two index lookups. (OR can't always use both indices.)
+      found = dict((name, []) for name in uncached)
+      for row in schemautil.execute_chunked(
+          self.conn, 'SELECT id, alias FROM graph_objects WHERE id IN (%s) '
+          'UNION SELECT id, alias FROM graph_objects WHERE alias IN (%s)',
+          uncached):
+        for name in row:
+          if name in found:
+            found[name].append(row)
+
+      for name, name_rows in found.items():
+        self.alias_cache.put(name, tuple(name_rows))
+        rows.update(name_rows)
+
+    return rows
 
   def update_graph_object(self, id, connection, graph_object):
     if connection == "likes":
@@ -571,7 +1025,7 @@ class GraphHandler(webapp2.RequestHandler):
         if data["id"] == liker:
           return True  # probably should be False, but Facebook returns True
       like_data.append({"id": liker, "name":"Test", "category": "Test"})
-      GraphHandler.posted_graph_objects[id] = graph_object  # keep a copy the graph object to modify it
+      self.posted.put_object(id, graph_object)  # keep a copy the graph object to modify it
       return True
     return False
 
@@ -632,18 +1086,16 @@ class GraphHandler(webapp2.RequestHandler):
         if YOUTUBE_LINK_RE.search(blob.get("link", "")):
           blob["type"] = "swf"
 
-        connections = GraphHandler.posted_connections.setdefault(id, {})
-        connections.setdefault(connection, []).insert(0,blob)
+        self.posted.add_element(id, connection, blob)
         if connection == "feed":
-          connections.setdefault("posts", []).insert(0,blob)  # posts mirror feed
+          self.posted.add_element(id, "posts", blob)  # posts mirror feed
         return blob
       for c in argument_spec.connections:
         try:
           blob = self.create_blob_from_args(id, fields, CONNECTION_POST_ARGUMENTS.get(c), arguments)
-          connections = GraphHandler.posted_connections.setdefault(id, {})
-          connections.setdefault(connection, []).insert(0,blob)
+          self.posted.add_element(id, connection, blob)
           if connection == "feed":
-            connections.setdefault("posts", []).insert(0,blob)  # posts mirror feed
+            self.posted.add_element(id, "posts", blob)  # posts mirror feed
           return blob
         except GraphError as e:
           last_exception = e
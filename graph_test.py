@@ -4,7 +4,10 @@
 
 __author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
 
+import json
+import os
 import re
+import tempfile
 import traceback
 import unittest
 
@@ -21,11 +24,11 @@ def insert_test_data(conn):
 INSERT INTO graph_objects VALUES('1', 'alice', '{"id": "1", "foo": "bar"}');
 INSERT INTO graph_objects VALUES('2', 'bob', '{"id": "2", "inner": {"foo": "baz"}}');
 INSERT INTO graph_objects VALUES('3', null, '{"id": "3", "type": "page", "inner": {"foo": "baz"}}');
-INSERT INTO graph_connections VALUES('1', 'albums', '{"id": "3"}');
-INSERT INTO graph_connections VALUES('1', 'albums', '{"id": "4"}');
-INSERT INTO graph_connections VALUES('2', 'albums', '{"id": "5"}');
-INSERT INTO graph_connections VALUES('1', 'picture', '"http://alice/picture"');
-INSERT INTO graph_connections VALUES('2', 'picture', '"http://bob/picture"');
+INSERT INTO graph_connections (id, connection, data) VALUES('1', 'albums', '{"id": "3"}');
+INSERT INTO graph_connections (id, connection, data) VALUES('1', 'albums', '{"id": "4"}');
+INSERT INTO graph_connections (id, connection, data) VALUES('2', 'albums', '{"id": "5"}');
+INSERT INTO graph_connections (id, connection, data) VALUES('1', 'picture', '"http://alice/picture"');
+INSERT INTO graph_connections (id, connection, data) VALUES('2', 'picture', '"http://bob/picture"');
 """)
   conn.commit()
 
@@ -52,6 +55,24 @@ class TestBase(testutil.HandlerTest):
     for datum in data:
       self.expect('/%s' % datum.query, datum.data)
 
+  def expect_same_as_decoded(self, paths):
+    """Checks that get_stored_json() responses match the decoded responses.
+
+    Args:
+      paths: sequence of string url paths
+    """
+    stored = [self.get_response(path) for path in paths]
+    orig = graph.GraphHandler.get_stored_json
+    try:
+      graph.GraphHandler.get_stored_json = lambda *args: None
+      decoded = [self.get_response(path) for path in paths]
+    finally:
+      graph.GraphHandler.get_stored_json = orig
+
+    for path, s, d in zip(paths, stored, decoded):
+      self.assertEquals(d.status_int, s.status_int, path)
+      self.assertEquals(json.loads(d.body), json.loads(s.body), path)
+
   def expect_redirect(self, path, redirect_to):
     resp = self.get_response(path)
     self.assertEquals(302, resp.status_int)
@@ -121,6 +142,147 @@ class ObjectTest(TestBase):
     self.expect('/?ids=alice,1', {'alice': self.alice})
     self.expect('/?ids=1,alice', {'alice': self.alice})
 
+  def test_alias_cache(self):
+    cache = graph.GraphHandler.alias_cache
+    for i in range(2):
+      self.expect('/?ids=alice,2', {'alice': self.alice, '2': self.bob})
+    self.assertEquals(2, cache.hits)
+    self.assertEquals(2, cache.misses)
+
+    # names that aren't found are cached too
+    for i in range(2):
+      self.expect_error('/foo', graph.AliasNotFoundError('foo'))
+    self.assertEquals(3, cache.hits)
+
+  def test_alias_cache_cleared_by_delete(self):
+    self.expect('/alice', self.alice)
+    self.assertEquals(1, len(graph.GraphHandler.alias_cache))
+
+    resp = self.app.get_response('/clear', method='DELETE')
+    self.assertEquals(200, resp.status_int)
+    self.assertEquals(0, len(graph.GraphHandler.alias_cache))
+
+  def test_object_cache(self):
+    cache = graph.GraphHandler.object_cache
+    for i in range(2):
+      self.expect('/?ids=alice,2', {'alice': self.alice, '2': self.bob})
+    self.assertEquals(2, cache.hits)
+    self.assertEquals(2, cache.misses)
+    self.assertEquals(sum(len(row[0]) for row in self.conn.execute(
+          "SELECT data FROM graph_objects WHERE id IN ('1', '2')")),
+                      cache.bytes)
+
+  def test_object_cache_kept_by_post(self):
+    self.expect('/3', {'id': '3', 'type': 'page', 'inner': {'foo': 'baz'}})
+    resp = self.app.get_response('/3/feed', method='POST',
+                                 POST={'message': 'hello'})
+    self.assertEquals(200, resp.status_int)
+    # posted data is overlaid on the cached data, so it's still valid
+    self.assertEquals(1, len(graph.GraphHandler.object_cache))
+    feed = json.loads(self.get_response('/3/feed').body)['data']
+    self.assertEquals(['hello'], [elem['message'] for elem in feed])
+
+    # the cached object wasn't modified by the post
+    self.expect('/3', {'id': '3', 'type': 'page', 'inner': {'foo': 'baz'}})
+
+  def test_object_cache_cleared_by_other_connection(self):
+    filename = tempfile.mktemp(prefix='mockfacebook_test.')
+    try:
+      conn = schemautil.get_db(filename)
+      insert_test_data(conn)
+      graph.GraphHandler.init(conn, self.ME)
+      self.expect('/?ids=alice', {'alice': self.alice})
+      self.expect('/albums?ids=alice', {'alice': self.alice_albums})
+
+      other = schemautil.get_db(filename)
+      other.execute(
+        "UPDATE graph_objects SET data = '{\"id\": \"1\"}' WHERE id = '1'")
+      other.execute("DELETE FROM graph_connections WHERE id = '1'")
+      other.commit()
+      other.close()
+
+      self.expect('/?ids=alice', {'alice': {'id': '1'}})
+      self.expect('/albums?ids=alice', {'alice': {'data': []}})
+    finally:
+      testutil.remove_db(filename)
+
+  def test_object_cache_kept_by_other_writes(self):
+    filename = tempfile.mktemp(prefix='mockfacebook_test.')
+    try:
+      conn = schemautil.get_db(filename)
+      insert_test_data(conn)
+      graph.GraphHandler.init(conn, self.ME)
+      self.expect('/?ids=alice', {'alice': self.alice})
+      self.assertEquals(1, len(graph.GraphHandler.object_cache))
+
+      # commits that don't touch graph_objects or graph_connections
+      other = schemautil.get_db(filename)
+      other.execute('INSERT INTO oauth_codes(code, client_id, redirect_uri) '
+                    'VALUES("x", "y", "z")')
+      other.commit()
+      other.close()
+
+      self.expect('/?ids=alice', {'alice': self.alice})
+      self.assertEquals(1, len(graph.GraphHandler.object_cache))
+    finally:
+      testutil.remove_db(filename)
+
+  def test_many_ids(self):
+    ids = [str(i) for i in range(10, 10 + schemautil.MAX_IN_VALUES * 3)]
+    self.conn.executemany(
+      'INSERT INTO graph_objects VALUES (?, ?, ?)',
+      [(id, 'user%s' % id, '{"id": "%s"}' % id) for id in ids])
+    self.conn.commit()
+
+    names = ids[::2] + ['user%s' % id for id in ids[1::2]]
+    self.expect('/?ids=%s' % ','.join(names),
+                dict((name, {'id': name.replace('user', '')}) for name in names))
+
+  def test_stored_json(self):
+    # the stored JSON isn't decoded or cached
+    self.expect('/alice', self.alice)
+    self.assertEquals(0, len(graph.GraphHandler.object_cache))
+
+    paths = ['/alice', '/1', '/me', '/3', '/?ids=alice,2', '/9', '/foo']
+    if self.dataset:
+      self.conn.executescript(self.dataset.to_sql())
+      self.conn.commit()
+      paths += ['/%s' % datum.query for datum in self.dataset.data.values()]
+    self.expect_same_as_decoded(paths)
+
+  def test_stored_json_skipped_for_posted(self):
+    graph.GraphHandler.posted.put_object('1', {'id': '1', 'posted': True})
+    graph.GraphHandler.posted.commit()
+    self.expect('/1', {'id': '1', 'posted': True})
+
+  def test_fields(self):
+    self.conn.execute("""INSERT INTO graph_objects VALUES ('4', 'wide',
+      '{"id": "4", "name": "Wide", "ok": true, "no": false, "none": null,
+        "inner": {"a": [1, "b"]}, "x": "y"}')""")
+    self.conn.commit()
+    wide = {'id': '4', 'name': 'Wide', 'ok': True, 'no': False, 'none': None,
+            'inner': {'a': [1, 'b']}}
+    paths = ['/wide?fields=name,ok,no,none,inner,missing',
+             '/?ids=wide,alice&fields=name,ok,no,none,inner,missing']
+    for json1 in True, False:
+      graph.GraphHandler.json1 = json1
+      self.assertEquals(wide, json.loads(self.get_response(paths[0]).body))
+      self.expect(paths[1], {'wide': wide, 'alice': {'id': '1'}})
+      self.expect('/alice?fields=foo', self.alice)
+      self.expect_same_as_decoded(paths)
+
+    # the cached whole objects aren't projected
+    self.expect('/?ids=wide', {'wide': dict(wide, x='y')})
+
+  def test_fields_posted(self):
+    graph.GraphHandler.posted.put_object('1', {'id': '1', 'posted': True})
+    graph.GraphHandler.posted.commit()
+    self.expect('/1?fields=foo', {'id': '1'})
+
+  def test_bad_fields(self):
+    self.expect_error('/alice', graph.ParameterError('fields', 'a,b c'),
+                      args={'fields': 'a,b c'})
+
   def test_access_token(self):
     self.conn.execute(
       'INSERT INTO oauth_access_tokens(code, token) VALUES("asdf", "qwert")')
@@ -175,6 +337,190 @@ class ConnectionTest(TestBase):
     self.expect('/albums?ids=alice,bob',
                 {'alice': self.alice_albums, 'bob': self.bob_albums})
 
+  def test_many_ids(self):
+    ids = [str(i) for i in range(10, 10 + schemautil.MAX_IN_VALUES * 3)]
+    self.conn.executemany('INSERT INTO graph_objects VALUES (?, NULL, "{}")',
+                          [(id,) for id in ids])
+    self.conn.executemany(
+      'INSERT INTO graph_connections (id, connection, data) '
+      'VALUES (?, "albums", ?)',
+      [(id, '{"id": "%s"}' % id) for id in ids])
+    self.conn.commit()
+
+    self.expect('/albums?ids=%s' % ','.join(ids),
+                dict((id, {'data': [{'id': id}]}) for id in ids))
+
+  def test_no_request(self):
+    handler = graph.GraphHandler()
+    self.assertEquals({'alice': self.alice_albums}, handler.get_connections(
+        graph.NameDict({'1': 'alice'}), 'albums'))
+
+  def test_stored_json(self):
+    paths = ['/alice/albums', '/bob/albums', '/me/albums', '/alice/family',
+             '/9/albums', '/alice/foo', '/albums?ids=alice,bob']
+    if self.dataset:
+      self.conn.executescript(self.dataset.to_sql())
+      self.conn.commit()
+      paths += ['/%s' % conn.query for conn in self.dataset.connections.values()
+                if conn.name != graph.REDIRECT_CONNECTION]
+    self.expect_same_as_decoded(paths)
+
+  def test_stored_json_skipped_for_posted(self):
+    resp = self.app.get_response('/3/feed', method='POST',
+                                 POST={'message': 'hello'})
+    self.assertEquals(200, resp.status_int)
+    resp = self.get_response('/3/feed')
+    self.assertEquals(['hello'],
+                      [post['message'] for post in json.loads(resp.body)['data']])
+
+  def get_page(self, path):
+    """Returns the decoded JSON response for a path or paging URL."""
+    resp = self.get_response(path.replace('http://localhost', ''))
+    self.assertEquals(200, resp.status_int, resp.body)
+    return json.loads(resp.body)
+
+  def test_ordered_by_ordinal(self):
+    self.conn.execute('UPDATE graph_connections SET ordinal = -ordinal')
+    self.conn.commit()
+    reversed = [{'id': '4'}, {'id': '3'}]
+    self.assertEquals(reversed, self.get_page('/alice/albums')['data'])
+    self.assertEquals(reversed,
+                      self.get_page('/albums?ids=alice')['alice']['data'])
+
+  def test_paging_cursors(self):
+    first = self.get_page('/alice/albums?limit=1')
+    self.assertEquals([{'id': '3'}], first['data'])
+    cursors = first['paging']['cursors']
+    self.assertEquals(
+      'http://localhost/alice/albums?after=%s&limit=1' % cursors['after'],
+      first['paging']['next'])
+    self.assertNotIn('previous', first['paging'])
+
+    second = self.get_page(first['paging']['next'])
+    self.assertEquals([{'id': '4'}], second['data'])
+    self.assertNotIn('next', second['paging'])
+
+    self.assertEquals(first, self.get_page(second['paging']['previous']))
+
+  def test_paging_offset(self):
+    page = self.get_page('/alice/albums?limit=1&offset=1')
+    self.assertEquals([{'id': '4'}], page['data'])
+    self.assertEquals('http://localhost/alice/albums?limit=1&offset=0',
+                      page['paging']['previous'])
+    self.assertNotIn('next', page['paging'])
+
+    self.assertEquals({'data': []}, self.get_page('/alice/albums?offset=5'))
+
+  def test_paging_since_until(self):
+    self.conn.executemany(
+      'INSERT INTO graph_connections (id, connection, data, created_time) '
+      'VALUES ("2", "feed", ?, ?)',
+      [('{"id": "%d"}' % i, 1000 + i) for i in range(5)])
+    self.conn.commit()
+
+    self.assertEquals([{'id': '1'}, {'id': '2'}, {'id': '3'}], self.get_page(
+        '/bob/feed?since=1001&until=1003')['data'])
+    self.assertEquals([{'id': '3'}, {'id': '4'}], self.get_page(
+        '/bob/feed?since=1970-01-01T00:16:43%2B0000')['data'])
+
+  def test_paging_posted(self):
+    for message in 'a', 'b':
+      resp = self.app.get_response('/3/feed', method='POST',
+                                   POST={'message': message})
+      self.assertEquals(200, resp.status_int)
+    self.conn.execute('INSERT INTO graph_connections (id, connection, data) '
+                      'VALUES ("3", "feed", \'{"message": "stored"}\')')
+    self.conn.commit()
+
+    messages = []
+    path = '/3/feed?limit=2'
+    while path:
+      page = self.get_page(path)
+      messages += [elem['message'] for elem in page['data']]
+      path = page['paging'].get('next')
+    self.assertEquals(['b', 'a', 'stored'], messages)
+
+  def post_feed(self, *messages):
+    for message in messages:
+      resp = self.app.get_response('/3/feed', method='POST',
+                                   POST={'message': message})
+      self.assertEquals(200, resp.status_int)
+
+  def test_paging_posted_cursors_stable(self):
+    self.post_feed('a', 'b')
+    first = self.get_page('/3/feed?limit=1')
+    self.assertEquals(['b'], [elem['message'] for elem in first['data']])
+
+    # posting more doesn't shift the pages after a cursor
+    self.post_feed('c')
+    second = self.get_page(first['paging']['next'])
+    self.assertEquals(['a'], [elem['message'] for elem in second['data']])
+
+  def test_paging_posted_offset(self):
+    self.post_feed(*[str(i) for i in range(5)])
+    self.conn.execute('INSERT INTO graph_connections (id, connection, data) '
+                      'VALUES ("3", "feed", \'{"message": "stored"}\')')
+    self.conn.commit()
+    for offset, expected in ((3, ['1', '0']), (5, ['stored']), (6, [])):
+      page = self.get_page('/3/feed?limit=2&offset=%d' % offset)
+      self.assertEquals(expected, [elem['message'] for elem in page['data']])
+
+  def test_posted_survives_restart(self):
+    # committed before the POST responds
+    self.post_feed('a')
+    graph.GraphHandler.init(self.conn, self.ME)
+    self.assertEquals(['a'], [elem['message'] for elem in
+                              self.get_page('/3/feed')['data']])
+
+  def test_post_commit_fails(self):
+    self.post_feed('a')
+    # reusing a seq violates the primary key
+    graph.GraphHandler.posted.next_seq -= 1
+    resp = self.app.get_response('/3/feed', method='POST',
+                                 POST={'message': 'b'})
+    self.assertEquals(500, resp.status_int)
+    self.assertEquals('InternalError', json.loads(resp.body)['error']['type'])
+
+    # nothing from the failed POST was kept, and later POSTs work
+    graph.GraphHandler.posted.next_seq += 2
+    self.post_feed('c')
+    self.assertEquals(['c', 'a'], [elem['message'] for elem in
+                                   self.get_page('/3/feed')['data']])
+
+  def test_fields(self):
+    self.conn.execute('INSERT INTO graph_connections (id, connection, data) '
+                      'VALUES ("2", "albums", \'{"id": "6", "name": "x"}\')')
+    self.conn.commit()
+    for json1 in True, False:
+      graph.GraphHandler.json1 = json1
+      self.expect('/bob/albums?fields=name',
+                  {'data': [{'id': '5'}, {'id': '6', 'name': 'x'}]})
+      self.expect('/albums?ids=bob&fields=name',
+                  {'bob': {'data': [{'id': '5'}, {'id': '6', 'name': 'x'}]}})
+      self.assertEquals([{'id': '6', 'name': 'x'}], self.get_page(
+          '/bob/albums?fields=name&offset=1')['data'])
+      self.expect_redirect('/alice/picture?fields=name', 'http://alice/picture')
+
+  def test_paging_ids(self):
+    page = self.get_page('/albums?ids=alice,bob&limit=1')
+    self.assertEquals([{'id': '3'}], page['alice']['data'])
+    self.assertIn('next', page['alice']['paging'])
+    self.assertEquals([{'id': '5'}], page['bob']['data'])
+    self.assertNotIn('next', page['bob']['paging'])
+
+  def test_paging_bad_args(self):
+    for arg, val in ('limit', 'x'), ('offset', '-1'), ('after', '$'), ('since', 'x'):
+      self.expect_error('/alice/albums', graph.ParameterError(arg, val),
+                        args={arg: val})
+
+  def test_paging_uses_index(self):
+    plan = self.conn.execute(
+      'EXPLAIN QUERY PLAN SELECT ordinal, data FROM graph_connections '
+      'WHERE id = ? AND connection = ? AND ordinal > ? '
+      'ORDER BY ordinal ASC LIMIT ? OFFSET ?', ('1', 'albums', 0, 2, 0)
+      ).fetchall()
+    self.assertIn('USING INDEX graph_connections_ordinal', plan[0][-1])
+
   def test_picture_redirect(self):
     for path in ('/alice/picture',
                  '/picture?ids=alice',
@@ -1,27 +1,134 @@
 -- mockfacebook tables for storing OAuth and Graph API data. (The FQL tables are
 -- automatically generated into fql_schema.sql by download.py.)
 
+-- expires_at columns are unix timestamps, or NULL for never. oauth.Sweeper
+-- deletes expired rows via their indices.
 CREATE TABLE IF NOT EXISTS oauth_codes (
   code TEXT NOT NULL PRIMARY KEY,
   client_id TEXT NOT NULL,
-  redirect_uri TEXT NOT NULL
+  redirect_uri TEXT NOT NULL,
+  expires_at INTEGER
 );
 
+CREATE INDEX IF NOT EXISTS oauth_codes_expires_at ON oauth_codes(expires_at);
+
 CREATE TABLE IF NOT EXISTS oauth_access_tokens (
   token TEXT NOT NULL,
   code TEXT NOT NULL,
+  expires_at INTEGER,
   FOREIGN KEY(code) REFERENCES auth_codes(code)
 );
 
+-- every Graph API and FQL request with an access_token looks it up.
+CREATE UNIQUE INDEX IF NOT EXISTS oauth_access_tokens_token
+  ON oauth_access_tokens(token);
+
+CREATE INDEX IF NOT EXISTS oauth_access_tokens_expires_at
+  ON oauth_access_tokens(expires_at);
+
+-- signed access tokens revoked by DELETE /oauth/access_token. expires is when
+-- the token would have expired anyway. (revoked random access tokens are just
+-- deleted from oauth_access_tokens.)
+CREATE TABLE IF NOT EXISTS oauth_revoked_tokens (
+  token TEXT NOT NULL PRIMARY KEY,
+  expires INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS oauth_revoked_tokens_expires
+  ON oauth_revoked_tokens(expires);
+
 CREATE TABLE IF NOT EXISTS graph_objects (
   id TEXT NOT NULL PRIMARY KEY,
   alias TEXT,         -- optional
   data TEXT NOT NULL  -- JSON dict
 );
 
+CREATE UNIQUE INDEX IF NOT EXISTS graph_objects_alias ON graph_objects(alias)
+  WHERE alias IS NOT NULL;
+
+-- ordinal and created_time were added after the other columns, so inserts must
+-- name their columns, e.g. INSERT INTO graph_connections (id, connection, data).
 CREATE TABLE IF NOT EXISTS graph_connections (
   id TEXT NOT NULL,
   connection TEXT NOT NULL,
   data TEXT NOT NULL,  -- JSON dict
+  ordinal INTEGER,     -- position in the connection. defaults to the rowid.
+  created_time INTEGER,  -- optional unix timestamp
   UNIQUE(id, connection, data)
 );
+
+-- connections are returned in ordinal order, and paged by ordinal or
+-- created_time, so that paging is an index range scan.
+CREATE INDEX IF NOT EXISTS graph_connections_ordinal
+  ON graph_connections(id, connection, ordinal);
+CREATE INDEX IF NOT EXISTS graph_connections_created_time
+  ON graph_connections(id, connection, created_time);
+
+CREATE TRIGGER IF NOT EXISTS graph_connections_default_ordinal
+  AFTER INSERT ON graph_connections WHEN NEW.ordinal IS NULL
+BEGIN
+  UPDATE graph_connections SET ordinal = NEW.rowid WHERE rowid = NEW.rowid;
+END;
+
+-- a counter that's incremented by every change to graph_objects and
+-- graph_connections, so that graph.py can tell when to clear its caches.
+CREATE TABLE IF NOT EXISTS graph_version (
+  version INTEGER NOT NULL
+);
+
+INSERT INTO graph_version SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM graph_version);
+
+CREATE TRIGGER IF NOT EXISTS graph_objects_insert_version
+  AFTER INSERT ON graph_objects
+BEGIN
+  UPDATE graph_version SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS graph_objects_update_version
+  AFTER UPDATE ON graph_objects
+BEGIN
+  UPDATE graph_version SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS graph_objects_delete_version
+  AFTER DELETE ON graph_objects
+BEGIN
+  UPDATE graph_version SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS graph_connections_insert_version
+  AFTER INSERT ON graph_connections
+BEGIN
+  UPDATE graph_version SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS graph_connections_update_version
+  AFTER UPDATE ON graph_connections
+BEGIN
+  UPDATE graph_version SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS graph_connections_delete_version
+  AFTER DELETE ON graph_connections
+BEGIN
+  UPDATE graph_version SET version = version + 1;
+END;
+
+-- objects and connection elements posted to the Graph API. they overlay
+-- graph_objects and graph_connections, and are deleted by DELETE /clear.
+CREATE TABLE IF NOT EXISTS posted_graph_objects (
+  id TEXT NOT NULL PRIMARY KEY,
+  data TEXT NOT NULL  -- JSON dict
+);
+
+CREATE TABLE IF NOT EXISTS posted_graph_connections (
+  seq INTEGER PRIMARY KEY,  -- increases with each post
+  id TEXT NOT NULL,         -- the id or alias that was posted to
+  connection TEXT NOT NULL,
+  data TEXT NOT NULL,       -- JSON dict
+  created_time INTEGER      -- optional unix timestamp
+);
+
+-- newest first reads are a backward range scan.
+CREATE INDEX IF NOT EXISTS posted_graph_connections_seq
+  ON posted_graph_connections(id, connection, seq);
@@ -6,19 +6,70 @@ Based on http://developers.facebook.com/docs/authentication/ .
 __author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
 
 import base64
+import hashlib
+import hmac
+import json
 import logging
 import os
+import threading
+import time
 import urllib
 import urlparse
 
 from webob import exc
 import webapp2
 
+import cache
+import schemautil
+
 
 AUTH_CODE_PATH = '/dialog/oauth'
 ACCESS_TOKEN_PATH = '/oauth/access_token'
+# seconds until access tokens expire. a string, since responses include it as
+# is.
 EXPIRES = '999999'
+# seconds until auth codes expire. matches Facebook.
+CODE_EXPIRES = 600
 RANDOM_BYTES = 16
+TOKEN_SECRET_BYTES = 32
+
+# maximum number of access tokens to cache the validity of.
+TOKEN_CACHE_SIZE = 10000
+
+# seconds to cache that an access token is invalid. tokens that this process
+# creates are cached as valid immediately, but ones that other processes
+# create, e.g. download.py or the --workers writer, aren't seen until then.
+INVALID_TOKEN_TTL = 1
+
+# seconds that the first of concurrent auth code and access token writes waits
+# for others to join its transaction. only used with --threads. even with 0,
+# writes that arrive during a commit share the next one, and in benchmark.py
+# oauth_logins, waiting longer only added latency. raise it if syncs are slow.
+COMMIT_WINDOW = 0
+
+# seconds to cache whether a signed access token is revoked. tokens that this
+# process revokes are seen immediately, ones that other processes revoke
+# within this long.
+REVOKED_TOKENS_TTL = 1
+
+# separates the payload and signature of a signed access token. random tokens
+# are URL safe base64, which never contains it.
+SIGNED_TOKEN_SEPARATOR = '.'
+
+# seconds between Sweeper runs.
+SWEEP_INTERVAL = 60
+
+# maximum number of expired rows that Sweeper deletes per transaction, and
+# seconds that it pauses between them, so that it never holds SQLite's write
+# lock for long.
+SWEEP_BATCH_SIZE = 1000
+SWEEP_BATCH_PAUSE = 0.01
+
+# (table, expiration column) tuples that Sweeper deletes expired rows from.
+SWEPT_TABLES = (('oauth_codes', 'expires_at'),
+                ('oauth_access_tokens', 'expires_at'),
+                ('oauth_revoked_tokens', 'expires'),
+                )
 
 ERROR_TEXT = """
 mockfacebook
@@ -32,17 +83,112 @@ nicely formatted HTML.)
 ERROR_JSON = '{"error":{"type":"OAuthException","message":"%s."}}'
 
 
+def b64encode(data):
+  """URL safe base64 without padding, so that it doesn't need quoting."""
+  return base64.urlsafe_b64encode(data).rstrip('=')
+
+def b64decode(data):
+  return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class TokenSigner(object):
+  """Mints and verifies stateless access tokens signed with HMAC-SHA256.
+
+  A signed token is PAYLOAD.SIGNATURE, both URL safe base64, where PAYLOAD is
+  the JSON list [client_id, user id, issued, expires] and the times are unix
+  timestamps. Verifying one doesn't touch SQLite, so any process that knows
+  the secret can do it.
+
+  Attributes:
+    secret: string
+  """
+
+  def __init__(self, secret):
+    """Args:
+      secret: string
+    """
+    self.secret = secret
+
+  def signature(self, payload):
+    return hmac.new(self.secret, payload, hashlib.sha256).digest()
+
+  def sign(self, client_id, user_id, issued=None):
+    """Returns a new signed access token that expires in EXPIRES seconds.
+
+    Args:
+      client_id: string
+      user_id: string
+      issued: integer unix timestamp, defaults to now
+    """
+    if issued is None:
+      issued = int(time.time())
+    payload = b64encode(json.dumps(
+        [client_id, user_id, issued, issued + int(EXPIRES)],
+        separators=(',', ':')))
+    return payload + SIGNED_TOKEN_SEPARATOR + b64encode(self.signature(payload))
+
+  def verify(self, token, now=None):
+    """Checks a signed access token's signature and expiration.
+
+    Args:
+      token: string
+      now: unix timestamp, defaults to now
+
+    Returns: dict with client_id, user_id, issued, and expires keys, or None if
+      the token is malformed, forged, or expired
+    """
+    try:
+      payload, signature = token.encode('ascii').split(SIGNED_TOKEN_SEPARATOR)
+      if not hmac.compare_digest(self.signature(payload), b64decode(signature)):
+        return None
+      fields = json.loads(b64decode(payload))
+    except (TypeError, ValueError):
+      return None
+
+    if not isinstance(fields, list) or len(fields) != 4:
+      return None
+    info = dict(zip(('client_id', 'user_id', 'issued', 'expires'), fields))
+    if info['expires'] <= (time.time() if now is None else now):
+      return None
+    return info
+
+
 class BaseHandler(webapp2.RequestHandler):
   """Base handler class for OAuth handlers.
 
+  Thread safe as long as conn is, e.g. a schemautil.ThreadLocalConnection.
+
+  Auth codes and access tokens are inserted via a schemautil.GroupCommitter,
+  so that concurrent logins share transactions.
+
+  If signer is set, e.g. by server.py --signed_tokens, new access tokens are
+  signed instead of stored, and only their revocations are stored.
+
   Attributes:
     conn: sqlite3.Connection
+    me: string user id that signed access tokens are issued to
+    committer: schemautil.GroupCommitter, shared by all OAuth handlers
+    token_cache: cache.LruCache mapping access token to (boolean valid, unix
+      timestamp when the cached result expires, or None for never) tuple. For
+      signed tokens, valid only means not revoked.
+    signer: TokenSigner, or None to issue random access tokens
+    sweeper: Sweeper, or None
   """
 
+  committer = None
+  token_cache = cache.LruCache(TOKEN_CACHE_SIZE)
+  signer = None
+  sweeper = None
+
   @classmethod
   def init(cls, conn, me=None):
-    # me is unused
     cls.conn = conn
+    cls.me = me
+    if not BaseHandler.committer or BaseHandler.committer.conn is not conn:
+      threaded = isinstance(conn, schemautil.ThreadLocalConnection)
+      BaseHandler.committer = schemautil.GroupCommitter(
+        conn, window=COMMIT_WINDOW if threaded else 0)
+      BaseHandler.token_cache.clear()
 
   def get_required_args(self, *args):
     """Checks that one or more args are in the query args.
@@ -70,10 +216,10 @@ class BaseHandler(webapp2.RequestHandler):
     Returns: string auth code
     """
     code = base64.urlsafe_b64encode(os.urandom(RANDOM_BYTES))
-    self.conn.execute(
-      'INSERT INTO oauth_codes(code, client_id, redirect_uri) VALUES(?, ?, ?)',
-      (code, client_id, redirect_uri))
-    self.conn.commit()
+    self.committer.write(
+      'INSERT INTO oauth_codes(code, client_id, redirect_uri, expires_at) '
+      'VALUES(?, ?, ?, ?)',
+      (code, client_id, redirect_uri, int(time.time()) + CODE_EXPIRES))
     return code
 
   def create_access_token(self, code, client_id, redirect_uri):
@@ -87,11 +233,15 @@ class BaseHandler(webapp2.RequestHandler):
     Returns: string auth code
     """
     cursor = self.conn.execute(
-      'SELECT client_id, redirect_uri FROM oauth_codes WHERE code = ?', (code,))
+      'SELECT client_id, redirect_uri, expires_at FROM oauth_codes '
+      'WHERE code = ?', (code,))
     row = cursor.fetchone()
     assert row, ERROR_JSON % (
       'Error validating verification code: auth code %s not found' % code)
-    code_client_id, code_redirect = row
+    code_client_id, code_redirect, code_expires_at = row
+    expired = code_expires_at is not None and code_expires_at <= time.time()
+    assert not expired, ERROR_JSON % (
+      'Error validating verification code: auth code %s has expired' % code)
 
     for code_arg, arg, name in ((code_client_id, client_id, 'client_id'),
                                 (code_redirect, redirect_uri, 'redirect_uri')):
@@ -99,13 +249,70 @@ class BaseHandler(webapp2.RequestHandler):
         'mismatched %s values: %s received %s, %s received %s' %
         (name, AUTH_CODE_PATH, code_arg, ACCESS_TOKEN_PATH, arg))
 
+    if self.signer:
+      return self.signer.sign(client_id, unicode(self.me))
+
     token = base64.urlsafe_b64encode(os.urandom(RANDOM_BYTES))
-    self.conn.execute('INSERT INTO oauth_access_tokens(code, token) VALUES(?, ?)',
-                      (code, token))
-    self.conn.commit()
+    expires_at = int(time.time()) + int(EXPIRES)
+    self.committer.write(
+      'INSERT INTO oauth_access_tokens(code, token, expires_at) '
+      'VALUES(?, ?, ?)', (code, token, expires_at))
+    self.token_cache.put(token, (True, expires_at))
 
     return token
 
+  @classmethod
+  def is_revoked(cls, conn, access_token):
+    """Returns True if the given signed access token has been revoked.
+
+    Only call this for tokens that signer has verified. Looks the token up by
+    primary key and caches the result in token_cache, as whether it's valid,
+    for REVOKED_TOKENS_TTL seconds.
+    """
+    now = time.time()
+    cached = cls.token_cache.get(access_token)
+    if cached is not None:
+      valid, until = cached
+      if until is None or until > now:
+        return not valid
+
+    revoked = conn.execute(
+      'SELECT 1 FROM oauth_revoked_tokens WHERE token = ?',
+      (access_token,)).fetchone() is not None
+    cls.token_cache.put(access_token, (not revoked, now + REVOKED_TOKENS_TTL))
+    return revoked
+
+  def revoke_token(self, access_token):
+    """Revokes an access token, signed or random.
+
+    Signed tokens are stored in oauth_revoked_tokens until they expire. Random
+    tokens are deleted from oauth_access_tokens and evicted from token_cache.
+    Other processes that have a random token cached as valid keep accepting it
+    until it falls out of their caches.
+
+    Args:
+      access_token: string
+
+    Returns: boolean, False if the token isn't a valid signed token or a stored
+      random token
+    """
+    if self.signer and SIGNED_TOKEN_SEPARATOR in access_token:
+      info = self.signer.verify(access_token)
+      if info:
+        self.committer.write(
+          'INSERT OR IGNORE INTO oauth_revoked_tokens(token, expires) '
+          'VALUES(?, ?)', (access_token, info['expires']))
+        self.token_cache.put(access_token, (False, None))
+        return True
+
+    if self.conn.execute('SELECT 1 FROM oauth_access_tokens WHERE token = ?',
+                         (access_token,)).fetchone() is None:
+      return False
+    self.committer.write('DELETE FROM oauth_access_tokens WHERE token = ?',
+                         (access_token,))
+    self.token_cache.pop(access_token)
+    return True
+
 
 class AuthCodeHandler(BaseHandler):
   """The auth code request handler.
@@ -161,12 +368,35 @@ class AccessTokenHandler(BaseHandler):
 
   ROUTES = [(r'/oauth/access_token/?', 'oauth.AccessTokenHandler')]
 
-  @staticmethod
-  def is_valid_token(conn, access_token):
-    """Returns True if the given access token is valid, False otherwise."""
-    cursor = conn.execute('SELECT token FROM oauth_access_tokens WHERE token = ?',
-                          (access_token,))
-    return cursor.fetchone() is not None
+  @classmethod
+  def is_valid_token(cls, conn, access_token):
+    """Returns True if the given access token is valid, False otherwise.
+
+    Signed tokens are verified with signer, then checked for revocation. Random
+    ones use token_cache, so checking a hot token doesn't touch SQLite. Expired
+    tokens are invalid even before Sweeper deletes them.
+    """
+    if cls.signer and SIGNED_TOKEN_SEPARATOR in access_token:
+      return (cls.signer.verify(access_token) is not None and
+              not cls.is_revoked(conn, access_token))
+
+    now = time.time()
+    cached = cls.token_cache.get(access_token)
+    if cached is not None:
+      valid, until = cached
+      if until is None or until > now:
+        return valid
+
+    cursor = conn.execute(
+      'SELECT expires_at FROM oauth_access_tokens WHERE token = ?',
+      (access_token,))
+    row = cursor.fetchone()
+    if row is not None and (row[0] is None or row[0] > now):
+      cls.token_cache.put(access_token, (True, row[0]))
+      return True
+    else:
+      cls.token_cache.put(access_token, (False, now + INVALID_TOKEN_TTL))
+      return False
 
   def get(self):
     """Handles a /oauth/access_token request to allocate an access token.
@@ -195,3 +425,112 @@ class AccessTokenHandler(BaseHandler):
           urllib.urlencode({'access_token': token, 'expires': EXPIRES}))
     except AssertionError, e:
       raise exc.HTTPClientError(unicode(e).encode('utf8'))
+
+  def delete(self):
+    """Handles a DELETE /oauth/access_token request to revoke an access token.
+    """
+    token = self.request.get('access_token')
+    if not token:
+      raise exc.HTTPClientError(ERROR_JSON % 'Missing access_token parameter')
+
+    if not self.revoke_token(token):
+      raise exc.HTTPClientError(ERROR_JSON % 'Invalid access_token')
+    self.response.charset = 'utf-8'
+    self.response.out.write('true')
+
+
+class Sweeper(threading.Thread):
+  """Background thread that deletes expired auth codes, access tokens, and
+  revocations.
+
+  Each sweep deletes from each of SWEPT_TABLES in transactions of at most
+  SWEEP_BATCH_SIZE rows, found via their expiration indices, so request
+  handlers only ever wait for one short batch.
+
+  Attributes:
+    conn: sqlite3.Connection. Should be this thread's own, e.g. a
+      schemautil.ThreadLocalConnection.
+    interval: float, seconds between sweeps
+    stopped: threading.Event, set to stop
+    lock: threading.Lock that guards the statistics
+    sweeps: integer, number of completed sweeps
+    sweep_secs: float, total time spent deleting
+    deleted: dict mapping table to number of expired rows deleted
+  """
+
+  def __init__(self, conn, interval=SWEEP_INTERVAL):
+    """Args:
+      conn: sqlite3.Connection
+      interval: float, seconds between sweeps
+    """
+    super(Sweeper, self).__init__(name='oauth.Sweeper')
+    self.daemon = True
+    self.conn = conn
+    self.interval = interval
+    self.stopped = threading.Event()
+    self.lock = threading.Lock()
+    self.sweeps = 0
+    self.sweep_secs = 0.0
+    self.deleted = dict((table, 0) for table, _ in SWEPT_TABLES)
+
+  def run(self):
+    while not self.stopped.is_set():
+      try:
+        self.sweep()
+      except Exception:
+        logging.exception('Sweeping expired OAuth rows failed.')
+      self.stopped.wait(self.interval)
+
+  def stop(self):
+    self.stopped.set()
+
+  def sweep(self, now=None):
+    """Deletes all expired rows, in batches.
+
+    Args:
+      now: integer unix timestamp, defaults to now
+
+    Returns: integer, number of rows deleted
+    """
+    start = time.time()
+    if now is None:
+      now = int(start)
+
+    total = 0
+    for table, column in SWEPT_TABLES:
+      while not self.stopped.is_set():
+        deleted = self.conn.execute(
+          'DELETE FROM %(table)s WHERE rowid IN (SELECT rowid FROM %(table)s '
+          'WHERE %(column)s <= ? LIMIT ?)' % {'table': table, 'column': column},
+          (now, SWEEP_BATCH_SIZE)).rowcount
+        self.conn.commit()
+        total += deleted
+        with self.lock:
+          self.deleted[table] += deleted
+        if deleted < SWEEP_BATCH_SIZE:
+          break
+        time.sleep(SWEEP_BATCH_PAUSE)
+    elapsed = time.time() - start
+
+    with self.lock:
+      self.sweeps += 1
+      self.sweep_secs += elapsed
+    return total
+
+  def stats(self):
+    """Returns a dict of sweep statistics, including deletes per second.
+
+    Also counts the rows in each of SWEPT_TABLES. That's a full scan, so it's
+    done here, only when someone asks, not after every sweep.
+    """
+    rows = dict((table, self.conn.execute(
+          'SELECT COUNT(*) FROM %s' % table).fetchone()[0])
+                for table, _ in SWEPT_TABLES)
+    with self.lock:
+      deleted = sum(self.deleted.values())
+      per_sec = deleted / self.sweep_secs if self.sweep_secs else 0
+      return {'sweeps': self.sweeps,
+              'deleted': dict(self.deleted),
+              'deleted_per_sec': per_sec,
+              'rows': rows,
+              }
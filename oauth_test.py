@@ -8,6 +8,7 @@ import httplib
 import json
 import re
 import sqlite3
+import tempfile
 import threading
 import time
 import unittest
@@ -17,6 +18,7 @@ import urlparse
 import testutil
 
 import oauth
+import schemautil
 
 
 class OAuthHandlerTest(testutil.HandlerTest):
@@ -31,6 +33,10 @@ class OAuthHandlerTest(testutil.HandlerTest):
       'code': None  # filled in by individual tests
       }
 
+  def tearDown(self):
+    oauth.BaseHandler.signer = None
+    super(OAuthHandlerTest, self).tearDown()
+
   def expect_oauth_redirect(self, redirect_re='http://x/y\?code=(.+)',
                             args=None):
     """Requests an access code, checks the redirect, and returns the code.
@@ -116,6 +122,275 @@ class OAuthHandlerTest(testutil.HandlerTest):
       args={'response_type': 'token'})
     assert oauth.AccessTokenHandler.is_valid_token(self.conn, token)
 
+  def test_token_cache(self):
+    self.conn.execute(
+      'INSERT INTO oauth_access_tokens(code, token) VALUES("asdf", "qwert")')
+    self.conn.commit()
+    is_valid = oauth.AccessTokenHandler.is_valid_token
+    self.assertTrue(is_valid(self.conn, 'qwert'))
+    self.assertFalse(is_valid(self.conn, 'bad'))
+
+    # hot tokens don't touch SQLite
+    self.conn.execute('DELETE FROM oauth_access_tokens')
+    self.conn.execute(
+      'INSERT INTO oauth_access_tokens(code, token) VALUES("asdf", "bad")')
+    self.conn.commit()
+    self.assertTrue(is_valid(self.conn, 'qwert'))
+    self.assertFalse(is_valid(self.conn, 'bad'))
+
+    # until invalid results expire
+    oauth.BaseHandler.token_cache.put('bad', (False, time.time() - 1))
+    self.assertTrue(is_valid(self.conn, 'bad'))
+
+    # or valid tokens expire
+    oauth.BaseHandler.token_cache.put('qwert', (True, time.time() - 1))
+    self.assertFalse(is_valid(self.conn, 'qwert'))
+
+  def test_created_token_is_cached_valid(self):
+    token = self.expect_oauth_redirect(
+      'http://x/y#access_token=(.+)&expires_in=999999',
+      args={'response_type': 'token'})
+    valid, expires_at = oauth.BaseHandler.token_cache.get(token)
+    self.assertIs(True, valid)
+    self.assertEquals([(expires_at,)], self.conn.execute(
+        'SELECT expires_at FROM oauth_access_tokens WHERE token = ?',
+        (token,)).fetchall())
+    self.assertAlmostEqual(time.time() + int(oauth.EXPIRES), expires_at, delta=5)
+
+  def test_expired_token(self):
+    self.conn.executemany(
+      'INSERT INTO oauth_access_tokens(code, token, expires_at) VALUES("x", ?, ?)',
+      (('old', int(time.time()) - 1), ('new', int(time.time()) + 100)))
+    self.conn.commit()
+    self.assertFalse(oauth.AccessTokenHandler.is_valid_token(self.conn, 'old'))
+    self.assertTrue(oauth.AccessTokenHandler.is_valid_token(self.conn, 'new'))
+
+  def test_expired_auth_code(self):
+    code = self.expect_oauth_redirect()
+    self.conn.execute('UPDATE oauth_codes SET expires_at = ?',
+                      (int(time.time()) - 1,))
+    self.conn.commit()
+    self.access_token_args['code'] = code
+    resp = self.get_response('/oauth/access_token', args=self.access_token_args)
+    self.assertEquals('400 Bad Request', resp.status)
+    assert 'has expired' in resp.body, resp.body
+
+  def test_token_lookup_uses_index(self):
+    plan = self.conn.execute(
+      'EXPLAIN QUERY PLAN '
+      'SELECT expires_at FROM oauth_access_tokens WHERE token = ?',
+      ('x',)).fetchall()
+    self.assertIn('USING INDEX oauth_access_tokens_token', plan[0][-1])
+
+  def test_writes_use_group_committer(self):
+    committer = oauth.BaseHandler.committer
+    self.assertIs(self.conn, committer.conn)
+    self.assertEquals(0, committer.window)  # not threaded
+
+    self.expect_oauth_redirect('http://x/y#access_token=(.+)&expires_in=999999',
+                               args={'response_type': 'token'})
+    self.assertEquals({'commits': 2, 'writes': 2}, committer.stats())
+
+  def test_signed_tokens(self):
+    oauth.BaseHandler.signer = oauth.TokenSigner('secret')
+    token = self.expect_oauth_redirect(
+      'http://x/y#access_token=(.+)&expires_in=999999',
+      args={'response_type': 'token'})
+    self.assertIn(oauth.SIGNED_TOKEN_SEPARATOR, token)
+    self.assertEquals(
+      {'client_id': '123', 'user_id': unicode(self.ME)},
+      dict((key, val) for key, val in oauth.BaseHandler.signer.verify(token).items()
+           if key in ('client_id', 'user_id')))
+
+    # only the auth code is stored, and validating doesn't touch SQLite
+    self.assertEquals(0, self.conn.execute(
+        'SELECT COUNT(*) FROM oauth_access_tokens').fetchone()[0])
+    self.conn.execute('DROP TABLE oauth_access_tokens')
+    self.assertTrue(oauth.AccessTokenHandler.is_valid_token(self.conn, token))
+    self.assertFalse(oauth.AccessTokenHandler.is_valid_token(self.conn, token + 'x'))
+
+    # random tokens are still looked up in SQLite
+    self.assertRaises(sqlite3.OperationalError,
+                      oauth.AccessTokenHandler.is_valid_token, self.conn, 'xyz')
+
+  def test_revoke_token(self):
+    oauth.BaseHandler.signer = oauth.TokenSigner('secret')
+    signed = oauth.BaseHandler.signer.sign('123', '1')
+    self.conn.execute('INSERT INTO oauth_access_tokens(code, token, expires_at) '
+                      'VALUES("asdf", "qwert", 2000000000)')
+    self.conn.commit()
+
+    is_valid = oauth.AccessTokenHandler.is_valid_token
+    for token in signed, 'qwert':
+      self.assertTrue(is_valid(self.conn, token))
+      resp = self.app.get_response('/oauth/access_token?access_token=' + token,
+                                   method='DELETE')
+      self.assertEquals(200, resp.status_int)
+      self.assertEquals('true', resp.body)
+      self.assertFalse(is_valid(self.conn, token))
+
+    # signed tokens are stored, random ones are deleted
+    self.assertEquals(
+      [(signed, oauth.BaseHandler.signer.verify(signed)['expires'])],
+      self.conn.execute('SELECT token, expires FROM oauth_revoked_tokens'
+                        ).fetchall())
+    self.assertEquals(0, self.conn.execute(
+        'SELECT COUNT(*) FROM oauth_access_tokens').fetchone()[0])
+
+    # revocations of signed tokens by other processes are seen after
+    # REVOKED_TOKENS_TTL
+    other = oauth.BaseHandler.signer.sign('123', '2')
+    self.assertTrue(is_valid(self.conn, other))
+    self.conn.execute('INSERT INTO oauth_revoked_tokens(token) VALUES(?)',
+                      (other,))
+    self.conn.commit()
+    self.assertTrue(is_valid(self.conn, other))
+    oauth.BaseHandler.token_cache.put(other, (True, time.time() - 1))
+    self.assertFalse(is_valid(self.conn, other))
+
+  def test_revoke_unknown_token(self):
+    oauth.BaseHandler.signer = oauth.TokenSigner('secret')
+    forged = oauth.TokenSigner('other').sign('123', '1')
+    for token in forged, 'junk':
+      resp = self.app.get_response('/oauth/access_token?access_token=' + token,
+                                   method='DELETE')
+      self.assertEquals(400, resp.status_int)
+      assert 'Invalid access_token.' in resp.body, resp.body
+    self.assertEquals(0, self.conn.execute(
+        'SELECT COUNT(*) FROM oauth_revoked_tokens').fetchone()[0])
+
+  def test_random_tokens_skip_revocations(self):
+    oauth.BaseHandler.signer = oauth.TokenSigner('secret')
+    self.conn.execute('INSERT INTO oauth_access_tokens(code, token) '
+                      'VALUES("asdf", "qwert")')
+    self.conn.commit()
+    self.conn.execute('DROP TABLE oauth_revoked_tokens')
+    self.assertTrue(oauth.AccessTokenHandler.is_valid_token(self.conn, 'qwert'))
+
+    # nor do signed tokens that fail verification
+    forged = oauth.TokenSigner('other').sign('123', '1')
+    self.assertFalse(oauth.AccessTokenHandler.is_valid_token(self.conn, forged))
+    self.assertEquals(1, len(oauth.BaseHandler.token_cache))
+
+  def test_revoked_lookup_uses_primary_key(self):
+    plan = self.conn.execute(
+      'EXPLAIN QUERY PLAN SELECT 1 FROM oauth_revoked_tokens WHERE token = ?',
+      ('x',)).fetchall()
+    self.assertIn('USING COVERING INDEX sqlite_autoindex_oauth_revoked_tokens',
+                  plan[0][-1])
+
+  def test_revoke_token_missing_arg(self):
+    resp = self.app.get_response('/oauth/access_token', method='DELETE')
+    self.assertEquals(400, resp.status_int)
+    assert 'Missing access_token parameter.' in resp.body, resp.body
+
+
+class TokenSignerTest(unittest.TestCase):
+
+  def test_sign_and_verify(self):
+    signer = oauth.TokenSigner('secret')
+    token = signer.sign('123', '456', issued=1000)
+    expires = 1000 + int(oauth.EXPIRES)
+    self.assertEquals({'client_id': '123', 'user_id': '456', 'issued': 1000,
+                       'expires': expires},
+                      signer.verify(token, now=expires - 1))
+    self.assertIsNone(signer.verify(token, now=expires))
+    self.assertEquals(signer.verify(token, now=2000),
+                      signer.verify(unicode(token), now=2000))
+
+  def test_forged_and_malformed(self):
+    signer = oauth.TokenSigner('secret')
+    token = signer.sign('123', '456')
+    payload, signature = token.split('.')
+    forged = oauth.b64encode(json.dumps(['123', '789', 0, 2 ** 40]))
+
+    for bad in (oauth.TokenSigner('other').sign('123', '456'),
+                forged + '.' + signature, payload + '.' + signature[:-2],
+                payload, token + '.x', '', u'\u2603.x', 'a.b'):
+      self.assertIsNone(signer.verify(bad), bad)
+
+
+class SweeperTest(unittest.TestCase):
+
+  def setUp(self):
+    super(SweeperTest, self).setUp()
+    self.conn = schemautil.get_db(':memory:')
+    self.sweeper = oauth.Sweeper(self.conn)
+    self.orig_batch_size = oauth.SWEEP_BATCH_SIZE
+    oauth.SWEEP_BATCH_SIZE = 3
+
+  def tearDown(self):
+    oauth.SWEEP_BATCH_SIZE = self.orig_batch_size
+    super(SweeperTest, self).tearDown()
+
+  def count(self, table):
+    return self.conn.execute('SELECT COUNT(*) FROM %s' % table).fetchone()[0]
+
+  def test_sweep(self):
+    # 7 expired tokens, 2 that haven't expired, and 1 that never does
+    self.conn.executemany(
+      'INSERT INTO oauth_access_tokens(code, token, expires_at) VALUES("x", ?, ?)',
+      [(str(i), 1000 + i) for i in range(9)] + [('forever', None)])
+    self.conn.executemany(
+      'INSERT INTO oauth_codes(code, client_id, redirect_uri, expires_at) '
+      'VALUES(?, "x", "y", ?)', (('old', 1000), ('new', 2000)))
+    self.conn.execute(
+      'INSERT INTO oauth_revoked_tokens(token, expires) VALUES("1", 1001)')
+    self.conn.commit()
+
+    self.assertEquals(9, self.sweeper.sweep(now=1006))
+    self.assertEquals(['7', '8', 'forever'], [row[0] for row in self.conn.execute(
+        'SELECT token FROM oauth_access_tokens ORDER BY token')])
+    self.assertEquals(1, self.count('oauth_codes'))
+    self.assertEquals(0, self.count('oauth_revoked_tokens'))
+
+    stats = self.sweeper.stats()
+    self.assertEquals(1, stats['sweeps'])
+    self.assertEquals({'oauth_codes': 1, 'oauth_access_tokens': 7,
+                       'oauth_revoked_tokens': 1}, stats['deleted'])
+    self.assertEquals({'oauth_codes': 1, 'oauth_access_tokens': 3,
+                       'oauth_revoked_tokens': 0}, stats['rows'])
+    self.assertGreater(stats['deleted_per_sec'], 0)
+
+    # rows are counted when stats() is called, not by each sweep
+    self.conn.execute(
+      'INSERT INTO oauth_revoked_tokens(token, expires) VALUES("2", 2000)')
+    self.conn.commit()
+    self.assertEquals(1, self.sweeper.stats()['rows']['oauth_revoked_tokens'])
+
+    self.assertEquals(0, self.sweeper.sweep(now=1006))
+    self.assertEquals(2, self.sweeper.stats()['sweeps'])
+
+  def test_sweep_uses_index(self):
+    for table, column in oauth.SWEPT_TABLES:
+      plan = self.conn.execute(
+        'EXPLAIN QUERY PLAN SELECT rowid FROM %s WHERE %s <= ? LIMIT ?' %
+        (table, column), (0, 1)).fetchall()
+      self.assertIn('USING COVERING INDEX %s_%s' % (table, column), plan[0][-1])
+
+  def test_thread(self):
+    filename = tempfile.mktemp(prefix='mockfacebook_test.')
+    try:
+      conn = schemautil.get_db(filename)
+      conn.execute('INSERT INTO oauth_access_tokens(code, token, expires_at) '
+                   'VALUES("x", "y", 1000)')
+      conn.commit()
+
+      sweeper = oauth.Sweeper(schemautil.ThreadLocalConnection(filename),
+                              interval=0.01)
+      sweeper.start()
+      for i in range(100):
+        if sweeper.stats()['sweeps']:
+          break
+        time.sleep(0.01)
+      sweeper.stop()
+      sweeper.join()
+      self.assertFalse(sweeper.is_alive())
+      self.assertEquals(0, conn.execute(
+          'SELECT COUNT(*) FROM oauth_access_tokens').fetchone()[0])
+    finally:
+      testutil.remove_db(filename)
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,296 @@
+"""Persistent store for the objects and connection elements posted to the
+Graph API.
+"""
+
+__author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
+
+import collections
+import json
+import logging
+import sqlite3
+import threading
+
+import cache
+import schemautil
+
+# number of newest elements of each connection to keep in memory.
+RECENT_ITEMS = 100
+
+# number of connections to keep newest elements in memory for.
+RECENT_CONNECTIONS = 1000
+
+
+class PostedStore(object):
+  """Stores posted objects and connection elements in the posted_graph_objects
+  and posted_graph_connections tables.
+
+  put_object() and add_element() stage writes, and commit() commits everything
+  staged in a single transaction via a schemautil.GroupCommitter. It doesn't
+  return until the transaction is durable, so call it before responding.
+  Staged writes aren't visible, even in this process. Callers serialize
+  staging and committing, e.g. GraphHandler.posted_lock, so that one caller
+  doesn't commit another's half finished writes.
+
+  The newest RECENT_ITEMS committed elements of the RECENT_CONNECTIONS most
+  recently used connections that were posted to in this process are also kept
+  in memory, newest first, so that reading the first page of a connection
+  doesn't touch SQLite. Older elements, and the elements of evicted
+  connections, are read newest first from the (id, connection, seq) index, so
+  a page costs O(page size) either way. Only committed elements are kept in
+  memory, so evicting them is always safe.
+
+  Elements are kept in memory as JSON, like in SQLite, and decoded on the way
+  out, so callers can modify them. Thread safe as long as conn is.
+
+  Attributes:
+    conn: sqlite3.Connection
+    committer: schemautil.GroupCommitter
+    lock: threading.RLock that guards the in-memory state
+    staged: list of (SQL statement, parameters) tuples to commit
+    staged_elements: list of (id or alias, connection, (seq, unix timestamp or
+      None, element JSON)) tuples to add to recent once they're committed
+    recent: cache.LruCache mapping (id or alias, connection) to
+      collections.deque of (seq, unix timestamp or None, element JSON) tuples,
+      newest first
+    next_seq: integer, the seq of the next posted element
+    has_data: boolean, whether anything has been posted, or None if unknown
+  """
+
+  def __init__(self, conn):
+    """Args:
+      conn: sqlite3.Connection
+    """
+    self.conn = conn
+    self.committer = schemautil.GroupCommitter(conn)
+    self.lock = threading.RLock()
+    self.staged = []
+    self.staged_elements = []
+    self.recent = cache.LruCache(RECENT_CONNECTIONS)
+    self.has_data = None
+    max_seq = conn.execute(
+      'SELECT MAX(seq) FROM posted_graph_connections').fetchone()[0]
+    self.next_seq = (max_seq or 0) + 1
+
+  def reset(self):
+    """Forgets whether anything has been posted, e.g. after another process
+    changes the database.
+    """
+    with self.lock:
+      self.has_data = None
+
+  def is_empty(self):
+    """Returns True if nothing has been posted. Usually doesn't query SQLite.
+    """
+    with self.lock:
+      if self.has_data is None:
+        self.has_data = bool(self.conn.execute(
+            'SELECT EXISTS (SELECT 1 FROM posted_graph_objects) OR '
+            'EXISTS (SELECT 1 FROM posted_graph_connections)').fetchone()[0])
+      return not self.has_data
+
+  def object_ids(self, ids):
+    """Returns the subset of ids that have posted objects.
+
+    Args:
+      ids: sequence of string ids or aliases
+    """
+    if self.is_empty():
+      return set()
+
+    return set(row[0] for row in schemautil.execute_chunked(
+        self.conn, 'SELECT id FROM posted_graph_objects WHERE id IN (%s)',
+        set(ids)))
+
+  def get_objects(self, ids):
+    """Returns copies of the posted objects with the given ids.
+
+    Args:
+      ids: sequence of string ids or aliases
+
+    Returns: dict mapping id to decoded object
+    """
+    if self.is_empty():
+      return {}
+
+    rows = schemautil.execute_chunked(
+      self.conn, 'SELECT id, data FROM posted_graph_objects WHERE id IN (%s)',
+      set(ids))
+    return dict((id, json.loads(data)) for id, data in rows)
+
+  def put_object(self, id, object):
+    """Stages a posted object, replacing any existing one with the same id.
+
+    Args:
+      id: string id or alias
+      object: JSON-serializable dict
+    """
+    with self.lock:
+      self.staged.append(('INSERT OR REPLACE INTO posted_graph_objects '
+                          '(id, data) VALUES (?, ?)', (id, json.dumps(object))))
+
+  def has_connections(self, names):
+    """Returns True if any elements have been posted to any of the names.
+
+    Args:
+      names: sequence of string ids or aliases
+    """
+    if self.is_empty():
+      return False
+
+    return bool(schemautil.execute_chunked(
+        self.conn, 'SELECT 1 FROM posted_graph_connections WHERE id IN (%s) '
+        'LIMIT 1', names))
+
+  def add_element(self, name, connection, element):
+    """Stages a posted element for the front of a connection.
+
+    Args:
+      name: string id or alias
+      connection: string
+      element: JSON-serializable dict
+    """
+    timestamp = schemautil.graph_timestamp(element)
+    data = json.dumps(element)
+    with self.lock:
+      seq = self.next_seq
+      self.next_seq += 1
+      self.staged.append(('INSERT INTO posted_graph_connections '
+                          '(seq, id, connection, data, created_time) '
+                          'VALUES (?, ?, ?, ?, ?)',
+                          (seq, name, connection, data, timestamp)))
+      self.staged_elements.append((name, connection, (seq, timestamp, data)))
+
+  def elements(self, name, connection, limit=None, offset=0, since=None,
+               until=None, min_seq=None, max_seq=None, newest_first=True):
+    """Returns copies of the elements posted to a connection.
+
+    Args:
+      name: string id or alias
+      connection: string
+      limit: integer, maximum number of elements to return, or None for all
+      offset: integer, number of matching elements to skip. Only supported
+        with newest_first.
+      since: integer unix timestamp, only return elements created at or after
+      until: integer unix timestamp, only return elements created at or before
+      min_seq: integer, only return elements with greater seqs
+      max_seq: integer, only return elements with lesser seqs
+      newest_first: boolean, the order to return elements in
+
+    Returns: list of (integer seq, decoded element) tuples
+    """
+    assert newest_first or not offset
+    if self.is_empty() or limit == 0:
+      return []
+
+    recent, where, params = self.filter(name, connection, since, until,
+                                        min_seq, max_seq)
+    query = ('SELECT seq, data FROM posted_graph_connections WHERE %s '
+             'ORDER BY seq %s LIMIT ? OFFSET ?' %
+             (where, 'DESC' if newest_first else 'ASC'))
+
+    def select(limit, offset):
+      # LIMIT -1 means no limit
+      return self.conn.execute(query, params + [
+          -1 if limit is None else limit, offset]).fetchall()
+
+    if newest_first:
+      found = recent[offset:] if limit is None else recent[offset:offset + limit]
+      if limit is None or len(found) < limit:
+        found += select(None if limit is None else limit - len(found),
+                        max(0, offset - len(recent)))
+    else:
+      found = select(limit, 0)
+      if limit is None or len(found) < limit:
+        found += recent[::-1][:None if limit is None else limit - len(found)]
+
+    return [(seq, json.loads(data)) for seq, data in found]
+
+  def count(self, name, connection, since=None, until=None, min_seq=None,
+            max_seq=None):
+    """Returns the number of matching elements. Args are the same as elements().
+    """
+    if self.is_empty():
+      return 0
+
+    recent, where, params = self.filter(name, connection, since, until,
+                                        min_seq, max_seq)
+    return len(recent) + self.conn.execute(
+      'SELECT COUNT(*) FROM posted_graph_connections WHERE %s' % where,
+      params).fetchone()[0]
+
+  def filter(self, name, connection, since, until, min_seq, max_seq):
+    """Filters the in-memory elements and builds the SQL for the rest.
+
+    Args are the same as elements().
+
+    Returns: (list of (seq, element JSON) tuples of the matching in-memory
+      elements, newest first, string SQL WHERE clause for the older ones, list of its
+      parameters) tuple
+    """
+    def matches(seq, timestamp):
+      return ((since is None or (timestamp is not None and timestamp >= since)) and
+              (until is None or (timestamp is not None and timestamp <= until)) and
+              (min_seq is None or seq > min_seq) and
+              (max_seq is None or seq < max_seq))
+
+    with self.lock:
+      elements = list(self.recent.get((name, connection), ()))
+    recent = [(seq, data) for seq, timestamp, data in elements
+              if matches(seq, timestamp)]
+
+    # the in-memory elements are the newest committed ones
+    conditions = (('created_time >= ?', since), ('created_time <= ?', until),
+                  ('seq > ?', min_seq), ('seq < ?', max_seq),
+                  ('seq < ?', elements[-1][0] if elements else None))
+    where = ' AND '.join(['id = ?', 'connection = ?'] +
+                         [cond for cond, val in conditions if val is not None])
+    params = [name, connection] + [val for cond, val in conditions
+                                   if val is not None]
+    return recent, where, params
+
+  def commit(self):
+    """Commits the staged writes in a single transaction.
+
+    If it fails, they're rolled back and dropped, so later commits don't
+    retry them.
+
+    Raises: sqlite3.Error
+    """
+    with self.lock:
+      staged, self.staged = self.staged, []
+      elements, self.staged_elements = self.staged_elements, []
+    if not staged:
+      return
+
+    try:
+      self.committer.write_all(staged)
+    except sqlite3.Error:
+      logging.exception('Dropping %d posted writes that failed to commit.',
+                        len(staged))
+      raise
+
+    with self.lock:
+      self.has_data = True
+      for name, connection, element in elements:
+        recent = self.recent.get((name, connection))
+        if recent is None:
+          recent = collections.deque(maxlen=RECENT_ITEMS)
+          self.recent.put((name, connection), recent)
+        recent.appendleft(element)
+
+  def discard(self):
+    """Drops the staged writes, e.g. when a POST fails partway through.
+    """
+    with self.lock:
+      self.staged = []
+      self.staged_elements = []
+
+  def clear(self):
+    """Deletes all posted objects and elements, including staged ones.
+    """
+    with self.lock:
+      self.discard()
+      self.recent.clear()
+      self.committer.write_all([('DELETE FROM posted_graph_objects', ()),
+                                ('DELETE FROM posted_graph_connections', ())])
+      self.has_data = False
@@ -0,0 +1,201 @@
+#!/usr/bin/python
+"""Unit tests for posted.py.
+"""
+
+__author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
+
+import sqlite3
+import tempfile
+import unittest
+
+import posted
+import schemautil
+import testutil
+
+
+class PostedStoreTest(unittest.TestCase):
+
+  def setUp(self):
+    super(PostedStoreTest, self).setUp()
+    self.filename = tempfile.mktemp(prefix='mockfacebook_test.')
+    self.conn = schemautil.get_db(self.filename)
+    self.store = posted.PostedStore(self.conn)
+
+  def tearDown(self):
+    testutil.remove_db(self.filename)
+    super(PostedStoreTest, self).tearDown()
+
+  def committed(self, table):
+    """Returns the number of committed rows in a table, via a new connection."""
+    other = schemautil.connect(self.filename)
+    try:
+      return other.execute('SELECT COUNT(*) FROM %s' % table).fetchone()[0]
+    finally:
+      other.close()
+
+  def add(self, count, name='1', connection='feed'):
+    for i in range(count):
+      self.store.add_element(name, connection, {'i': i})
+    self.store.commit()
+
+  def indices(self, elements):
+    return [elem['i'] for seq, elem in elements]
+
+  def test_objects(self):
+    self.assertTrue(self.store.is_empty())
+    self.assertEquals({}, self.store.get_objects(['1']))
+
+    obj = {'id': '1', 'x': [1]}
+    self.store.put_object('1', obj)
+    obj['x'].append(2)  # the store has its own copy
+    self.store.commit()
+    self.assertFalse(self.store.is_empty())
+    self.assertEquals(set(['1']), self.store.object_ids(['1', '2']))
+    self.assertEquals({'1': {'id': '1', 'x': [1]}},
+                      self.store.get_objects(['1', '2']))
+
+    self.store.put_object('2', {'id': '2'})
+    self.store.commit()
+    self.assertEquals({'1': {'id': '1', 'x': [1]}, '2': {'id': '2'}},
+                      self.store.get_objects(['1', '2', '3']))
+
+  def test_elements_newest_first(self):
+    self.add(5)
+    self.assertEquals([4, 3, 2, 1, 0], self.indices(self.store.elements('1', 'feed')))
+    self.assertEquals([3, 2], self.indices(
+        self.store.elements('1', 'feed', limit=2, offset=1)))
+    self.assertEquals([0, 1], self.indices(
+        self.store.elements('1', 'feed', limit=2, newest_first=False)))
+    self.assertEquals([], self.store.elements('1', 'posts'))
+    self.assertEquals([], self.store.elements('2', 'feed'))
+    self.assertTrue(self.store.has_connections(['2', '1']))
+    self.assertFalse(self.store.has_connections(['2']))
+
+  def test_elements_older_than_recent(self):
+    # the oldest elements are evicted from memory and read from SQLite
+    total = posted.RECENT_ITEMS + 10
+    self.add(total)
+    self.assertEquals(range(total)[::-1],
+                      self.indices(self.store.elements('1', 'feed')))
+    self.assertEquals([total - 99, total - 100, total - 101], self.indices(
+        self.store.elements('1', 'feed', limit=3, offset=98)))
+    self.assertEquals(range(total), self.indices(
+        self.store.elements('1', 'feed', newest_first=False)))
+    self.assertEquals(total, self.store.count('1', 'feed'))
+    self.assertEquals(5, self.store.count('1', 'feed', max_seq=6))
+
+    # a new store, e.g. after a restart, reads them all from SQLite
+    store = posted.PostedStore(self.conn)
+    self.assertEquals([total - 1, total - 2], self.indices(
+        store.elements('1', 'feed', limit=2)))
+    self.assertEquals(total + 1, store.next_seq)
+
+  def test_recent_connections_bounded(self):
+    orig = posted.RECENT_CONNECTIONS
+    posted.RECENT_CONNECTIONS = 2
+    try:
+      self.store = posted.PostedStore(self.conn)
+      for name in '1', '2', '3':
+        self.add(3, name=name)
+    finally:
+      posted.RECENT_CONNECTIONS = orig
+
+    self.assertEquals(2, len(self.store.recent))
+    self.assertNotIn(('1', 'feed'), self.store.recent)
+    # evicted elements are read from SQLite
+    for name in '1', '2', '3':
+      self.assertEquals([2, 1, 0],
+                        self.indices(self.store.elements(name, 'feed')))
+
+    # new elements for an evicted connection go in front of the committed ones
+    self.add(1, name='1')
+    self.assertEquals([0, 2, 1, 0],
+                      self.indices(self.store.elements('1', 'feed')))
+    self.assertEquals([1, 0], self.indices(
+        self.store.elements('1', 'feed', limit=2, offset=2)))
+
+  def test_elements_filters(self):
+    for i, time in enumerate(['1970-01-01T00:16:40+0000', None,
+                              '1970-01-01T00:16:42+0000']):
+      elem = {'i': i}
+      if time:
+        elem['created_time'] = time
+      self.store.add_element('1', 'feed', elem)
+    self.store.commit()
+
+    for store in self.store, None:
+      if store is None:
+        # now check the same filters in SQL
+        store = posted.PostedStore(self.conn)
+      self.assertEquals([2, 0], self.indices(store.elements('1', 'feed', since=1000)))
+      self.assertEquals([0], self.indices(store.elements('1', 'feed', until=1001)))
+      self.assertEquals([1], self.indices(
+          store.elements('1', 'feed', min_seq=1, max_seq=3)))
+      self.assertEquals(1, store.count('1', 'feed', since=1001))
+
+  def test_commit(self):
+    # staged writes aren't visible until they're committed
+    self.store.put_object('1', {'id': '1'})
+    self.store.add_element('1', 'feed', {'i': 0})
+    self.assertEquals(0, self.committed('posted_graph_objects'))
+    self.assertEquals([], self.store.elements('1', 'feed'))
+
+    # commit() doesn't return until they're durable
+    self.store.commit()
+    self.assertEquals(1, self.committed('posted_graph_objects'))
+    self.assertEquals(1, self.committed('posted_graph_connections'))
+    self.assertEquals([0], self.indices(self.store.elements('1', 'feed')))
+    self.assertEquals([], self.store.staged)
+
+  def test_discard(self):
+    self.store.put_object('1', {'id': '1'})
+    self.store.add_element('1', 'feed', {'i': 0})
+    self.store.discard()
+    self.store.commit()
+    self.assertEquals(0, self.committed('posted_graph_objects'))
+    self.assertEquals([], self.store.elements('1', 'feed'))
+
+  def test_failed_commit(self):
+    self.add(1)
+    # reusing a seq violates the primary key
+    self.store.next_seq = 1
+    self.store.put_object('1', {'id': '1'})
+    self.store.add_element('1', 'feed', {'i': 1})
+    self.assertRaises(sqlite3.IntegrityError, self.store.commit)
+
+    # the whole batch was rolled back and dropped
+    self.assertEquals(0, self.committed('posted_graph_objects'))
+    self.assertEquals([0], self.indices(self.store.elements('1', 'feed')))
+    self.assertEquals([], self.store.staged)
+
+    # and later commits work
+    self.store.next_seq = 2
+    self.add(1)
+    self.assertEquals([0, 0], self.indices(self.store.elements('1', 'feed')))
+    self.assertEquals(2, self.committed('posted_graph_connections'))
+
+  def test_clear(self):
+    self.store.put_object('1', {'id': '1'})
+    self.add(3)
+    self.store.add_element('1', 'feed', {'i': 3})
+    self.store.clear()
+    self.store.commit()
+    self.assertTrue(self.store.is_empty())
+    self.assertEquals([], self.store.elements('1', 'feed'))
+    self.assertEquals({}, self.store.get_objects(['1']))
+    self.assertEquals(0, self.committed('posted_graph_objects'))
+    self.assertEquals(0, self.committed('posted_graph_connections'))
+
+  def test_reset(self):
+    self.assertTrue(self.store.is_empty())
+    other = schemautil.connect(self.filename)
+    other.execute('INSERT INTO posted_graph_objects VALUES ("1", "{}")')
+    other.commit()
+    other.close()
+    self.assertTrue(self.store.is_empty())  # still cached
+    self.store.reset()
+    self.assertFalse(self.store.is_empty())
+
+
+if __name__ == '__main__':
+  unittest.main()
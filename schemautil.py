@@ -4,13 +4,23 @@
 __author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
 
 import collections
+import calendar
 import copy
+import cPickle
 import datetime
+import hashlib
 import json
+import json.scanner
+import logging
 import os
 import pprint
 import re
 import sqlite3
+import threading
+import time
+import zlib
+
+import cache
 
 def thisdir(filename):
   return os.path.join(os.path.dirname(__file__), filename)
@@ -39,21 +49,481 @@ ALIAS_FIELD = 'username'
 
 DEFAULT_DB_FILE = thisdir('mockfacebook.db')
 
-def get_db(filename):
+# how many compiled statements each SQLite connection caches. sqlite3's default
+# is 100.
+DEFAULT_STATEMENT_CACHE_SIZE = 100
+
+# how many rows to fetch from a SQLite cursor at a time when converting to JSON.
+FETCH_BATCH_SIZE = 500
+
+# maximum number of row decoders to cache per schema. there's one for each
+# distinct (table, result columns) combination.
+ROW_DECODER_CACHE_SIZE = 1000
+
+# maximum number of values to bind in a single IN (...) clause. SQLite limits
+# queries to 999 bound parameters by default (SQLITE_MAX_VARIABLE_NUMBER), and
+# some queries, e.g. the Graph API id and alias lookup, bind them twice.
+MAX_IN_VALUES = 400
+
+# seconds until auth codes and access tokens that predate their expires_at
+# columns expire. same as oauth.EXPIRES.
+MIGRATED_OAUTH_LIFETIME = 999999
+
+# PRAGMA synchronous levels. in WAL mode, FULL syncs the log on every commit,
+# so committed transactions survive power loss, and NORMAL only syncs at
+# checkpoints, so they survive process crashes but maybe not power loss.
+# https://www.sqlite.org/pragma.html#pragma_synchronous
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL')
+DEFAULT_SYNCHRONOUS = 'FULL'
+
+def connect(filename, read_only=False,
+            cached_statements=DEFAULT_STATEMENT_CACHE_SIZE,
+            synchronous=DEFAULT_SYNCHRONOUS):
+  """Returns a SQLite db connection to the given file.
+
+  Args:
+    filename: the SQLite database file
+    read_only: boolean, whether to reject writes on this connection
+    cached_statements: integer, size of the compiled statement cache
+    synchronous: string, one of SYNCHRONOUS_LEVELS
+  """
+  assert synchronous in SYNCHRONOUS_LEVELS, synchronous
+  conn = sqlite3.connect(filename, cached_statements=cached_statements)
+  # pragmas don't support parameters
+  conn.execute('PRAGMA synchronous = %s' % synchronous)
+  if read_only:
+    conn.execute('PRAGMA query_only = ON')
+  return conn
+
+
+def get_db(filename, cached_statements=DEFAULT_STATEMENT_CACHE_SIZE,
+           synchronous=DEFAULT_SYNCHRONOUS):
   """Returns a SQLite db connection to the given file.
 
   Also creates the mockfacebook and FQL schemas if they don't already exist.
+  The database's user_version is stamped with a checksum of the schema files,
+  so this is skipped when they haven't changed since it was last done.
+
+  Switches the database to WAL mode, so that readers don't block the writer
+  and commits only sync the log. That's persistent, so other connections to
+  the file use it too.
 
   Args:
     filename: the SQLite database file
+    cached_statements: integer, size of the compiled statement cache
+    synchronous: string, one of SYNCHRONOUS_LEVELS
   """
-  conn = sqlite3.connect(filename)
+  conn = connect(filename, cached_statements=cached_statements,
+                 synchronous=synchronous)
+
+  if filename != ':memory:':
+    try:
+      conn.execute('PRAGMA journal_mode = WAL')
+    except sqlite3.OperationalError, e:
+      # e.g. another connection is in the middle of a transaction
+      logging.warning("Couldn't switch %s to WAL mode: %s", filename, e)
+
+  ddl = []
   for schema in MOCKFACEBOOK_SCHEMA_SQL_FILE, FQL_SCHEMA_SQL_FILE:
     with open(schema) as f:
-      conn.executescript(f.read())
+      ddl.append(f.read())
+  # user_version is a signed 32 bit int, and 0 means it was never set
+  version = (zlib.crc32(''.join(ddl)) & 0x7fffffff) or 1
+
+  if conn.execute('PRAGMA user_version').fetchone()[0] != version:
+    migrate_fql_tables(conn)
+    migrate_graph_tables(conn)
+    migrate_oauth_tables(conn)
+    for script in ddl:
+      conn.executescript(script)
+    # pragmas don't support parameters
+    conn.execute('PRAGMA user_version = %d' % version)
+
   return conn
 
 
+def has_json1(conn):
+  """Returns True if SQLite has the JSON1 functions, e.g. json_each().
+
+  Args:
+    conn: sqlite3.Connection
+  """
+  try:
+    conn.execute("SELECT * FROM json_each('{}')").fetchall()
+    return True
+  except sqlite3.OperationalError:
+    return False
+
+
+def execute_chunked(conn, query, values, *args):
+  """Runs a query for each chunk of up to MAX_IN_VALUES values.
+
+  Args:
+    conn: sqlite3.Connection
+    query: string SQL query. Each %s is replaced with a question mark per
+      value in the chunk, and the chunk is bound to each of them.
+    values: sequence of values
+    args: values to bind after the chunk(s)
+
+  Returns: list of result rows from all chunks
+  """
+  values = list(values)
+  repeat = query.count('%s')
+  rows = []
+  for i in xrange(0, len(values), MAX_IN_VALUES):
+    chunk = values[i:i + MAX_IN_VALUES]
+    qmarks = ','.join('?' * len(chunk))
+    rows += conn.execute(query % ((qmarks,) * repeat),
+                         chunk * repeat + list(args)).fetchall()
+  return rows
+
+
+def migrate_fql_tables(conn):
+  """Rebuilds FQL tables created before they had a _row_hash column.
+
+  Those tables have a UNIQUE constraint across every column instead, which
+  can't be dropped in place, so they're copied into new tables.
+
+  Args:
+    conn: sqlite3.Connection
+  """
+  old_tables = [row[0] for row in conn.execute("""
+SELECT name FROM sqlite_master
+WHERE type = 'table' AND sql LIKE '%UNIQUE (%' AND sql NOT LIKE '%_row_hash%'
+""")]
+  if not old_tables:
+    return
+
+  schema = FqlSchema.read()
+  conn.create_function('row_hash', -1, lambda *values: row_hash(values))
+  for table in old_tables:
+    cols = schema.tables.get(table)
+    if not cols:
+      continue
+
+    old_cols = set(row[1] for row in conn.execute(
+        'PRAGMA table_info(`%s`)' % table))
+    names = ', '.join(c.name for c in cols)
+    values = ', '.join(c.name if c.name in old_cols else 'NULL' for c in cols)
+    conn.executescript("""
+BEGIN TRANSACTION;
+ALTER TABLE `%(table)s` RENAME TO `_old_%(table)s`;
+%(create)s
+INSERT OR IGNORE INTO `%(table)s` (%(names)s, _row_hash)
+  SELECT %(values)s, row_hash(%(values)s) FROM `_old_%(table)s`;
+DROP TABLE `_old_%(table)s`;
+COMMIT;
+""" % {'table': table, 'create': schema.table_to_sql(table), 'names': names,
+       'values': values})
+    logging.info('Migrated FQL table %s to _row_hash.', table)
+
+
+def migrate_graph_tables(conn):
+  """Clears duplicate graph_objects aliases, so that the unique index on
+  graph_objects.alias can be created, and adds the ordinal and created_time
+  columns to an old graph_connections.
+
+  Of the objects that share an alias, the first one inserted keeps it, and
+  the others' aliases are set to NULL. Existing connection rows get their
+  rowids as ordinals, which preserves the order they were inserted in.
+
+  Args:
+    conn: sqlite3.Connection
+  """
+  names = set(row[0] for row in conn.execute(
+      "SELECT name FROM sqlite_master WHERE tbl_name = 'graph_objects'"))
+  if 'graph_objects' in names and 'graph_objects_alias' not in names:
+    cleared = conn.execute("""
+UPDATE graph_objects SET alias = NULL WHERE alias IS NOT NULL AND rowid NOT IN
+  (SELECT MIN(rowid) FROM graph_objects WHERE alias IS NOT NULL GROUP BY alias)
+""").rowcount
+    conn.commit()
+    if cleared:
+      logging.info('Cleared %d duplicate graph object aliases.', cleared)
+
+  cols = set(row[1] for row in conn.execute(
+      'PRAGMA table_info(graph_connections)'))
+  if not cols or 'ordinal' in cols:
+    return
+
+  conn.create_function('graph_timestamp', 1,
+                       lambda data: graph_timestamp(json.loads(data)))
+  conn.executescript("""
+BEGIN TRANSACTION;
+ALTER TABLE graph_connections ADD COLUMN ordinal INTEGER;
+ALTER TABLE graph_connections ADD COLUMN created_time INTEGER;
+UPDATE graph_connections SET ordinal = rowid, created_time = graph_timestamp(data);
+COMMIT;
+""")
+  logging.info('Added ordinal and created_time to graph_connections.')
+
+
+def migrate_oauth_tables(conn):
+  """Deletes duplicate access tokens, so that the unique index on
+  oauth_access_tokens.token can be created, and adds the expires_at columns.
+
+  download.py used to insert its access token again on every run. Existing
+  auth codes and access tokens get MIGRATED_OAUTH_LIFETIME seconds from now.
+
+  Random access tokens used to be revoked by storing them in
+  oauth_revoked_tokens. They're deleted from oauth_access_tokens instead now.
+
+  Args:
+    conn: sqlite3.Connection
+  """
+  names = set(row[0] for row in conn.execute(
+      "SELECT name FROM sqlite_master WHERE tbl_name = 'oauth_access_tokens'"))
+  if 'oauth_access_tokens' in names and 'oauth_access_tokens_token' not in names:
+    deleted = conn.execute(
+      'DELETE FROM oauth_access_tokens WHERE rowid NOT IN '
+      '(SELECT MIN(rowid) FROM oauth_access_tokens GROUP BY token)').rowcount
+    conn.commit()
+    if deleted:
+      logging.info('Deleted %d duplicate access tokens.', deleted)
+
+  for table in 'oauth_codes', 'oauth_access_tokens':
+    cols = set(row[1] for row in conn.execute('PRAGMA table_info(%s)' % table))
+    if not cols or 'expires_at' in cols:
+      continue
+    conn.executescript("""
+BEGIN TRANSACTION;
+ALTER TABLE %(table)s ADD COLUMN expires_at INTEGER;
+UPDATE %(table)s SET expires_at = %(expires_at)d;
+COMMIT;
+""" % {'table': table,
+       'expires_at': int(time.time()) + MIGRATED_OAUTH_LIFETIME})
+    logging.info('Added expires_at to %s.', table)
+
+  if not conn.execute("SELECT 1 FROM sqlite_master "
+                      "WHERE name = 'oauth_revoked_tokens'").fetchone():
+    return
+  # signed access tokens always contain a '.', and random ones never do
+  random = "FROM oauth_revoked_tokens WHERE instr(token, '.') = 0"
+  if conn.execute('SELECT 1 %s LIMIT 1' % random).fetchone():
+    conn.execute('DELETE FROM oauth_access_tokens WHERE token IN '
+                 '(SELECT token %s)' % random)
+    deleted = conn.execute('DELETE %s' % random).rowcount
+    conn.commit()
+    logging.info('Deleted %d revoked random access tokens.', deleted)
+
+
+# matches ISO 8601 dates and times, optionally with a UTC offset.
+TIMESTAMP_RE = re.compile(r'^(\d{4}-\d\d-\d\d)(?:T(\d\d:\d\d:\d\d))?'
+                          r'(?:([+-])(\d\d):?(\d\d)|Z)?$')
+
+
+def parse_timestamp(value):
+  """Converts a unix timestamp or ISO 8601 date/time string to a timestamp.
+
+  Handles the formats Facebook uses, e.g. 1334000000, '2012-04-09',
+  '2012-04-09T19:33:20+0000'.
+
+  Args:
+    value: integer or string
+
+  Returns: integer unix timestamp
+
+  Raises: ValueError
+  """
+  if isinstance(value, (int, long)):
+    return value
+  value = value.strip()
+  if value.isdigit():
+    return int(value)
+
+  match = TIMESTAMP_RE.match(value)
+  if not match:
+    raise ValueError('Unrecognized timestamp: %r' % value)
+  date, clock, sign, hours, minutes = match.groups()
+  timestamp = calendar.timegm(time.strptime(
+      '%sT%s' % (date, clock or '00:00:00'), '%Y-%m-%dT%H:%M:%S'))
+  if sign:
+    offset = (int(hours) * 60 + int(minutes)) * 60
+    timestamp += -offset if sign == '+' else offset
+  return timestamp
+
+def graph_timestamp(object):
+  """Returns a Graph API object's created_time as a unix timestamp.
+
+  Falls back to updated_time. Returns None if the object has neither, or if
+  it's not a dict, e.g. a picture URL.
+
+  Args:
+    object: decoded JSON Graph API object
+  """
+  if not isinstance(object, dict):
+    return None
+  for field in 'created_time', 'updated_time':
+    value = object.get(field)
+    if value is not None:
+      try:
+        return parse_timestamp(value)
+      except (ValueError, AttributeError):
+        pass
+  return None
+
+
+class ThreadLocalConnection(object):
+  """Opens and holds a separate SQLite connection for each thread.
+
+  sqlite3.Connection objects can't be shared across threads, so multithreaded
+  servers give the request handlers one of these instead. Attribute access is
+  delegated to the current thread's connection, which is opened lazily, so it
+  can be used anywhere a sqlite3.Connection can.
+
+  Attributes:
+    filename: the SQLite database file
+    read_only: boolean, whether to reject writes on these connections
+    cached_statements: integer, size of each connection's statement cache
+    synchronous: string, each connection's PRAGMA synchronous level
+    functions: dict mapping (name, num_params) to the user functions that
+      create_function() has registered
+  """
+
+  def __init__(self, filename, read_only=False,
+               cached_statements=DEFAULT_STATEMENT_CACHE_SIZE,
+               synchronous=DEFAULT_SYNCHRONOUS):
+    self.filename = filename
+    self.read_only = read_only
+    self.cached_statements = cached_statements
+    self.synchronous = synchronous
+    self.local = threading.local()
+    self.functions = {}
+
+  def get(self):
+    """Returns the current thread's sqlite3.Connection, opening it if necessary.
+    """
+    conn = getattr(self.local, 'conn', None)
+    if conn is None:
+      conn = self.local.conn = connect(
+        self.filename, read_only=self.read_only,
+        cached_statements=self.cached_statements, synchronous=self.synchronous)
+      for (name, num_params), fn in self.functions.items():
+        conn.create_function(name, num_params, fn)
+    return conn
+
+  def create_function(self, name, num_params, fn):
+    """Registers a user function on this and future threads' connections.
+
+    Connections that other threads have already opened don't get it, so call
+    this before serving requests.
+    """
+    self.functions[(name, num_params)] = fn
+    self.get().create_function(name, num_params, fn)
+
+  def __getattr__(self, attr):
+    return getattr(self.get(), attr)
+
+
+class GroupCommitter(object):
+  """Coalesces writes from concurrent threads into shared transactions.
+
+  write() doesn't return until its statement has been committed, so callers
+  can still rely on it being durable before they respond. The first writer to
+  arrive becomes the leader. It waits window seconds for other writers to
+  queue theirs, then runs all of them in a single transaction on its own
+  connection and commits it, i.e. one sync for the whole batch. Writers that
+  arrive during a commit are batched into the next one.
+
+  If any statement in a batch fails, or the batch is interrupted by any other
+  exception, the transaction is rolled back and every writer in it gets the
+  exception.
+
+  Thread safe as long as conn is, e.g. a ThreadLocalConnection. With a
+  sqlite3.Connection, use a window of 0, since there's only one thread.
+
+  Attributes:
+    conn: sqlite3.Connection
+    window: float seconds
+    cond: threading.Condition that guards queue and committing
+    queue: list of dict writes with 'statements', 'done', and 'error' keys,
+      waiting for the next batch. 'statements' is a list of (SQL statement,
+      parameters) tuples.
+    committing: boolean, whether a leader is running a batch
+    commits: integer
+    writes: integer
+  """
+
+  def __init__(self, conn, window=0):
+    self.conn = conn
+    self.window = window
+    self.cond = threading.Condition()
+    self.queue = []
+    self.committing = False
+    self.commits = self.writes = 0
+
+  def write(self, statement, params=()):
+    """Runs a write statement and waits until it's committed.
+
+    Args:
+      statement: string SQL statement
+      params: sequence of parameters
+
+    Raises: the exception, usually sqlite3.Error, if the batch's transaction
+      failed
+    """
+    self.write_all([(statement, params)])
+
+  def write_all(self, statements):
+    """Runs write statements in the same transaction and waits until they're
+    committed.
+
+    Args:
+      statements: sequence of (string SQL statement, sequence of parameters)
+        tuples
+
+    Raises: the exception, usually sqlite3.Error, if the batch's transaction
+      failed
+    """
+    write = {'statements': list(statements), 'done': False, 'error': None}
+    with self.cond:
+      self.queue.append(write)
+      while not write['done'] and self.committing:
+        self.cond.wait()
+      if not write['done']:
+        self.committing = True
+
+    if not write['done']:
+      self.commit_batch()
+    if write['error']:
+      raise write['error']
+
+  def commit_batch(self):
+    """Runs and commits the queued writes. Only called by the leader.
+    """
+    batch = []
+    error = None
+    try:
+      if self.window:
+        time.sleep(self.window)
+      with self.cond:
+        batch, self.queue = self.queue, []
+      for write in batch:
+        for statement, params in write['statements']:
+          self.conn.execute(statement, params)
+      self.conn.commit()
+    except BaseException, e:
+      self.conn.rollback()
+      error = e
+      # e.g. KeyboardInterrupt. the writers get it too.
+      if not isinstance(e, Exception):
+        raise
+    finally:
+      with self.cond:
+        for write in batch:
+          write['done'] = True
+          write['error'] = error
+        self.committing = False
+        self.commits += 1
+        self.writes += len(batch)
+        self.cond.notify_all()
+
+  def stats(self):
+    """Returns a dict of the counters.
+    """
+    return {'commits': self.commits, 'writes': self.writes}
+
+
 def values_to_sqlite(input):
   """Serializes Python values into a comma separated SQLite value string.
 
@@ -80,6 +550,40 @@ def values_to_sqlite(input):
   return ',\n  '.join(output)
 
 
+# parses one JSON value from a string, starting at an index. this is the C
+# scanner that json.loads() uses internally, without its per call overhead.
+JSON_SCAN_ONCE = json.scanner.make_scanner(json.JSONDecoder())
+
+def json_loads(val):
+  """A faster json.loads() for JSON that has no surrounding whitespace.
+
+  Falls back to json.loads() for anything else, including invalid JSON.
+  """
+  try:
+    obj, end = JSON_SCAN_ONCE(val, 0)
+    if end == len(val):
+      return obj
+  except StopIteration:
+    pass
+  return json.loads(val)
+
+
+def row_hash(values):
+  """Returns a hash of a row's values, used to dedupe rows in FQL tables.
+
+  This is the only place row hashes are computed, for both loaded and migrated
+  rows. Missing values are stored as NULL, but older versions stored them as
+  '', so None and '' hash the same.
+
+  Args:
+    values: sequence of Python values, as passed to values_to_sqlite()
+
+  Returns: string
+  """
+  return hashlib.md5(values_to_sqlite(
+      ['' if val is None else val for val in values])).hexdigest()
+
+
 class PySqlFiles(object):
   """A mixin that stores data in a Python file and a SQL file.
 
@@ -127,13 +631,62 @@ class PySqlFiles(object):
   @classmethod
   def read(cls):
     """Factory method.
+
+    eval()ing the .py file is slow, so the attributes are also pickled to a
+    .pickle file next to it. That's used instead as long as the .py file's
+    modification time and size haven't changed.
     """
     inst = cls()
     with open(inst.py_file) as f:
-      for attr, val in eval(f.read()).items():
-        setattr(inst, attr, val)
+      stat = os.fstat(f.fileno())
+      version = (stat.st_mtime, stat.st_size)
+      attrs = inst.read_pickle(version)
+      if attrs is None:
+        attrs = eval(f.read())
+        inst.write_pickle(version, attrs)
+
+    for attr, val in attrs.items():
+      setattr(inst, attr, val)
     return inst
 
+  def pickle_file(self):
+    return self.py_file + '.pickle'
+
+  def read_pickle(self, version):
+    """Returns the pickled attributes if they match version, otherwise None.
+
+    Args:
+      version: (mtime, size) tuple of the .py file
+    """
+    try:
+      with open(self.pickle_file(), 'rb') as f:
+        pickled_version, attrs = cPickle.load(f)
+    except IOError:
+      return None
+    except Exception, e:
+      # corrupt, or from an incompatible version of this code
+      logging.warning('Ignoring %s: %r', self.pickle_file(), e)
+      return None
+
+    if pickled_version == version:
+      return attrs
+
+  def write_pickle(self, version, attrs):
+    """Pickles the attributes, if possible. Concurrent readers are safe.
+
+    Args:
+      version: (mtime, size) tuple of the .py file
+      attrs: dict mapping attribute name to value
+    """
+    filename = self.pickle_file()
+    temp = '%s.%d' % (filename, os.getpid())
+    try:
+      with open(temp, 'wb') as f:
+        cPickle.dump((version, attrs), f, cPickle.HIGHEST_PROTOCOL)
+      os.rename(temp, filename)
+    except (IOError, OSError), e:
+      logging.warning("Couldn't write %s: %s", filename, e)
+
   def wrote_message(self, filename):
     print 'Wrote %s to %s.' % (self.__class__.__name__, filename)
 
@@ -154,14 +707,74 @@ Column = collections.namedtuple(
 class Schema(PySqlFiles):
   """An FQL or Graph API schema.
 
+  The column indices are built by index_columns(), which read() calls. Call it
+  again after changing tables.
+
   Attributes:
     tables: dict mapping string table name to tuple of Column
+    columns: dict mapping string table name to OrderedDict mapping string
+      column name to Column, in the same order as tables
+    indexable_columns: dict mapping string table name to frozenset of the names
+      of its indexable columns
+    json_columns: dict mapping string table name to frozenset of the names of
+      its composite columns, which are stored as JSON strings
+    bool_columns: dict mapping string table name to frozenset of the names of
+      its boolean columns
+    row_decoders: cache.LruCache mapping (table, column names tuple) to row
+      decoder function, as returned by row_decoder()
+
+  Class attributes:
+    shared: dict mapping (class, .py filename) to (mtime, Schema), the
+      instances that read() has returned
+    shared_lock: protects shared
   """
   py_attrs = ('tables',)
+  shared = {}
+  shared_lock = threading.Lock()
 
   def __init__(self, *args, **kwargs):
     super(Schema, self).__init__(*args, **kwargs)
     self.tables = {}
+    self.index_columns()
+
+  @classmethod
+  def read(cls):
+    """Factory method.
+
+    Schemas are shared: reading the same schema file again returns the same
+    instance, unless the file has changed. Don't modify it!
+    """
+    py_file = cls().py_file
+    mtime = os.path.getmtime(py_file)
+    with Schema.shared_lock:
+      shared = Schema.shared.get((cls, py_file))
+      if shared and shared[0] == mtime:
+        return shared[1]
+
+      inst = super(Schema, cls).read()
+      inst.index_columns()
+      Schema.shared[(cls, py_file)] = (mtime, inst)
+      return inst
+
+  def index_columns(self):
+    """Builds the column indices from tables.
+    """
+    self.columns = {}
+    self.indexable_columns = {}
+    self.json_columns = {}
+    self.bool_columns = {}
+
+    for table, cols in self.tables.items():
+      self.columns[table] = collections.OrderedDict((c.name, c) for c in cols)
+      self.indexable_columns[table] = frozenset(c.name for c in cols
+                                                if c.indexable)
+      self.json_columns[table] = frozenset(c.name for c in cols
+                                           if not c.sqlite_type)
+      self.bool_columns[table] = frozenset(c.name for c in cols
+                                           if c.fb_type == 'bool')
+
+    # decoders depend on the columns
+    self.row_decoders = cache.LruCache(ROW_DECODER_CACHE_SIZE)
 
   def get_column(self, table, column):
     """Looks up a column.
@@ -172,30 +785,50 @@ class Schema(PySqlFiles):
   
     Returns: Column or None
     """
-    # TODO: store schema columns in ordered-dict (python 2.7), then remove this.
-    for col in self.tables[table]:
-      if col.name == column:
-        return col
+    return self.columns[table].get(column)
 
   def to_sql(self):
-    """Returns the SQL CREATE TABLE statements for this schema.
+    """Returns the SQL CREATE TABLE and CREATE INDEX statements for this schema.
     """
-    tables = []
-
     # order tables alphabetically
-    for table, cols in sorted(self.tables.items()):
-      col_defs = ',\n'.join('  %s %s' % (c.name, c.sqlite_type) for c in cols)
-      col_names = ', '.join(c.name for c in cols)
-      tables.append("""
-CREATE TABLE IF NOT EXISTS `%s` (
-%s,
-  UNIQUE (%s)
-);
-""" % (table, col_defs, col_names))
+    return ''.join(self.table_to_sql(table) for table in sorted(self.tables))
 
-    return ''.join(tables)
+  def table_to_sql(self, table):
+    """Returns the SQL CREATE TABLE and CREATE INDEX statements for a table.
 
-  def json_to_sqlite(self, object, table):
+    Rows are deduped by a hash of their values in the _row_hash column, which
+    FqlDataset.to_sql() and migrate_fql_tables() populate. Rows inserted
+    without one, e.g. by hand, are compared to the existing rows by value
+    instead, by a trigger, which raises an error if there's a match. It's plain
+    SQL, so it works in any SQLite client. Like row_hash(), it treats NULL and
+    '' as equal, except in indexable columns, so that it can use their indices.
+    Each indexable column gets its own index.
+
+    Args:
+      table: string
+    """
+    cols = self.tables[table]
+    col_defs = ''.join('  %s %s,\n' % (c.name, c.sqlite_type) for c in cols)
+    indexes = ''.join("""\
+CREATE INDEX IF NOT EXISTS `%s_%s` ON `%s` (%s);
+""" % (table, c.name, table, c.name) for c in cols if c.indexable)
+    same_values = '\n    AND '.join(
+      ('%s IS NEW.%s' if c.indexable else "ifnull(%s, '') = ifnull(NEW.%s, '')")
+      % (c.name, c.name) for c in cols)
+    return """
+CREATE TABLE IF NOT EXISTS `%(table)s` (
+%(col_defs)s  _row_hash TEXT UNIQUE
+);
+%(indexes)sCREATE TRIGGER IF NOT EXISTS `%(table)s_dedupe` BEFORE INSERT ON `%(table)s`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `%(table)s` WHERE %(same_values)s)
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in %(table)s');
+END;
+""" % {'table': table, 'col_defs': col_defs, 'indexes': indexes,
+       'same_values': same_values}
+
+  def json_to_sqlite(self, object, table, with_hash=False):
     """Serializes a JSON object into a comma separated SQLite value string.
   
     The order of the values will match the order of the columns in the schema.
@@ -203,6 +836,7 @@ CREATE TABLE IF NOT EXISTS `%s` (
     Args:
       object: decoded JSON dict
       table: string
+      with_hash: boolean, whether to append the row_hash() of the values
   
     Returns: string
     """
@@ -210,18 +844,19 @@ CREATE TABLE IF NOT EXISTS `%s` (
     values = []
   
     for i, col in enumerate(columns):
-      val = object.get(col.name, '')
+      # missing values are NULL, like in migrated and hand inserted rows
+      val = object.get(col.name)
       if isinstance(val, (list, dict)):
         # store composite types as JSON strings
         val = json.dumps(val)
       values.append(val)
-  
+
+    if with_hash:
+      values.append(row_hash(values))
     return values_to_sqlite(values)
 
   def sqlite_to_json(self, cursor, table):
     """Converts SQLite query results to JSON result objects.
-
-    This is used in fql.py.
   
     Args:
       cursor: SQLite query cursor
@@ -230,26 +865,83 @@ CREATE TABLE IF NOT EXISTS `%s` (
     Returns:
       list of dicts representing JSON result objects
     """
-    colnames = [d[0] for d in cursor.description]
-    columns = [self.get_column(table, name) for name in colnames]
-    objects = []
+    return [object for batch in self.sqlite_to_json_batches(cursor, table)
+            for object in batch]
+
+  def sqlite_to_json_batches(self, cursor, table, batch_size=FETCH_BATCH_SIZE):
+    """Converts SQLite query results to JSON result objects, a batch at a time.
 
-    for row in cursor.fetchall():
-      object = {}
-      for colname, column, val in zip(colnames, columns, row):
-        # by default, use the SQLite type
-        object[colname] = val
-        # ...except for a couple special cases
-        if column:
-          if val and not column.sqlite_type:
-            # composite types are stored as JSON strings
-            object[colname] = json.loads(val)
-          elif column.fb_type == 'bool':
-            object[colname] = bool(val)
+    Only holds one batch of rows in memory at once. This is used in fql.py.
+
+    Args:
+      cursor: SQLite query cursor
+      table: string
+      batch_size: integer, number of rows to fetch at a time
+
+    Yields:
+      lists of dicts representing JSON result objects
+    """
+    decode = self.row_decoder(table, tuple(d[0] for d in cursor.description))
 
-      objects.append(object)
+    while True:
+      rows = cursor.fetchmany(batch_size)
+      if not rows:
+        break
+      yield map(decode, rows)
+
+  def row_decoder(self, table, colnames):
+    """Returns a function that converts a SQLite result row to a JSON object.
+
+    Each column's conversion is worked out once, up front, and the decoder is
+    cached, so decoding a row doesn't look anything up in the schema.
+
+    Args:
+      table: string
+      colnames: tuple of string result column names
+
+    Returns: function that takes a row tuple and returns a dict
+    """
+    key = (table, colnames)
+    decode = self.row_decoders.get(key)
+    if decode:
+      return decode
+
+    # by default, use the SQLite type, except for a couple special cases.
+    # composite types are stored as JSON strings. they're parsed with the C
+    # scanner inline, since a function call per cell costs as much as parsing
+    # a small value. json_loads() is the fallback for anything it can't parse.
+    json_columns = self.json_columns.get(table, ())
+    bool_columns = self.bool_columns.get(table, ())
+    json_cols = tuple((i, name, name in bool_columns)
+                      for i, name in enumerate(colnames) if name in json_columns)
+    bool_cols = tuple(name for name in colnames
+                      if name in bool_columns and name not in json_columns)
+
+    if json_cols or bool_cols:
+      scan = JSON_SCAN_ONCE
+      def decode(row):
+        object = dict(zip(colnames, row))
+        for i, name, is_bool in json_cols:
+          val = row[i]
+          if val:
+            try:
+              obj, end = scan(val, 0)
+              if end == len(val):
+                object[name] = obj
+                continue
+            except StopIteration:
+              pass
+            object[name] = json_loads(val)
+          elif is_bool:
+            object[name] = bool(val)
+        for name in bool_cols:
+          object[name] = bool(object[name])
+        return object
+    else:
+      decode = lambda row: dict(zip(colnames, row))
 
-    return objects
+    self.row_decoders.put(key, decode)
+    return decode
 
 
 class FqlSchema(Schema):
@@ -335,11 +1027,12 @@ class FqlDataset(Dataset):
 -- %s
 """ % (table, data.query))
 
-      columns_str = ', '.join('`%s`' % col.name
-                              for col in self.schema.tables[table])
+      columns_str = ', '.join(['`%s`' % col.name
+                               for col in self.schema.tables[table]] +
+                              ['_row_hash'])
       for object in data.data:
         # order columns to match schema (which is the order in FQL docs)
-        values_str = self.schema.json_to_sqlite(object, table)
+        values_str = self.schema.json_to_sqlite(object, table, with_hash=True)
         output.append("""\
 INSERT OR IGNORE INTO `%s` (
   %s
@@ -385,8 +1078,10 @@ class GraphDataset(Dataset):
     # connections
     for conn in self.connections.values():
       for object in conn.data['data']:
+        # the ordinal defaults to the rowid, i.e. the order they're inserted
         output.append(self.make_insert('graph_connections',
-                                       conn.id, conn.name, json.dumps(object)))
+                                       conn.id, conn.name, json.dumps(object),
+                                       None, graph_timestamp(object)))
 
     output.append('COMMIT;')
     return '\n'.join(output)
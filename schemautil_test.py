@@ -0,0 +1,485 @@
+#!/usr/bin/python
+"""Unit tests for schemautil.py.
+"""
+
+__author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
+
+import cPickle
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+import schemautil
+import testutil
+
+
+class SchemaTest(unittest.TestCase):
+
+  def setUp(self):
+    self.schema = schemautil.FqlSchema()
+    self.schema.tables = {'friend': (
+        schemautil.Column('uid1', 'int', 'INTEGER', True),
+        schemautil.Column('uid2', 'int', 'INTEGER', True),
+        schemautil.Column('note', 'string', 'TEXT', False),
+        schemautil.Column('close', 'bool', 'INTEGER', False),
+        schemautil.Column('tags', 'array', '', False),
+        )}
+    self.schema.index_columns()
+    self.conn = schemautil.connect(':memory:')
+
+  def test_table_to_sql(self):
+    self.assertEquals("""
+CREATE TABLE IF NOT EXISTS `friend` (
+  uid1 INTEGER,
+  uid2 INTEGER,
+  note TEXT,
+  close INTEGER,
+  tags ,
+  _row_hash TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS `friend_uid1` ON `friend` (uid1);
+CREATE INDEX IF NOT EXISTS `friend_uid2` ON `friend` (uid2);
+CREATE TRIGGER IF NOT EXISTS `friend_dedupe` BEFORE INSERT ON `friend`
+WHEN NEW._row_hash IS NULL AND EXISTS (
+  SELECT 1 FROM `friend` WHERE uid1 IS NEW.uid1
+    AND uid2 IS NEW.uid2
+    AND ifnull(note, '') = ifnull(NEW.note, '')
+    AND ifnull(close, '') = ifnull(NEW.close, '')
+    AND ifnull(tags, '') = ifnull(NEW.tags, ''))
+BEGIN
+  SELECT RAISE(ABORT, 'duplicate row in friend');
+END;
+""", self.schema.table_to_sql('friend'))
+
+  def test_column_indices(self):
+    self.assertEquals(['uid1', 'uid2', 'note', 'close', 'tags'],
+                      self.schema.columns['friend'].keys())
+    self.assertEquals(self.schema.tables['friend'][1],
+                      self.schema.get_column('friend', 'uid2'))
+    self.assertIsNone(self.schema.get_column('friend', 'foo'))
+    self.assertEquals(frozenset(('uid1', 'uid2')),
+                      self.schema.indexable_columns['friend'])
+    self.assertEquals(frozenset(('tags',)), self.schema.json_columns['friend'])
+    self.assertEquals(frozenset(('close',)), self.schema.bool_columns['friend'])
+
+  def test_read_indexes_columns(self):
+    schema = schemautil.FqlSchema.read()
+    self.assertTrue(schema.get_column('user', 'uid').indexable)
+    self.assertIn('uid', schema.indexable_columns['user'])
+
+  def test_indexes_are_used(self):
+    self.conn.executescript(self.schema.to_sql())
+    plan = self.conn.execute(
+      'EXPLAIN QUERY PLAN SELECT note FROM friend WHERE uid2 = 3').fetchall()
+    self.assertIn('USING INDEX friend_uid2', plan[0][-1])
+
+  def test_row_decoder(self):
+    decode = self.schema.row_decoder(
+      'friend', ('uid1', 'close', 'tags', 'strlen(note)'))
+    self.assertEquals(
+      {'uid1': 1, 'close': True, 'tags': ['x', {'y': 2}], 'strlen(note)': 3},
+      decode((1, 1, ' ["x", {"y": 2}] ', 3)))
+    self.assertEquals(
+      {'uid1': None, 'close': False, 'tags': None, 'strlen(note)': None},
+      decode((None, None, None, None)))
+    self.assertEquals({'x': 1}, decode((1, 0, '{"x": 1}', 3))['tags'])
+    self.assertRaises(ValueError, decode, (1, 0, '[1] x', 3))
+
+    # decoders are cached
+    self.assertIs(decode, self.schema.row_decoder(
+        'friend', ('uid1', 'close', 'tags', 'strlen(note)')))
+
+  def test_json_loads(self):
+    for val in ('{"a": [1, 2.5, null]}', ' [] ', '"x"', u'"\\u00e9"'):
+      self.assertEquals(json.loads(val), schemautil.json_loads(val))
+    self.assertRaises(ValueError, schemautil.json_loads, '[1] x')
+
+  def test_dataset_dedupes_rows(self):
+    dataset = schemautil.FqlDataset(schema=self.schema)
+    row = {'uid1': 1, 'uid2': 2, 'note': "it's"}
+    dataset.data = {'friend': schemautil.Data(
+        table='friend', query='', data=[row, row, dict(row, uid2=3)])}
+
+    self.conn.executescript(self.schema.to_sql())
+    self.conn.executescript(dataset.to_sql())
+    self.conn.executescript(dataset.to_sql())
+    self.assertEquals([(1, 2, "it's"), (1, 3, "it's")], self.conn.execute(
+        'SELECT uid1, uid2, note FROM friend ORDER BY uid2').fetchall())
+    # missing values are NULL
+    self.assertEquals([(None, None)], self.conn.execute(
+        'SELECT DISTINCT close, tags FROM friend').fetchall())
+
+  def test_hand_inserted_rows_are_deduped(self):
+    self.conn.executescript(self.schema.to_sql())
+    insert = 'INSERT INTO friend (uid1, uid2, note, close) VALUES (?, ?, ?, ?)'
+    self.conn.execute(insert, (1, 2, 'x', None))
+    for dupe in (1, 2, 'x', None), (1, 2, 'x', ''):
+      self.assertRaises(self.conn.IntegrityError, self.conn.execute, insert,
+                        dupe)
+    self.conn.execute(insert, (1, 2, 'y', None))
+    self.assertEquals(2, self.conn.execute(
+        'SELECT COUNT(*) FROM friend').fetchone()[0])
+
+    # the trigger's lookup uses an index
+    plan = self.conn.execute(
+      "EXPLAIN QUERY PLAN SELECT 1 FROM friend WHERE uid1 IS 1 AND uid2 IS 2 "
+      "AND ifnull(note, '') = 'x'").fetchall()
+    self.assertIn('USING INDEX friend_uid', plan[0][-1])
+
+  def test_migrate_fql_tables(self):
+    self.conn.executescript("""
+CREATE TABLE `friend` (uid1 INTEGER, uid2 INTEGER, note TEXT,
+                       UNIQUE (uid1, uid2, note));
+INSERT INTO friend VALUES (1, 2, 'x');
+INSERT INTO friend VALUES (1, 3, NULL);
+""")
+    orig_read = schemautil.FqlSchema.read
+    try:
+      schemautil.FqlSchema.read = classmethod(lambda cls: self.schema)
+      schemautil.migrate_fql_tables(self.conn)
+    finally:
+      schemautil.FqlSchema.read = orig_read
+
+    # columns that the old table didn't have are NULL, like in new rows
+    self.assertEquals(
+      [(1, 2, 'x', None, None, schemautil.row_hash([1, 2, 'x', None, None])),
+       (1, 3, None, None, None, schemautil.row_hash([1, 3, None, None, None]))],
+      self.conn.execute('SELECT * FROM friend ORDER BY uid2').fetchall())
+
+    # the wide UNIQUE constraint is gone and the row hash dedupes, including
+    # against freshly loaded copies of the same rows
+    dataset = schemautil.FqlDataset(schema=self.schema)
+    dataset.data = {'friend': schemautil.Data(table='friend', query='', data=[
+          {'uid1': 1, 'uid2': 2, 'note': 'x'}, {'uid1': 1, 'uid2': 3}])}
+    self.conn.executescript(dataset.to_sql())
+    self.assertEquals(2, self.conn.execute(
+        'SELECT COUNT(*) FROM friend').fetchone()[0])
+
+    # NULL and '' hash the same, since older versions stored missing values as ''
+    self.assertRaises(self.conn.IntegrityError, self.conn.execute,
+                      "INSERT INTO friend VALUES (1, 2, 'x', '', '', ?)",
+                      (schemautil.row_hash([1, 2, 'x', '', '']),))
+
+    # running it again is a noop
+    schemautil.migrate_fql_tables(self.conn)
+
+  def test_get_db_skips_ddl_when_schema_unchanged(self):
+    filename = tempfile.mktemp(prefix='mockfacebook_test.')
+    try:
+      conn = schemautil.get_db(filename)
+      version = conn.execute('PRAGMA user_version').fetchone()[0]
+      self.assertNotEquals(0, version)
+      conn.execute('DROP TABLE profile')
+      conn.close()
+
+      # the schema is unchanged, so the table isn't recreated
+      conn = schemautil.get_db(filename)
+      self.assertEquals(0, conn.execute(
+          "SELECT COUNT(*) FROM sqlite_master WHERE name = 'profile'"
+          ).fetchone()[0])
+
+      # a different version runs the DDL again
+      conn.execute('PRAGMA user_version = 1')
+      conn.close()
+      conn = schemautil.get_db(filename)
+      conn.execute('SELECT * FROM profile')
+      self.assertEquals(version, conn.execute(
+          'PRAGMA user_version').fetchone()[0])
+    finally:
+      testutil.remove_db(filename)
+
+  def test_get_db_wal_and_synchronous(self):
+    filename = tempfile.mktemp(prefix='mockfacebook_test.')
+    try:
+      conn = schemautil.get_db(filename, synchronous='NORMAL')
+      self.assertEquals('wal', conn.execute('PRAGMA journal_mode').fetchone()[0])
+      self.assertEquals(1, conn.execute('PRAGMA synchronous').fetchone()[0])
+      # FULL is the default
+      conn = schemautil.connect(filename)
+      self.assertEquals(2, conn.execute('PRAGMA synchronous').fetchone()[0])
+    finally:
+      testutil.remove_db(filename)
+
+    conn = schemautil.get_db(':memory:')
+    self.assertEquals('memory', conn.execute('PRAGMA journal_mode').fetchone()[0])
+
+  def test_migrate_with_real_schema(self):
+    conn = schemautil.connect(':memory:')
+    conn.executescript("""
+CREATE TABLE `friend` (uid1 TEXT, uid2 TEXT, UNIQUE (uid1, uid2));
+INSERT INTO friend VALUES ('1', '2');
+""")
+    schemautil.migrate_fql_tables(conn)
+    self.assertEquals([('1', '2')], conn.execute(
+        'SELECT uid1, uid2 FROM friend').fetchall())
+    self.assertIn('_row_hash', conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'friend'").fetchone()[0])
+
+
+class OAuthTablesTest(unittest.TestCase):
+
+  def test_migrate_oauth_tables(self):
+    conn = schemautil.connect(':memory:')
+    conn.executescript("""
+CREATE TABLE oauth_access_tokens (token TEXT NOT NULL, code TEXT NOT NULL);
+INSERT INTO oauth_access_tokens VALUES ('x', 'a');
+INSERT INTO oauth_access_tokens VALUES ('x', 'a');
+INSERT INTO oauth_access_tokens VALUES ('y', 'a');
+""")
+    now = int(time.time())
+    schemautil.migrate_oauth_tables(conn)
+    rows = conn.execute('SELECT token, expires_at FROM oauth_access_tokens '
+                        'ORDER BY token').fetchall()
+    self.assertEquals(['x', 'y'], [token for token, expires_at in rows])
+    for token, expires_at in rows:
+      self.assertGreaterEqual(expires_at,
+                              now + schemautil.MIGRATED_OAUTH_LIFETIME)
+
+    # with the unique index and expires_at, it's a noop
+    conn.execute('CREATE UNIQUE INDEX oauth_access_tokens_token '
+                 'ON oauth_access_tokens(token)')
+    conn.execute('UPDATE oauth_access_tokens SET expires_at = NULL')
+    schemautil.migrate_oauth_tables(conn)
+    self.assertEquals([(None,), (None,)], conn.execute(
+        'SELECT expires_at FROM oauth_access_tokens').fetchall())
+
+    # revoked random tokens are deleted, signed ones are kept
+    conn.executescript("""
+CREATE TABLE oauth_revoked_tokens (token TEXT NOT NULL PRIMARY KEY, expires INTEGER);
+INSERT INTO oauth_revoked_tokens VALUES ('x', NULL);
+INSERT INTO oauth_revoked_tokens VALUES ('signed.token', 1000);
+""")
+    schemautil.migrate_oauth_tables(conn)
+    self.assertEquals([('y',)], conn.execute(
+        'SELECT token FROM oauth_access_tokens').fetchall())
+    self.assertEquals([('signed.token',)], conn.execute(
+        'SELECT token FROM oauth_revoked_tokens').fetchall())
+
+
+class GraphTablesTest(unittest.TestCase):
+
+  def test_parse_timestamp(self):
+    for val in (1334000000, '1334000000', '2012-04-09T19:33:20+0000',
+                '2012-04-09T12:33:20-0700', '2012-04-09T19:33:20Z'):
+      self.assertEquals(1334000000, schemautil.parse_timestamp(val))
+    self.assertEquals(1333929600, schemautil.parse_timestamp('2012-04-09'))
+    self.assertRaises(ValueError, schemautil.parse_timestamp, 'yesterday')
+
+  def test_graph_timestamp(self):
+    self.assertEquals(1334000000, schemautil.graph_timestamp(
+        {'created_time': '2012-04-09T19:33:20+0000'}))
+    self.assertEquals(1334000000, schemautil.graph_timestamp(
+        {'updated_time': 1334000000}))
+    self.assertIsNone(schemautil.graph_timestamp({'created_time': 'x'}))
+    self.assertIsNone(schemautil.graph_timestamp('http://picture'))
+
+  def test_default_ordinal(self):
+    conn = schemautil.get_db(':memory:')
+    dataset = schemautil.GraphDataset()
+    dataset.data = {}
+    dataset.connections = {'albums': schemautil.Connection(
+        table='album', id='1', name='albums', data={'data': [
+            {'id': '3', 'created_time': '2012-04-09T19:33:20+0000'},
+            {'id': '2'}]})}
+    conn.executescript(dataset.to_sql())
+    conn.executescript(dataset.to_sql())
+    self.assertEquals(
+      [(1, '3', 1334000000), (2, '2', None)],
+      [(ordinal, json.loads(data)['id'], created_time)
+       for ordinal, data, created_time in conn.execute(
+          'SELECT ordinal, data, created_time FROM graph_connections '
+          'ORDER BY ordinal')])
+
+  def test_migrate_graph_tables(self):
+    conn = schemautil.connect(':memory:')
+    conn.executescript("""
+CREATE TABLE graph_connections (id TEXT NOT NULL, connection TEXT NOT NULL,
+                                data TEXT NOT NULL, UNIQUE(id, connection, data));
+INSERT INTO graph_connections VALUES ('1', 'feed', '{"created_time": 1000}');
+INSERT INTO graph_connections VALUES ('1', 'feed', '"x"');
+""")
+    schemautil.migrate_graph_tables(conn)
+    self.assertEquals([(1, 1000), (2, None)], conn.execute(
+        'SELECT ordinal, created_time FROM graph_connections').fetchall())
+
+    # running it again is a noop
+    schemautil.migrate_graph_tables(conn)
+
+  def test_migrate_duplicate_aliases(self):
+    filename = tempfile.mktemp(prefix='mockfacebook_test.')
+    try:
+      conn = schemautil.connect(filename)
+      conn.executescript("""
+CREATE TABLE graph_objects (id TEXT NOT NULL PRIMARY KEY, alias TEXT,
+                            data TEXT NOT NULL);
+INSERT INTO graph_objects VALUES ('1', 'alice', '{}');
+INSERT INTO graph_objects VALUES ('2', 'alice', '{}');
+INSERT INTO graph_objects VALUES ('3', NULL, '{}');
+INSERT INTO graph_objects VALUES ('4', NULL, '{}');
+INSERT INTO graph_objects VALUES ('5', 'bob', '{}');
+""")
+      conn.close()
+
+      # get_db() migrates, then creates the unique index
+      conn = schemautil.get_db(filename)
+      self.assertEquals(
+        [('1', 'alice'), ('2', None), ('3', None), ('4', None), ('5', 'bob')],
+        conn.execute('SELECT id, alias FROM graph_objects ORDER BY id').fetchall())
+      self.assertTrue(conn.execute("SELECT 1 FROM sqlite_master "
+                                   "WHERE name = 'graph_objects_alias'").fetchone())
+      conn.close()
+    finally:
+      testutil.remove_db(filename)
+
+
+class GroupCommitterTest(unittest.TestCase):
+
+  def setUp(self):
+    super(GroupCommitterTest, self).setUp()
+    self.filename = tempfile.mktemp(prefix='mockfacebook_test.')
+    schemautil.get_db(self.filename).close()
+    self.conn = schemautil.ThreadLocalConnection(self.filename)
+
+  def tearDown(self):
+    testutil.remove_db(self.filename)
+    super(GroupCommitterTest, self).tearDown()
+
+  def committed_codes(self):
+    other = schemautil.connect(self.filename)
+    try:
+      return set(row[0] for row in other.execute('SELECT code FROM oauth_codes'))
+    finally:
+      other.close()
+
+  def test_write(self):
+    committer = schemautil.GroupCommitter(self.conn)
+    committer.write('INSERT INTO oauth_codes (code, client_id, redirect_uri) '
+                    'VALUES (?, "a", "b")', ('x',))
+    # committed before write() returns
+    self.assertEquals(set(['x']), self.committed_codes())
+    self.assertEquals({'commits': 1, 'writes': 1}, committer.stats())
+
+  def test_write_all(self):
+    committer = schemautil.GroupCommitter(self.conn)
+    insert = ('INSERT INTO oauth_codes (code, client_id, redirect_uri) '
+              'VALUES (?, "a", "b")')
+    committer.write_all([(insert, ('x',)), (insert, ('y',))])
+    self.assertEquals(set(['x', 'y']), self.committed_codes())
+    self.assertEquals({'commits': 1, 'writes': 1}, committer.stats())
+
+    # all or nothing
+    self.assertRaises(sqlite3.IntegrityError, committer.write_all,
+                      [(insert, ('z',)), (insert, ('x',))])
+    self.assertEquals(set(['x', 'y']), self.committed_codes())
+
+  def test_concurrent_writes_share_commits(self):
+    committer = schemautil.GroupCommitter(self.conn, window=0.05)
+    codes = [str(i) for i in range(10)]
+    threads = [threading.Thread(target=committer.write, args=(
+          'INSERT INTO oauth_codes (code, client_id, redirect_uri) '
+          'VALUES (?, "a", "b")', (code,)))
+               for code in codes]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    self.assertEquals(set(codes), self.committed_codes())
+    self.assertEquals(10, committer.writes)
+    self.assertLess(committer.commits, 10)
+
+  def test_failed_batch(self):
+    committer = schemautil.GroupCommitter(self.conn)
+    committer.queue.append({'statements': [(
+            'INSERT INTO oauth_codes (code, client_id, redirect_uri) '
+            'VALUES ("y", "a", "b")', ())], 'done': False, 'error': None})
+    self.assertRaises(sqlite3.Error, committer.write, 'INSERT INTO nonexistent '
+                      'VALUES (1)')
+    # the whole batch was rolled back
+    self.assertEquals(set(), self.committed_codes())
+    self.assertFalse(committer.committing)
+
+    committer.write('INSERT INTO oauth_codes (code, client_id, redirect_uri) '
+                    'VALUES ("z", "a", "b")')
+    self.assertEquals(set(['z']), self.committed_codes())
+
+  def test_failed_batch_other_exception(self):
+    committer = schemautil.GroupCommitter(self.conn)
+    waiter = {'statements': [(
+          'INSERT INTO oauth_codes (code, client_id, redirect_uri) '
+          'VALUES ("y", "a", "b")', ())], 'done': False, 'error': None}
+    committer.queue.append(waiter)
+    # parameters of an unsupported type raise ValueError, not sqlite3.Error
+    self.assertRaises(ValueError, committer.write, 'SELECT ?', 5)
+    self.assertIsInstance(waiter['error'], ValueError)
+    self.assertEquals(set(), self.committed_codes())
+
+    # and it was rolled back, so the next batch doesn't commit y
+    committer.write('INSERT INTO oauth_codes (code, client_id, redirect_uri) '
+                    'VALUES ("z", "a", "b")')
+    self.assertEquals(set(['z']), self.committed_codes())
+
+
+class PySqlFilesTest(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    py_file = os.path.join(self.dir, 'schema.py')
+
+    class TestSchema(schemautil.Schema):
+      def __init__(self):
+        super(TestSchema, self).__init__(py_file)
+
+    self.cls = TestSchema
+    self.write_py("{'tables': {'t': (Column('a', 'int', 'INTEGER', True),)}}")
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def write_py(self, contents):
+    py_file = self.cls().py_file
+    with open(py_file, 'w') as f:
+      f.write(contents)
+    # make sure the mtime changes
+    mtime = os.path.getmtime(py_file) + len(contents)
+    os.utime(py_file, (mtime, mtime))
+
+  def test_read_uses_pickle(self):
+    schema = self.cls.read()
+    self.assertEquals(['a'], schema.columns['t'].keys())
+    pickle_file = schema.pickle_file()
+    self.assertTrue(os.path.exists(pickle_file))
+
+    # the pickle is used as long as the .py file hasn't changed
+    with open(pickle_file, 'rb') as f:
+      version, attrs = cPickle.load(f)
+    schema.write_pickle(version, {'tables': {'from_pickle': ()}})
+    self.cls.shared.clear()
+    self.assertEquals({'from_pickle': ()}, self.cls.read().tables)
+
+    self.write_py("{'tables': {'u': ()}}")
+    self.assertEquals({'u': ()}, self.cls.read().tables)
+
+  def test_corrupt_pickle(self):
+    schema = self.cls.read()
+    with open(schema.pickle_file(), 'wb') as f:
+      f.write('garbage')
+
+    self.cls.shared.clear()
+    self.assertEquals(schema.tables, self.cls.read().tables)
+
+  def test_read_shares_schemas(self):
+    schema = self.cls.read()
+    self.assertIs(schema, self.cls.read())
+
+    self.write_py("{'tables': {}}")
+    self.assertIsNot(schema, self.cls.read())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -4,24 +4,36 @@
 https://github.com/rogerhu/mockfacebook
 
 Top-level HTTP server:
-  server.py [--port PORT] [--me USER_ID] [--file SQLITE_DB_FILE]
+  server.py [--port PORT] [--me USER_ID] [--file SQLITE_DB_FILE] [--threads N]
+            [--workers N]
 """
 
 __author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
 
+import httplib
 import itertools
 import logging
 import optparse
+import os
+import Queue
+import signal
 import sqlite3
 import sys
+import threading
+import time
+import traceback
+import urllib
 import wsgiref.simple_server
+import wsgiref.util
 
 import webapp2
 
+import batch
 import fql
 import graph
 import oauth
 import schemautil
+import stats
 
 # how often the HTTP server should poll for shutdown, in seconds
 SERVER_POLL_INTERVAL = 0.5
@@ -32,12 +44,23 @@ options = None
 # if there are fewer than this many FQL or Graph API rows, print a warning.
 ROW_COUNT_WARNING_THRESHOLD = 10
 
+# with --threads, how many accepted requests can wait for a worker thread, per
+# thread, before the server stops accepting new connections.
+QUEUED_REQUESTS_PER_THREAD = 4
+
+
+# with --workers, the paths that only the writer process serves, since they
+# write to the database. (all non-GET requests also go to the writer.)
+WRITER_PATHS = (oauth.AUTH_CODE_PATH, oauth.ACCESS_TOKEN_PATH)
 
 # order matters here! the first handler with a matching route is used.
 HANDLER_CLASSES = (
   oauth.AuthCodeHandler,
   oauth.AccessTokenHandler,
   fql.FqlHandler,
+  stats.StatsHandler,
+  # must be before GraphHandler, which also matches POST /
+  batch.BatchHandler,
   # note that this also includes the front page
   graph.GraphHandler,
   )
@@ -50,6 +73,113 @@ def application():
   return webapp2.WSGIApplication(routes, debug=True)
 
 
+class ThreadPoolWSGIServer(wsgiref.simple_server.WSGIServer):
+  """A WSGI server that handles requests on a fixed pool of worker threads.
+
+  The serving thread accepts connections and queues them. When the queue is
+  full, it blocks, so the number of in flight requests is bounded.
+
+  Attributes:
+    requests: Queue.Queue of (socket, client address) tuples, or None to tell a
+      worker thread to exit
+    threads: list of worker threading.Threads
+  """
+
+  # the listen() backlog. the default, 5, drops connections under load.
+  request_queue_size = 128
+
+  def __init__(self, server_address, handler_class, num_threads):
+    wsgiref.simple_server.WSGIServer.__init__(self, server_address,
+                                              handler_class)
+    self.num_threads = num_threads
+    self.requests = Queue.Queue(num_threads * QUEUED_REQUESTS_PER_THREAD)
+    self.threads = []
+
+  def serve_forever(self, *args, **kwargs):
+    # start the threads here, not in the constructor, since --workers forks
+    # after creating the server, and threads don't survive a fork.
+    for i in range(self.num_threads):
+      thread = threading.Thread(target=self.process_requests,
+                                name='worker %d' % i)
+      thread.daemon = True
+      thread.start()
+      self.threads.append(thread)
+    wsgiref.simple_server.WSGIServer.serve_forever(self, *args, **kwargs)
+
+  def process_request(self, request, client_address):
+    self.requests.put((request, client_address))
+
+  def process_requests(self):
+    """Worker thread main loop. Handles queued requests until it gets None.
+    """
+    while True:
+      item = self.requests.get()
+      if item is None:
+        return
+      request, client_address = item
+      try:
+        self.finish_request(request, client_address)
+      except:
+        self.handle_error(request, client_address)
+      finally:
+        self.shutdown_request(request)
+
+  def server_close(self):
+    wsgiref.simple_server.WSGIServer.server_close(self)
+    for thread in self.threads:
+      self.requests.put(None)
+
+
+class WriterProxy(object):
+  """WSGI middleware for --workers processes that forwards writes.
+
+  Requests that write to the database go to the single writer process over
+  HTTP. Everything else is served locally. The writer commits posted Graph API
+  data before it responds, so reads here see it.
+
+  Attributes:
+    app: the WSGI application to serve local requests
+    writer_port: integer, the port the writer process serves on
+  """
+
+  def __init__(self, app, writer_port):
+    self.app = app
+    self.writer_port = writer_port
+
+  def should_forward(self, environ):
+    path = environ.get('PATH_INFO', '')
+    if environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+      return True
+    else:
+      return path.rstrip('/') in WRITER_PATHS
+
+  def __call__(self, environ, start_response):
+    if not self.should_forward(environ):
+      return self.app(environ, start_response)
+
+    path = urllib.quote(environ.get('PATH_INFO', ''))
+    if environ.get('QUERY_STRING'):
+      path += '?' + environ['QUERY_STRING']
+    length = int(environ.get('CONTENT_LENGTH') or 0)
+    body = environ['wsgi.input'].read(length) if length else None
+    headers = {}
+    if environ.get('CONTENT_TYPE'):
+      headers['Content-Type'] = environ['CONTENT_TYPE']
+
+    conn = httplib.HTTPConnection('localhost', self.writer_port)
+    try:
+      conn.request(environ['REQUEST_METHOD'], path, body, headers)
+      resp = conn.getresponse()
+      body = resp.read()
+    finally:
+      conn.close()
+
+    start_response('%d %s' % (resp.status, resp.reason),
+                   [(name, val) for name, val in resp.getheaders()
+                    if not wsgiref.util.is_hop_by_hop(name)])
+    return [body]
+
+
 def parse_args(argv):
   global options
 
@@ -61,47 +191,254 @@ def parse_args(argv):
                     help='SQLite database file (default %default)')
   parser.add_option('--me', type='str', default=1,
                     help='user id that me() should return (default %default)')
+  parser.add_option('--threads', type='int', default=0,
+                    help='serve requests on a pool of this many threads, each '
+                    'with its own SQLite connection. (default %default, ie '
+                    'serve one request at a time)')
+  parser.add_option('--workers', type='int', default=0,
+                    help='fork this many worker processes that accept on the '
+                    'same port and serve reads, and forward writes to a '
+                    'single writer process. with --threads, the workers and '
+                    'the writer each serve on that many threads. (default '
+                    '%default, ie serve in a single process)')
+  parser.add_option('--statement_cache_size', type='int',
+                    default=schemautil.DEFAULT_STATEMENT_CACHE_SIZE,
+                    help='compiled SQLite statements to cache per database '
+                    'connection (default %default)')
+  parser.add_option('--synchronous', type='choice',
+                    choices=schemautil.SYNCHRONOUS_LEVELS,
+                    default=schemautil.DEFAULT_SYNCHRONOUS,
+                    help='SQLite PRAGMA synchronous level for writes, one of '
+                    '%s. the database runs in WAL mode, where FULL makes '
+                    'commits survive power loss and NORMAL only process '
+                    'crashes. (default %%default)' %
+                    ', '.join(schemautil.SYNCHRONOUS_LEVELS))
+  parser.add_option('--signed_tokens', action='store_true', default=False,
+                    help='issue HMAC signed access tokens that are verified '
+                    'without storing them. the database only stores '
+                    'revocations. verifying is no faster than an indexed '
+                    'token lookup, and slower than a cached one')
+  parser.add_option('--token_secret',
+                    help='secret key for --signed_tokens, which it implies. '
+                    '(default: random, so tokens only last until restart)')
+  parser.add_option('--sweep_interval', type='float',
+                    default=oauth.SWEEP_INTERVAL,
+                    help='seconds between deletes of expired OAuth auth codes '
+                    'and access tokens, in a background thread. 0 disables. '
+                    'not supported with an in-memory database. '
+                    '(default %default)')
+  parser.add_option('--startup_profile', action='store_true', default=False,
+                    help='print how long each phase of startup took')
 
   options, args = parser.parse_args(args=argv)
+  if options.db_file == ':memory:':
+    if options.threads:
+      parser.error("--threads can't share an in-memory database across threads")
+    elif options.workers:
+      parser.error("--workers can't share an in-memory database across processes")
   logging.debug('Command line options: %s' % options)
 
 
 def warn_if_no_data(conn):
   for kind, tables in (('FQL', fql.FqlHandler.schema.tables.keys()),
                        ('Graph API', ('graph_objects', 'graph_connections'))):
-    queries = ['SELECT COUNT(*) FROM `%s`;' % t for t in tables]
-    # can't use executemany because it doesn't support placeholders for table
-    # names. can't use executescript because it doesn't return results. :/
-    count = sum(conn.execute(q).fetchall()[0][0] for q in queries)
+    # only count up to the threshold, so this doesn't scan big tables
+    count = 0
+    for table in tables:
+      limit = ROW_COUNT_WARNING_THRESHOLD + 1 - count
+      if limit <= 0:
+        break
+      # can't use a placeholder for the table name. :/
+      count += conn.execute('SELECT COUNT(*) FROM (SELECT 1 FROM `%s` LIMIT ?)' %
+                            table, (limit,)).fetchone()[0]
+
     if count <= ROW_COUNT_WARNING_THRESHOLD:
       quantity = 'Only %d' % count if count > 0 else 'No'
       print '%s %s rows found. Consider inserting more or running download.py.' % (
         quantity, kind)
 
 
+def make_server(port, app, host=''):
+  """Returns a WSGI server on the given port, with threads if --threads.
+  """
+  if options.threads:
+    server = ThreadPoolWSGIServer((host, port),
+                                  wsgiref.simple_server.WSGIRequestHandler,
+                                  options.threads)
+    server.set_app(app)
+    return server
+  else:
+    return wsgiref.simple_server.make_server(host, port, app)
+
+
+def exit_with_parent(server, parent_pid):
+  """Shuts down a --workers process's server once its parent process is gone.
+
+  Workers are normally killed by the parent when it exits, but it can't do
+  that if it's killed with SIGKILL. Orphans are reparented, so their parent
+  pid changes. Runs until then, so call it in a daemon thread.
+
+  Args:
+    server: the worker's server
+    parent_pid: integer, the pid of the process that forked the worker
+  """
+  while os.getppid() == parent_pid:
+    time.sleep(SERVER_POLL_INTERVAL)
+  server.shutdown()
+
+
+def exit_on_sigterm(signum, frame):
+  """SIGTERM handler that raises SystemExit, so that main() cleans up.
+  """
+  sys.exit(0)
+
+
+def fork_worker(public_server, writer_server):
+  """Forks a --workers process that serves on public_server's socket.
+
+  The worker opens its own read only database connection(s) and forwards
+  writes to writer_server. It never returns.
+
+  Returns: integer pid, in the parent process
+  """
+  parent_pid = os.getpid()
+  pid = os.fork()
+  if pid:
+    return pid
+
+  try:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    writer_server.server_close()
+    if options.threads:
+      conn = schemautil.ThreadLocalConnection(
+        options.db_file, read_only=True,
+        cached_statements=options.statement_cache_size)
+    else:
+      conn = schemautil.connect(options.db_file, read_only=True,
+                                cached_statements=options.statement_cache_size)
+    for cls in HANDLER_CLASSES:
+      cls.init(conn, options.me)
+
+    public_server.set_app(WriterProxy(application(), writer_server.server_port))
+    watcher = threading.Thread(target=exit_with_parent,
+                               args=(public_server, parent_pid))
+    watcher.daemon = True
+    watcher.start()
+    public_server.serve_forever(poll_interval=SERVER_POLL_INTERVAL)
+  except KeyboardInterrupt:
+    pass
+  except:
+    traceback.print_exc()
+  finally:
+    os._exit(0)
+
+
+class StartupProfile(object):
+  """Times the phases of server startup, for --startup_profile.
+
+  Attributes:
+    phases: list of (string name, float seconds) tuples
+    last: float, time.time() when the last phase ended
+  """
+
+  def __init__(self):
+    self.phases = []
+    self.last = time.time()
+
+  def phase(self, name):
+    """Ends the current phase and records how long it took.
+    """
+    now = time.time()
+    self.phases.append((name, now - self.last))
+    self.last = now
+
+  def report(self):
+    """Returns a string with the time each phase took, and the total.
+    """
+    lines = ['Startup profile:']
+    for name, secs in self.phases + [('total', sum(s for n, s in self.phases))]:
+      lines.append('%8.1fms  %s' % (secs * 1000, name))
+    return '\n'.join(lines)
+
+
 def main(args, started=None):
   """Args:
     args: list of string command line arguments
     started: an Event to set once the server has started. for testing.
   """
+  profile = StartupProfile()
   parse_args(args)
   print 'Options: %s' % options
+  profile.phase('parse args')
+
+  conn = schemautil.get_db(options.db_file,
+                           cached_statements=options.statement_cache_size,
+                           synchronous=options.synchronous)
+  handler_conn = conn
+  if options.threads:
+    handler_conn = schemautil.ThreadLocalConnection(
+      options.db_file, cached_statements=options.statement_cache_size,
+      synchronous=options.synchronous)
+  profile.phase('open database')
+
+  # set before forking, so that --workers share the secret
+  secret = options.token_secret
+  if options.signed_tokens and not secret:
+    secret = os.urandom(oauth.TOKEN_SECRET_BYTES)
+  oauth.BaseHandler.signer = oauth.TokenSigner(secret) if secret else None
 
-  conn = schemautil.get_db(options.db_file)
   for cls in HANDLER_CLASSES:
-    cls.init(conn, options.me)
+    cls.init(handler_conn, options.me)
+    profile.phase('%s.init' % cls.__name__)
 
   # must run after FqlHandler.init() since that reads the FQL schema
   warn_if_no_data(conn)
+  profile.phase('check for data')
 
   global server  # for server_test.ServerTest
-  server = wsgiref.simple_server.make_server('', options.port, application())
+  pids = []
+  if options.workers:
+    # this process is the single writer. it serves on a local port that only
+    # the workers know about, with --threads threads like they do.
+    public_server = make_server(options.port, None)
+    server = make_server(0, application(), host='localhost')
+    pids = [fork_worker(public_server, server)
+            for i in range(options.workers)]
+    public_server.server_close()
+    print 'Serving on port %d with %d worker processes...' % (options.port,
+                                                              options.workers)
+  else:
+    server = make_server(options.port, application())
+    print 'Serving on port %d...' % options.port
+
+  # start after forking, so that only this process sweeps
+  if options.sweep_interval and options.db_file != ':memory:':
+    oauth.BaseHandler.sweeper = oauth.Sweeper(
+      schemautil.ThreadLocalConnection(options.db_file,
+                                       synchronous=options.synchronous),
+      interval=options.sweep_interval)
+    oauth.BaseHandler.sweeper.start()
+  profile.phase('start server')
+
+  if options.startup_profile:
+    print profile.report()
 
-  print 'Serving on port %d...' % options.port
   if started:
     started.set()
-  server.serve_forever(poll_interval=SERVER_POLL_INTERVAL)
+  try:
+    server.serve_forever(poll_interval=SERVER_POLL_INTERVAL)
+  finally:
+    server.server_close()
+    if oauth.BaseHandler.sweeper:
+      oauth.BaseHandler.sweeper.stop()
+      oauth.BaseHandler.sweeper.join()
+      oauth.BaseHandler.sweeper = None
+    for pid in pids:
+      os.kill(pid, signal.SIGTERM)
+      os.waitpid(pid, 0)
 
 
 if __name__ == '__main__':
+  # so that main() kills --workers processes when it's terminated
+  signal.signal(signal.SIGTERM, exit_on_sigterm)
   main(sys.argv)
@@ -4,18 +4,25 @@
 
 __author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
 
+import cStringIO
 import json
 import os
 import re
+import signal
+import sys
 import threading
+import time
 import unittest
 import urllib
 import urllib2
 import urlparse
 import warnings
+import wsgiref.simple_server
 
+import fql
 import fql_test
 import graph_test
+import oauth
 import schemautil
 import server
 import testutil
@@ -52,6 +59,8 @@ class ServerTest(unittest.TestCase):
   """
 
   PORT = 60000
+  # extra command line args for server.main()
+  ARGS = []
   db_filename = None
   thread = None
 
@@ -70,7 +79,7 @@ class ServerTest(unittest.TestCase):
       args=(['--db_file', self.db_filename,
              '--port', str(self.PORT),
              '--me', '1',
-             ],),
+             ] + self.ARGS,),
       kwargs={'started': started})
     self.thread.start()
     started.wait()
@@ -80,7 +89,7 @@ class ServerTest(unittest.TestCase):
     self.thread.join()
 
     try:
-      os.remove(self.db_filename)
+      testutil.remove_db(self.db_filename)
     except:
       pass
 
@@ -183,6 +192,9 @@ class ServerTest(unittest.TestCase):
     resp = self.expect('/oauth/access_token', args, None)
     assert re.match('access_token=.+&expires=999999', resp), resp
 
+    # the sweeper runs in the writer process
+    self.assertTrue(oauth.BaseHandler.sweeper.is_alive())
+
   def _test_404(self):
     try:
       resp = self.expect('/not_found', {}, '')
@@ -191,5 +203,129 @@ class ServerTest(unittest.TestCase):
       self.assertEquals(404, e.code)
 
 
+class ThreadedServerTest(ServerTest):
+  """Runs the same integration test against the thread pool server.
+  """
+
+  PORT = 60001
+  ARGS = ['--threads', '4']
+
+  def test_concurrent_requests(self):
+    query = 'SELECT username FROM profile WHERE id = me()'
+    requests = [('/method/fql.query', {'query': query, 'format': 'json'},
+                 '[{"username": "alice"}]'),
+                ('/alice/albums', {}, '{"data": [{"id": "3"}, {"id": "4"}]}'),
+                ('/bob', {}, '{"id": "2", "inner": {"foo": "baz"}}'),
+                ] * 10
+
+    failures = []
+    def fetch(path, args, expected):
+      try:
+        self.assertEquals(json.loads(expected),
+                          json.loads(get_data(self.PORT, path, args)))
+      except Exception, e:
+        failures.append(e)
+
+    threads = [threading.Thread(target=fetch, args=r) for r in requests]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEquals([], failures)
+
+
+class PreforkServerTest(ServerTest):
+  """Runs the same integration test against worker processes and a writer.
+  """
+
+  PORT = 60002
+  ARGS = ['--workers', '2', '--threads', '2']
+
+
+class SignedTokensServerTest(ServerTest):
+  """Runs the same integration test with signed access tokens and workers.
+  """
+
+  PORT = 60003
+  ARGS = ['--workers', '2', '--token_secret', 'secret']
+
+  def tearDown(self):
+    super(SignedTokensServerTest, self).tearDown()
+    oauth.BaseHandler.signer = None
+
+  def test_signed_tokens(self):
+    resp = get_data(self.PORT, '/oauth/access_token',
+                    {'client_id': 'x', 'client_secret': 'y', 'code': 'z',
+                     'grant_type': 'client_credentials'})
+    token = urlparse.parse_qs(resp)['access_token'][0]
+    self.assertIn(oauth.SIGNED_TOKEN_SEPARATOR, token)
+    self.expect('/1', {'access_token': token}, '{"foo": "bar", "id": "1"}')
+
+    get_data(self.PORT, '/oauth/access_token', {'access_token': token},
+             method='DELETE')
+    time.sleep(oauth.REVOKED_TOKENS_TTL)
+    self.assertRaises(urllib2.HTTPError, get_data, self.PORT, '/1',
+                      {'access_token': token})
+
+
+class WarnIfNoDataTest(testutil.HandlerTest):
+
+  def setUp(self):
+    super(WarnIfNoDataTest, self).setUp(fql.FqlHandler)
+    self.orig_stdout = sys.stdout
+    sys.stdout = self.out = cStringIO.StringIO()
+
+  def tearDown(self):
+    sys.stdout = self.orig_stdout
+    super(WarnIfNoDataTest, self).tearDown()
+
+  def test_warnings(self):
+    fql_test.insert_test_data(self.conn)
+    server.warn_if_no_data(self.conn)
+    self.assertEquals(
+      'Only 2 FQL rows found. Consider inserting more or running download.py.\n'
+      'No Graph API rows found. Consider inserting more or running download.py.\n',
+      self.out.getvalue())
+
+  def test_stops_counting_at_threshold(self):
+    self.conn.executemany('INSERT INTO graph_objects(id, data) VALUES(?, "{}")',
+                          [(str(i),) for i in range(100)])
+    num = server.ROW_COUNT_WARNING_THRESHOLD + 1
+    self.conn.executemany('INSERT INTO profile(id) VALUES(?)',
+                          [(i,) for i in range(num)])
+    server.warn_if_no_data(self.conn)
+    self.assertEquals('', self.out.getvalue())
+
+
+class WorkerExitTest(unittest.TestCase):
+
+  def test_exit_with_parent(self):
+    wsgi = wsgiref.simple_server.make_server('localhost', 0, None)
+    thread = threading.Thread(target=wsgi.serve_forever, kwargs={
+        'poll_interval': server.SERVER_POLL_INTERVAL})
+    thread.start()
+    # our own pid is never our parent's, so this returns right away
+    server.exit_with_parent(wsgi, os.getpid())
+    thread.join()
+    wsgi.server_close()
+
+  def test_exit_on_sigterm(self):
+    self.assertRaises(SystemExit, server.exit_on_sigterm, signal.SIGTERM, None)
+
+
+class StartupProfileTest(unittest.TestCase):
+
+  def test_report(self):
+    profile = server.StartupProfile()
+    profile.phase('foo')
+    profile.phase('bar')
+    self.assertEquals(['foo', 'bar'], [name for name, secs in profile.phases])
+    self.assertTrue(re.match(r'Startup profile:\n'
+                             r' +[0-9.]+ms  foo\n'
+                             r' +[0-9.]+ms  bar\n'
+                             r' +[0-9.]+ms  total$', profile.report()),
+                    profile.report())
+
+
 if __name__ == '__main__':
   unittest.main()
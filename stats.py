@@ -0,0 +1,41 @@
+"""Request handler that reports cache, group commit, and sweeper statistics.
+
+Served at /_stats as JSON. With --workers, each worker process has its own
+caches, so this reports the statistics of whichever process serves it. Only
+the writer process sweeps expired OAuth rows, so workers don't report that.
+"""
+
+__author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
+
+import json
+
+import webapp2
+
+import fql
+import graph
+import oauth
+
+
+class StatsHandler(webapp2.RequestHandler):
+  """The stats request handler.
+  """
+
+  ROUTES = [(r'/_stats/?', 'stats.StatsHandler')]
+
+  @classmethod
+  def init(cls, conn, me):
+    # conn and me are unused
+    pass
+
+  def get(self):
+    stats = {'fql_query_cache': fql.FqlHandler.query_cache.stats(),
+             'graph_alias_cache': graph.GraphHandler.alias_cache.stats(),
+             'graph_object_cache': graph.GraphHandler.object_cache.stats(),
+             }
+    stats['oauth_token_cache'] = oauth.BaseHandler.token_cache.stats()
+    if oauth.BaseHandler.committer:
+      stats['oauth_group_commit'] = oauth.BaseHandler.committer.stats()
+    if oauth.BaseHandler.sweeper:
+      stats['oauth_sweeper'] = oauth.BaseHandler.sweeper.stats()
+    self.response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+    json.dump(stats, self.response.out, indent=2)
@@ -0,0 +1,72 @@
+#!/usr/bin/python
+"""Unit tests for stats.py.
+"""
+
+__author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
+
+import json
+import unittest
+
+import fql
+import fql_test
+import graph
+import graph_test
+import oauth
+import stats
+import testutil
+
+
+class StatsHandlerTest(testutil.HandlerTest):
+
+  def setUp(self):
+    super(StatsHandlerTest, self).setUp(fql.FqlHandler, graph.GraphHandler,
+                                        stats.StatsHandler)
+    fql_test.insert_test_data(self.conn)
+
+  def test_fql_query_cache(self):
+    args = {'format': 'json',
+            'query': 'SELECT username FROM profile WHERE id = me()'}
+    for i in range(3):
+      self.get_response('/method/fql.query', args=args)
+
+    resp = self.get_response('/_stats')
+    self.assertEquals(200, resp.status_int)
+    self.assertEquals({'size': 1, 'max_size': fql.QUERY_CACHE_SIZE,
+                       'bytes': 0, 'max_bytes': None,
+                       'hits': 2, 'misses': 1, 'evictions': 0},
+                      json.loads(resp.body)['fql_query_cache'])
+
+  def test_graph_object_cache(self):
+    graph_test.insert_test_data(self.conn)
+    for i in range(3):
+      self.get_response('/', args={'ids': 'alice'})
+
+    stats = json.loads(self.get_response('/_stats').body)['graph_object_cache']
+    self.assertEquals(2, stats['hits'])
+    self.assertEquals(1, stats['misses'])
+    self.assertEquals(graph.OBJECT_CACHE_BYTES, stats['max_bytes'])
+
+  def test_oauth_group_commit(self):
+    oauth.AuthCodeHandler.init(self.conn)
+    self.get_response('/dialog/oauth',
+                      args={'client_id': '1', 'redirect_uri': 'http://x/'})
+    stats = json.loads(self.get_response('/_stats').body)
+    self.assertEquals({'commits': 1, 'writes': 1}, stats['oauth_group_commit'])
+    self.assertEquals(oauth.TOKEN_CACHE_SIZE,
+                      stats['oauth_token_cache']['max_size'])
+
+  def test_oauth_sweeper(self):
+    stats = json.loads(self.get_response('/_stats').body)
+    self.assertNotIn('oauth_sweeper', stats)
+    oauth.BaseHandler.sweeper = oauth.Sweeper(self.conn)
+    try:
+      oauth.BaseHandler.sweeper.sweep()
+      stats = json.loads(self.get_response('/_stats').body)['oauth_sweeper']
+      self.assertEquals(1, stats['sweeps'])
+      self.assertEquals(0, stats['rows']['oauth_access_tokens'])
+    finally:
+      oauth.BaseHandler.sweeper = None
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -5,6 +5,7 @@ __author__ = ['Ryan Barrett <mockfacebook@ryanb.org>']
 
 import cStringIO
 import json
+import os
 import re
 import sqlite3
 import sys
@@ -27,6 +28,14 @@ def maybe_read(dataset_cls):
     return None
 
 
+def remove_db(filename):
+  """Deletes a SQLite database file, including its WAL mode files, if any.
+  """
+  for suffix in '', '-wal', '-shm':
+    if os.path.exists(filename + suffix):
+      os.remove(filename + suffix)
+
+
 class HandlerTest(unittest.TestCase):
   """Base test class for webapp2 request handlers.
 